@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.files import AttachmentError, AttachmentRoot
+from app.storage import Repository
+
+
+def _collect(repo: Repository, root: AttachmentRoot, filename: str) -> None:
+    # An upload may have reused the file since it was found unreferenced. It
+    # takes its reference before linking, so once the file is moved aside a
+    # second check sees every upload that could still be relying on it.
+    try:
+        retired = root.retire(filename)
+        if retired is None:
+            return
+        try:
+            referenced = repo.count_attachment_references(filename) > 0
+        except Exception:  # noqa: BLE001
+            referenced = True
+        if referenced:
+            root.link(retired, filename)
+        root.remove_temp(retired)
+    except (OSError, AttachmentError):
+        # Best-effort cleanup; a leftover file is only wasted space.
+        pass
+
+
+@dataclass
+class AttachmentCollector:
+    """
+    Background removal of attachment files released by `delete_chore`. The
+    request only schedules filenames; a single task unlinks them on the
+    attachment I/O executor. A file is re-checked against the repository
+    before removal, and again after it has been moved aside (see `_collect`),
+    since an identical upload may have referenced it again. Pending files are
+    lost on shutdown and stay on disk as garbage.
+    """
+
+    repository_factory: Callable[[], Repository]
+    root: AttachmentRoot
+    executor: Optional[Executor] = None
+    _queue: asyncio.Queue = field(default_factory=asyncio.Queue, init=False)
+    _task: Optional[asyncio.Task] = field(default=None, init=False)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="attachment-gc")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def schedule(self, filenames: Iterable[str]) -> None:
+        for filename in filenames:
+            self._queue.put_nowait(filename)
+
+    async def join(self) -> None:
+        """
+        Wait until every scheduled file has been processed.
+        """
+        await self._queue.join()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            filename = await self._queue.get()
+            try:
+                repo = self.repository_factory()
+                references = await run_in_threadpool(
+                    repo.count_attachment_references, filename
+                )
+                if references == 0:
+                    await loop.run_in_executor(
+                        self.executor, _collect, repo, self.root, filename
+                    )
+            except Exception:  # noqa: BLE001
+                # A storage hiccup must not kill the collector.
+                pass
+            finally:
+                self._queue.task_done()
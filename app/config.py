@@ -3,9 +3,9 @@ from __future__ import annotations
 import os
 from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 
 
 class Settings(BaseModel):
@@ -17,11 +17,43 @@ class Settings(BaseModel):
 
     app_api_key: str = Field(alias="APP_API_KEY")
     attachments_dir: Path = Field(default=Path("attachments"), alias="ATTACHMENTS_DIR")
+    attachment_io_workers: int = Field(default=4, ge=1, alias="ATTACHMENT_IO_WORKERS")
     notify_webhook_url: Optional[str] = Field(default=None, alias="NOTIFY_WEBHOOK_URL")
     notify_allowed_hosts: List[str] = Field(
         default_factory=list, alias="NOTIFY_ALLOWED_HOSTS"
     )
     notify_token: Optional[str] = Field(default=None, alias="NOTIFY_TOKEN")
+    notify_http2: bool = Field(default=False, alias="NOTIFY_HTTP2")
+    notify_max_connections: int = Field(default=20, ge=1, alias="NOTIFY_MAX_CONNECTIONS")
+    notify_outbox_workers: int = Field(default=4, ge=1, alias="NOTIFY_OUTBOX_WORKERS")
+    notify_concurrency: int = Field(default=16, ge=1, alias="NOTIFY_CONCURRENCY")
+    notify_max_attempts: int = Field(default=5, ge=1, alias="NOTIFY_MAX_ATTEMPTS")
+    notify_breaker_threshold: int = Field(default=5, ge=1, alias="NOTIFY_BREAKER_THRESHOLD")
+    notify_breaker_reset_seconds: float = Field(
+        default=30.0, gt=0, alias="NOTIFY_BREAKER_RESET_SECONDS"
+    )
+    notify_retry_budget_ratio: float = Field(
+        default=0.2, ge=0, alias="NOTIFY_RETRY_BUDGET_RATIO"
+    )
+    storage_backend: Literal["memory", "sqlite"] = Field(
+        default="memory", alias="STORAGE_BACKEND"
+    )
+    database_path: Path = Field(default=Path("app.db"), alias="DATABASE_PATH")
+    memory_wal_dir: Optional[Path] = Field(default=None, alias="MEMORY_WAL_DIR")
+    memory_wal_fsync: Literal["always", "interval", "off"] = Field(
+        default="always", alias="MEMORY_WAL_FSYNC"
+    )
+    memory_wal_fsync_interval: float = Field(
+        default=0.05, gt=0, alias="MEMORY_WAL_FSYNC_INTERVAL"
+    )
+    memory_snapshot_every: int = Field(default=100_000, ge=1, alias="MEMORY_SNAPSHOT_EVERY")
+    web_concurrency: int = Field(default=1, ge=1, alias="WEB_CONCURRENCY")
+    profile_enabled: bool = Field(default=False, alias="PROFILE_ENABLED")
+    profile_dir: Path = Field(default=Path("profiles"), alias="PROFILE_DIR")
+    profile_token: Optional[str] = Field(default=None, alias="PROFILE_TOKEN")
+    profile_sample_rate: float = Field(default=0.0, ge=0, le=1, alias="PROFILE_SAMPLE_RATE")
+    profile_interval: float = Field(default=0.001, gt=0, alias="PROFILE_INTERVAL")
+    profile_max_files: int = Field(default=200, ge=1, alias="PROFILE_MAX_FILES")
 
     @field_validator("app_api_key")
     @classmethod
@@ -40,6 +72,35 @@ class Settings(BaseModel):
             raise ValueError("Attachments path must be a directory")
         return resolved
 
+    @field_validator("storage_backend", mode="before")
+    @classmethod
+    def normalise_backend(cls, value: str | None) -> str:
+        if not value:
+            return "memory"
+        return value.strip().lower()
+
+    @field_validator("database_path", mode="before")
+    @classmethod
+    def prepare_database_path(cls, value: str | Path | None) -> Path:
+        raw_path = Path(value) if value else Path("app.db")
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        return raw_path.resolve()
+
+    @field_validator("memory_wal_dir", mode="before")
+    @classmethod
+    def prepare_wal_dir(cls, value: str | Path | None) -> Optional[Path]:
+        if not value:
+            return None
+        raw_path = Path(value)
+        raw_path.mkdir(parents=True, exist_ok=True)
+        return raw_path.resolve()
+
+    @field_validator("profile_dir", mode="before")
+    @classmethod
+    def resolve_profile_dir(cls, value: str | Path | None) -> Path:
+        # Created by the profiler on first use, so disabled profiling leaves no trace.
+        return Path(value or "profiles").resolve()
+
     @field_validator("notify_allowed_hosts", mode="before")
     @classmethod
     def split_hosts(cls, value: str | List[str] | None) -> List[str]:
@@ -53,14 +114,46 @@ class Settings(BaseModel):
             ]
         return [host.lower() for host in value]
 
+    @model_validator(mode="after")
+    def ensure_shared_storage(self) -> "Settings":
+        # uvicorn reads WEB_CONCURRENCY as its default --workers value; each
+        # worker would get a private memory store and silently diverge.
+        if self.web_concurrency > 1 and self.storage_backend == "memory":
+            raise ValueError(
+                "WEB_CONCURRENCY > 1 requires a shared store (STORAGE_BACKEND=sqlite)"
+            )
+        return self
+
 
 def _environment_payload() -> dict[str, object]:
     return {
         "APP_API_KEY": os.environ.get("APP_API_KEY", ""),
         "ATTACHMENTS_DIR": os.environ.get("ATTACHMENTS_DIR"),
+        "ATTACHMENT_IO_WORKERS": os.environ.get("ATTACHMENT_IO_WORKERS") or 4,
         "NOTIFY_WEBHOOK_URL": os.environ.get("NOTIFY_WEBHOOK_URL"),
         "NOTIFY_ALLOWED_HOSTS": os.environ.get("NOTIFY_ALLOWED_HOSTS"),
         "NOTIFY_TOKEN": os.environ.get("NOTIFY_TOKEN"),
+        "NOTIFY_HTTP2": os.environ.get("NOTIFY_HTTP2") or False,
+        "NOTIFY_MAX_CONNECTIONS": os.environ.get("NOTIFY_MAX_CONNECTIONS") or 20,
+        "NOTIFY_OUTBOX_WORKERS": os.environ.get("NOTIFY_OUTBOX_WORKERS") or 4,
+        "NOTIFY_CONCURRENCY": os.environ.get("NOTIFY_CONCURRENCY") or 16,
+        "NOTIFY_MAX_ATTEMPTS": os.environ.get("NOTIFY_MAX_ATTEMPTS") or 5,
+        "NOTIFY_BREAKER_THRESHOLD": os.environ.get("NOTIFY_BREAKER_THRESHOLD") or 5,
+        "NOTIFY_BREAKER_RESET_SECONDS": os.environ.get("NOTIFY_BREAKER_RESET_SECONDS") or 30.0,
+        "NOTIFY_RETRY_BUDGET_RATIO": os.environ.get("NOTIFY_RETRY_BUDGET_RATIO") or 0.2,
+        "STORAGE_BACKEND": os.environ.get("STORAGE_BACKEND"),
+        "DATABASE_PATH": os.environ.get("DATABASE_PATH"),
+        "MEMORY_WAL_DIR": os.environ.get("MEMORY_WAL_DIR") or None,
+        "MEMORY_WAL_FSYNC": os.environ.get("MEMORY_WAL_FSYNC") or "always",
+        "MEMORY_WAL_FSYNC_INTERVAL": os.environ.get("MEMORY_WAL_FSYNC_INTERVAL") or 0.05,
+        "MEMORY_SNAPSHOT_EVERY": os.environ.get("MEMORY_SNAPSHOT_EVERY") or 100_000,
+        "WEB_CONCURRENCY": os.environ.get("WEB_CONCURRENCY") or 1,
+        "PROFILE_ENABLED": os.environ.get("PROFILE_ENABLED") or False,
+        "PROFILE_DIR": os.environ.get("PROFILE_DIR"),
+        "PROFILE_TOKEN": os.environ.get("PROFILE_TOKEN") or None,
+        "PROFILE_SAMPLE_RATE": os.environ.get("PROFILE_SAMPLE_RATE") or 0.0,
+        "PROFILE_INTERVAL": os.environ.get("PROFILE_INTERVAL") or 0.001,
+        "PROFILE_MAX_FILES": os.environ.get("PROFILE_MAX_FILES") or 200,
     }
 
 
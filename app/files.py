@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import errno
+import hashlib
+import os
+import stat
 import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Final
+from typing import BinaryIO, Final, Iterator, List, Optional, Tuple
 
-PNG_MAGIC: Final = b"\x89PNG\r\n\x1a\n"
-JPEG_SOI: Final = b"\xff\xd8"
-JPEG_EOI: Final = b"\xff\xd9"
+from app.images import PNG_SIGNATURE, ImageError, ImageValidator
+
+PNG_MAGIC: Final = PNG_SIGNATURE
 MAX_ATTACHMENT_BYTES: Final = 5_000_000
 ALLOWED_MIME_EXT: Final = {"image/png": ".png", "image/jpeg": ".jpg"}
 
@@ -25,59 +30,335 @@ class AttachmentMeta:
     filename: str
     content_type: str
     size: int
+    sha256: str
+    width: int
+    height: int
 
 
-def sniff_mime_type(data: bytes) -> str | None:
-    if data.startswith(PNG_MAGIC):
-        return "image/png"
-    if data.startswith(JPEG_SOI) and data.endswith(JPEG_EOI):
-        return "image/jpeg"
-    return None
+_HEX_DIGITS: Final = frozenset("0123456789abcdef")
 
 
-def ensure_within_root(path: Path, root: Path) -> None:
-    if not str(path).startswith(str(root)):
-        raise AttachmentError(
-            code="attachment_path_violation",
-            detail="Attachment path escapes root directory",
-            status=400,
-        )
-    for parent in path.parents:
-        if parent.is_symlink():
+def shard_of(name: str) -> Tuple[str, str]:
+    """
+    Two-level fan-out directories for a stored file: the first two hex pairs
+    of its name, or of the SHA-256 of the name when it does not start with hex.
+    """
+    key = name
+    if len(name) < 4 or not _HEX_DIGITS.issuperset(name[:4]):
+        key = hashlib.sha256(name.encode()).hexdigest()
+    return key[:2], key[2:4]
+
+
+class AttachmentRoot:
+    """
+    The attachments directory, opened once as a directory fd. All file access
+    goes through `*at()` calls relative to that fd with single-component names
+    and O_NOFOLLOW, so the kernel keeps every operation inside the directory:
+    there is no path to traverse, a symlinked entry is refused, and renaming or
+    swapping the directory path after startup has no effect.
+
+    Stored files live in `ab/cd/<name>` shard directories (see `shard_of`),
+    each opened with O_NOFOLLOW as well. Files from the old flat layout are
+    still found until `migrate` moves them; temp files stay at the top level.
+    """
+
+    _DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW | os.O_CLOEXEC
+    _READ_FLAGS = os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC
+    _CREATE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW | os.O_CLOEXEC
+    # Lookups that fail these ways have no stored file behind them.
+    _MISSING_ERRNOS = frozenset({errno.ENOENT, errno.ENOTDIR, errno.EISDIR, errno.ENAMETOOLONG})
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    @staticmethod
+    def _check_name(name: str) -> str:
+        if not name or name in (".", "..") or "/" in name or "\0" in name:
             raise AttachmentError(
-                code="attachment_symlink_parent",
-                detail="Attachment root contains a symlinked directory",
+                code="attachment_path_violation",
+                detail="Attachment path escapes root directory",
                 status=400,
             )
+        return name
 
+    @contextmanager
+    def _shard(self, name: str, *, create: bool = False) -> Iterator[int]:
+        fd = self.fd
+        try:
+            for part in shard_of(name):
+                if create:
+                    try:
+                        os.mkdir(part, 0o700, dir_fd=fd)
+                    except FileExistsError:
+                        pass
+                child = os.open(part, self._DIR_FLAGS, dir_fd=fd)
+                if fd != self.fd:
+                    os.close(fd)
+                fd = child
+            yield fd
+        finally:
+            if fd != self.fd:
+                os.close(fd)
 
-def save_attachment(root: Path, data: bytes) -> AttachmentMeta:
-    if len(data) == 0:
-        raise AttachmentError(
-            code="attachment_empty",
-            detail="Attachment payload is empty",
-            status=400,
-        )
-    if len(data) > MAX_ATTACHMENT_BYTES:
-        raise AttachmentError(
-            code="attachment_too_large",
-            detail="Attachment exceeds size limit",
-            status=413,
-        )
-    content_type = sniff_mime_type(data)
-    if content_type not in ALLOWED_MIME_EXT:
-        raise AttachmentError(
+    def create(self, name: str) -> BinaryIO:
+        fd = os.open(self._check_name(name), self._CREATE_FLAGS, 0o600, dir_fd=self.fd)
+        return os.fdopen(fd, "wb")
+
+    def _open_sharded(self, name: str) -> int:
+        with self._shard(name) as dir_fd:
+            return os.open(name, self._READ_FLAGS, dir_fd=dir_fd)
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a stored file for reading. Raises FileNotFoundError when there is
+        no regular file under `name`, e.g. it is gone, a shard component is not
+        a directory, or the entry is a directory itself.
+        """
+        self._check_name(name)
+        try:
+            try:
+                fd = self._open_sharded(name)
+            except (FileNotFoundError, NotADirectoryError):
+                try:
+                    fd = os.open(name, self._READ_FLAGS, dir_fd=self.fd)
+                except FileNotFoundError:
+                    # Moved by a concurrent migration between the two lookups.
+                    fd = self._open_sharded(name)
+        except OSError as exc:
+            if exc.errno == errno.ELOOP:
+                raise AttachmentError(
+                    code="attachment_symlink",
+                    detail="Attachment path is a symbolic link",
+                    status=400,
+                ) from exc
+            if exc.errno in self._MISSING_ERRNOS:
+                raise FileNotFoundError(exc.errno, "Stored file not found", name) from exc
+            raise
+        if not stat.S_ISREG(os.fstat(fd).st_mode):
+            os.close(fd)
+            raise FileNotFoundError(errno.ENOENT, "Stored file not found", name)
+        return os.fdopen(fd, "rb")
+
+    def link(self, source: str, target: str) -> bool:
+        """
+        Give the top-level file `source` the additional stored name `target`
+        unless it already exists. Returns False when `target` was present.
+        """
+        self._check_name(source)
+        with self._shard(self._check_name(target), create=True) as dir_fd:
+            try:
+                os.link(
+                    source,
+                    target,
+                    src_dir_fd=self.fd,
+                    dst_dir_fd=dir_fd,
+                    follow_symlinks=False,
+                )
+            except FileExistsError:
+                return False
+        return True
+
+    def remove_temp(self, name: str) -> None:
+        try:
+            os.unlink(self._check_name(name), dir_fd=self.fd)
+        except FileNotFoundError:
+            pass
+
+    def retire(self, name: str) -> Optional[str]:
+        """
+        Move a stored file aside to a new top-level temp name and return it,
+        or None when there is no stored file. Used by the collector to take a
+        file out of use before a last reference check; `link` puts it back.
+        The flat-layout copy is removed outright, since uploads never reuse it.
+        """
+        self.remove_temp(name)
+        trash = f".retired-{uuid.uuid4().hex}"
+        try:
+            with self._shard(self._check_name(name)) as dir_fd:
+                os.rename(name, trash, src_dir_fd=dir_fd, dst_dir_fd=self.fd)
+        except FileNotFoundError:
+            return None
+        return trash
+
+    def unlink(self, name: str) -> None:
+        """
+        Remove a stored file from both layouts. The flat copy goes first, so a
+        concurrent `migrate` cannot re-create the sharded one afterwards.
+        """
+        self.remove_temp(name)
+        try:
+            with self._shard(self._check_name(name)) as dir_fd:
+                os.unlink(name, dir_fd=dir_fd)
+        except FileNotFoundError:
+            pass
+
+    def flat_files(self, limit: int) -> List[str]:
+        """
+        Up to `limit` stored files still in the old flat layout.
+        """
+        names = []
+        with os.scandir(self.fd) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                names.append(entry.name)
+                if len(names) >= limit:
+                    break
+        return names
+
+    def migrate(self, name: str) -> bool:
+        """
+        Move one flat file into its shard; safe to repeat and to run while the
+        app is serving. Returns False when the file was already gone.
+        """
+        try:
+            self.link(name, name)
+        except FileNotFoundError:
+            return False
+        # Either just linked or an identical content-addressed copy exists.
+        self.remove_temp(name)
+        return True
+
+
+def attachment_digest(filename: str, file: BinaryIO) -> str:
+    """
+    SHA-256 of an attachment's content. Content-addressed files carry it in
+    their name; files stored under random names are hashed in chunks.
+    """
+    digest = Path(filename).stem
+    if len(digest) == 64 and all(c in "0123456789abcdef" for c in digest):
+        return digest
+    hasher = hashlib.sha256()
+    position = 0
+    while chunk := os.pread(file.fileno(), 64 * 1024, position):
+        hasher.update(chunk)
+        position += len(chunk)
+    return hasher.hexdigest()
+
+
+def _too_large() -> AttachmentError:
+    return AttachmentError(
+        code="attachment_too_large",
+        detail="Attachment exceeds size limit",
+        status=413,
+    )
+
+
+def _invalid_image(exc: ImageError) -> AttachmentError:
+    if exc.unsupported:
+        return AttachmentError(
             code="attachment_type_unsupported",
             detail="Attachment must be PNG or JPEG image",
             status=415,
         )
-    root = root.resolve(strict=True)
-    filename = f"{uuid.uuid4()}{ALLOWED_MIME_EXT[content_type]}"
-    path = (root / filename).resolve()
-    ensure_within_root(path, root)
-    path.write_bytes(data)
-    return AttachmentMeta(
-        filename=filename,
-        content_type=content_type,
-        size=len(data),
-    )
+    return AttachmentError(code="attachment_malformed", detail=str(exc), status=400)
+
+
+def check_declared_size(content_length: Optional[str]) -> None:
+    """
+    Reject an upload up front when its Content-Length is already over the limit.
+    """
+    if content_length and content_length.isdigit() and int(content_length) > MAX_ATTACHMENT_BYTES:
+        raise _too_large()
+
+
+class AttachmentWriter:
+    """
+    Incremental attachment upload. Chunks are appended to a hidden temp file in
+    `root` as they arrive, so memory use is bounded by the chunk size. Every
+    chunk goes through the size limit and the streaming ImageValidator, so a
+    wrong type or broken structure is rejected as soon as it shows up.
+    `finish` validates the complete file and names it, `commit` links it into
+    place, never replacing an existing name, and `abort` removes the partial
+    file.
+
+    Files are content-addressed: the name is the SHA-256 of the content, so an
+    upload identical to a stored file reuses it instead of adding a copy.
+    """
+
+    def __init__(self, root: AttachmentRoot) -> None:
+        self._root = root
+        self._tmp_name = f".upload-{uuid.uuid4().hex}.part"
+        self._file = root.create(self._tmp_name)
+        self._validator = ImageValidator()
+        self._digest = hashlib.sha256()
+        self._committed = False
+        self._meta: Optional[AttachmentMeta] = None
+        self.size = 0
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > MAX_ATTACHMENT_BYTES:
+            raise _too_large()
+        try:
+            self._validator.feed(chunk)
+        except ImageError as exc:
+            raise _invalid_image(exc) from exc
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self) -> AttachmentMeta:
+        """
+        Validate the complete upload and work out its stored name, without
+        linking it yet. Safe to call again.
+        """
+        if self._meta is not None:
+            return self._meta
+        if self.size == 0:
+            raise AttachmentError(
+                code="attachment_empty",
+                detail="Attachment payload is empty",
+                status=400,
+            )
+        try:
+            image = self._validator.finish()
+        except ImageError as exc:
+            raise _invalid_image(exc) from exc
+        sha256 = self._digest.hexdigest()
+        filename = f"{sha256}{ALLOWED_MIME_EXT[image.content_type]}"
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._meta = AttachmentMeta(
+            filename=filename,
+            content_type=image.content_type,
+            size=self.size,
+            sha256=sha256,
+            width=image.width,
+            height=image.height,
+        )
+        return self._meta
+
+    def commit(self) -> AttachmentMeta:
+        meta = self.finish()
+        # Linking fails with EEXIST instead of overwriting, so an identical
+        # file stored concurrently is simply reused.
+        self._root.link(self._tmp_name, meta.filename)
+        self.abort()
+        self._committed = True
+        return meta
+
+    def abort(self) -> None:
+        if self._committed:
+            return
+        self._file.close()
+        self._root.remove_temp(self._tmp_name)
+
+    def __enter__(self) -> "AttachmentWriter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.abort()
+
+
+def save_attachment(root: AttachmentRoot, data: bytes) -> AttachmentMeta:
+    if len(data) > MAX_ATTACHMENT_BYTES:
+        raise _too_large()
+    with AttachmentWriter(root) as writer:
+        writer.write(data)
+        return writer.commit()
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from dataclasses import dataclass
+from typing import Final, Optional
+
+PNG_SIGNATURE: Final = b"\x89PNG\r\n\x1a\n"
+JPEG_SOI: Final = b"\xff\xd8"
+
+_MAX_PNG_CHUNK: Final = 2**31 - 1
+# Start-of-frame markers carrying the image size (everything in C0-CF except
+# DHT, JPG and DAC).
+_JPEG_SOF: Final = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_JPEG_STANDALONE: Final = frozenset(range(0xD0, 0xD8)) | {0x01}
+_JPEG_EOI: Final = 0xD9
+_JPEG_SOS: Final = 0xDA
+
+
+class ImageError(ValueError):
+    def __init__(self, detail: str, *, unsupported: bool = False):
+        self.unsupported = unsupported
+        super().__init__(detail)
+
+
+@dataclass(frozen=True)
+class ImageInfo:
+    content_type: str
+    width: int
+    height: int
+
+
+class ImageValidator:
+    """
+    Incremental structural check of a PNG or JPEG stream. `feed` takes the
+    upload chunk by chunk and raises ImageError as soon as the data stops
+    making sense; `finish` fails on truncated input and returns the format and
+    dimensions read from the headers. Pixel data is never decoded, and only
+    the unconsumed tail of the last chunk plus small headers are buffered.
+
+    PNG: signature, IHDR first, every chunk's length and CRC, IDAT before IEND.
+    JPEG: SOI, marker segments with their lengths, a frame header before the
+    first scan, entropy-coded data up to the next marker, and EOI. Bytes after
+    IEND are rejected, but parsing a JPEG stops at its first EOI and anything
+    after it is ignored: MPF/MPO photos append further images there.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._state = "detect"
+        self._content_type: Optional[str] = None
+        self._width = 0
+        self._height = 0
+        # PNG chunk / JPEG segment in progress.
+        self._remaining = 0
+        self._kind = b""
+        self._crc = 0
+        self._collected = bytearray()
+        self._seen_data = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._state == "done":
+            if chunk:
+                self._check_trailing()
+            return
+        self._buffer += chunk
+        pos = self._parse()
+        del self._buffer[:pos]
+
+    def finish(self) -> ImageInfo:
+        if self._state != "done":
+            if self._state == "detect" and len(self._buffer) < 2:
+                raise ImageError("Attachment must be PNG or JPEG image", unsupported=True)
+            raise ImageError("Image data is truncated")
+        assert self._content_type is not None
+        return ImageInfo(self._content_type, self._width, self._height)
+
+    # Each state handler consumes from `pos` and returns the new position, or
+    # None when it needs more bytes than are buffered.
+
+    def _parse(self) -> int:
+        pos = 0
+        while self._state != "done":
+            handler = getattr(self, f"_on_{self._state}")
+            new_pos = handler(pos)
+            if new_pos is None:
+                break
+            pos = new_pos
+        if self._state == "done" and pos < len(self._buffer):
+            self._check_trailing()
+            return len(self._buffer)
+        return pos
+
+    def _check_trailing(self) -> None:
+        if self._content_type != "image/jpeg":
+            raise ImageError("Unexpected data after end of image")
+
+    def _on_detect(self, pos: int) -> Optional[int]:
+        head = bytes(self._buffer[pos : pos + len(PNG_SIGNATURE)])
+        if head.startswith(JPEG_SOI):
+            self._content_type, self._state = "image/jpeg", "jpeg_marker"
+            return pos + len(JPEG_SOI)
+        if len(head) < len(JPEG_SOI) and JPEG_SOI.startswith(head):
+            return None
+        if not PNG_SIGNATURE.startswith(head):
+            raise ImageError("Attachment must be PNG or JPEG image", unsupported=True)
+        if len(head) < len(PNG_SIGNATURE):
+            return None
+        self._content_type, self._state = "image/png", "png_header"
+        return pos + len(PNG_SIGNATURE)
+
+    # PNG
+
+    def _on_png_header(self, pos: int) -> Optional[int]:
+        if len(self._buffer) - pos < 8:
+            return None
+        length, kind = struct.unpack_from(">I4s", self._buffer, pos)
+        if length > _MAX_PNG_CHUNK or not kind.isalpha():
+            raise ImageError("Malformed PNG chunk header")
+        first = self._width == 0
+        if first != (kind == b"IHDR") or (kind == b"IHDR" and length != 13):
+            raise ImageError("PNG must start with a single IHDR chunk")
+        if kind == b"IEND" and (length != 0 or not self._seen_data):
+            raise ImageError("Malformed PNG end chunk")
+        self._kind, self._remaining = kind, length
+        self._crc = zlib.crc32(kind)
+        self._collected.clear()
+        self._state = "png_data"
+        return pos + 8
+
+    def _on_png_data(self, pos: int) -> Optional[int]:
+        take = min(self._remaining, len(self._buffer) - pos)
+        if take == 0 and self._remaining:
+            return None
+        data = self._buffer[pos : pos + take]
+        self._crc = zlib.crc32(data, self._crc)
+        if self._kind == b"IHDR":
+            self._collected += data
+        self._remaining -= take
+        if self._remaining == 0:
+            self._state = "png_crc"
+        return pos + take
+
+    def _on_png_crc(self, pos: int) -> Optional[int]:
+        if len(self._buffer) - pos < 4:
+            return None
+        (expected,) = struct.unpack_from(">I", self._buffer, pos)
+        if expected != self._crc:
+            raise ImageError(f"PNG chunk {self._kind.decode()} has a bad CRC")
+        if self._kind == b"IHDR":
+            width, height = struct.unpack_from(">II", self._collected)
+            if width == 0 or height == 0:
+                raise ImageError("PNG dimensions must be non-zero")
+            self._width, self._height = width, height
+        elif self._kind == b"IDAT":
+            self._seen_data = True
+        self._state = "done" if self._kind == b"IEND" else "png_header"
+        return pos + 4
+
+    # JPEG
+
+    def _on_jpeg_marker(self, pos: int) -> Optional[int]:
+        if pos >= len(self._buffer):
+            return None
+        if self._buffer[pos] != 0xFF:
+            raise ImageError("Expected a JPEG marker")
+        self._state = "jpeg_code"
+        return pos + 1
+
+    def _on_jpeg_code(self, pos: int) -> Optional[int]:
+        if pos >= len(self._buffer):
+            return None
+        code = self._buffer[pos]
+        if code == 0xFF:
+            # Fill byte before the marker code.
+            return pos + 1
+        if code == _JPEG_EOI:
+            if not self._seen_data:
+                raise ImageError("JPEG ends before any scan data")
+            self._state = "done"
+        elif code in _JPEG_STANDALONE:
+            self._state = "jpeg_marker"
+        elif code == 0x00 or code == JPEG_SOI[1]:
+            raise ImageError("Unexpected JPEG marker")
+        else:
+            self._kind = bytes([code])
+            self._state = "jpeg_length"
+        return pos + 1
+
+    def _on_jpeg_length(self, pos: int) -> Optional[int]:
+        if len(self._buffer) - pos < 2:
+            return None
+        (length,) = struct.unpack_from(">H", self._buffer, pos)
+        if length < 2:
+            raise ImageError("Malformed JPEG segment length")
+        code = self._kind[0]
+        if code in _JPEG_SOF and length < 8:
+            raise ImageError("Malformed JPEG frame header")
+        if code == _JPEG_SOS and self._width == 0:
+            raise ImageError("JPEG scan before frame header")
+        self._remaining = length - 2
+        self._collected.clear()
+        self._state = "jpeg_segment"
+        return pos + 2
+
+    def _on_jpeg_segment(self, pos: int) -> Optional[int]:
+        take = min(self._remaining, len(self._buffer) - pos)
+        if take == 0 and self._remaining:
+            return None
+        code = self._kind[0]
+        if code in _JPEG_SOF and len(self._collected) < 5:
+            self._collected += self._buffer[pos : pos + min(take, 5 - len(self._collected))]
+        self._remaining -= take
+        if self._remaining:
+            return pos + take
+        if code in _JPEG_SOF:
+            height, width = struct.unpack_from(">HH", self._collected, 1)
+            if width == 0 or height == 0:
+                raise ImageError("JPEG dimensions must be non-zero")
+            self._width, self._height = width, height
+        if code == _JPEG_SOS:
+            self._seen_data = True
+            self._state = "jpeg_entropy"
+        else:
+            self._state = "jpeg_marker"
+        return pos + take
+
+    def _on_jpeg_entropy(self, pos: int) -> Optional[int]:
+        # Scan data runs until a 0xFF that is not byte stuffing (FF 00), a
+        # restart marker (FF D0-D7) or fill (FF FF).
+        end = len(self._buffer)
+        while True:
+            marker = self._buffer.find(b"\xff", pos)
+            if marker == -1:
+                return end if end > pos else None
+            if marker + 1 >= end:
+                return marker if marker > pos else None
+            code = self._buffer[marker + 1]
+            if code == 0x00 or 0xD0 <= code <= 0xD7:
+                pos = marker + 2
+            elif code == 0xFF:
+                pos = marker + 1
+            else:
+                self._state = "jpeg_code"
+                return marker + 1
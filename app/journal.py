@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import pickle
+import re
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Final, Iterator, List, Literal, Optional, Tuple
+
+FsyncMode = Literal["always", "interval", "off"]
+
+# Every record is framed as (payload length, CRC32 of payload) + pickled payload.
+_FRAME: Final = struct.Struct(">II")
+_SNAPSHOT_MAGIC: Final = b"CHORESNAP1\n"
+_SEGMENT_RE: Final = re.compile(r"wal-(\d{12})\.log")
+_SNAPSHOT_RE: Final = re.compile(r"snapshot-(\d{12})\.pickle")
+
+
+class JournalError(RuntimeError):
+    pass
+
+
+def _segment_name(number: int) -> str:
+    return f"wal-{number:012d}.log"
+
+
+def _snapshot_name(segment: int) -> str:
+    return f"snapshot-{segment:012d}.pickle"
+
+
+def _numbered(directory: Path, pattern: re.Pattern[str]) -> List[int]:
+    return sorted(
+        int(match.group(1))
+        for name in os.listdir(directory)
+        if (match := pattern.fullmatch(name))
+    )
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """
+    Append-only log of store mutations, split into numbered segment files.
+
+    `append` writes the framed record to the current segment and returns its
+    log sequence number; `sync(lsn)` returns once that record is on disk. With
+    fsync mode "always" callers sync before acknowledging a write, and syncs
+    are group-committed: whoever gets the flush lock fsyncs everything written
+    so far, so writers queued behind it usually find their record already
+    durable. "interval" fsyncs from a background thread every
+    `interval` seconds (up to that much acknowledged data can be lost on a
+    crash); "off" leaves flushing to the OS.
+
+    `rotate` starts a new segment so that a snapshot can cover everything
+    before it, after which `drop_before` deletes the covered segments.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        segment: int,
+        *,
+        fsync: FsyncMode = "always",
+        interval: float = 0.05,
+    ) -> None:
+        self.directory = directory
+        self.fsync_mode = fsync
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._segment = segment
+        self._fd = self._open_segment(segment)
+        self._lsn = 0
+        self._synced_lsn = 0
+        self.records_since_rotate = 0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        if fsync == "interval":
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, args=(interval,), name="wal-fsync", daemon=True
+            )
+            self._flusher.start()
+
+    def _open_segment(self, number: int) -> int:
+        fd = os.open(
+            self.directory / _segment_name(number),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC,
+            0o600,
+        )
+        if self.fsync_mode != "off":
+            _fsync_dir(self.directory)
+        return fd
+
+    def append(self, record: Any) -> int:
+        payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            os.write(self._fd, frame)
+            self._lsn += 1
+            self.records_since_rotate += 1
+            return self._lsn
+
+    def sync(self, lsn: Optional[int] = None) -> None:
+        """
+        Make every record up to `lsn` (default: all appended so far) durable.
+        In "always" mode this is the commit point; other modes return at once.
+        """
+        if self.fsync_mode == "always":
+            self._fsync(lsn)
+
+    def _fsync(self, lsn: Optional[int]) -> None:
+        if lsn is not None and self._synced_lsn >= lsn:
+            return
+        with self._flush_lock:
+            if lsn is not None and self._synced_lsn >= lsn:
+                # Covered by the fsync of the writer we queued behind.
+                return
+            with self._lock:
+                upto, fd = self._lsn, self._fd
+            os.fsync(fd)
+            self._synced_lsn = max(self._synced_lsn, upto)
+
+    def _flush_periodically(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            if self._synced_lsn < self._lsn:
+                self._fsync(None)
+
+    def rotate(self) -> int:
+        """
+        Switch appends to a new segment and return its number. The caller
+        must keep writers out while it captures the state the new segment
+        starts from.
+        """
+        with self._flush_lock, self._lock:
+            old_fd = self._fd
+            if self.fsync_mode != "off":
+                os.fsync(old_fd)
+            self._segment += 1
+            self._fd = self._open_segment(self._segment)
+            self._synced_lsn = self._lsn
+            self.records_since_rotate = 0
+        os.close(old_fd)
+        return self._segment
+
+    def drop_before(self, segment: int) -> None:
+        for number in _numbered(self.directory, _SEGMENT_RE):
+            if number < segment:
+                (self.directory / _segment_name(number)).unlink(missing_ok=True)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._flush_lock, self._lock:
+            if self.fsync_mode != "off":
+                os.fsync(self._fd)
+            os.close(self._fd)
+
+
+def _read_segment(path: Path, *, last: bool) -> Iterator[Any]:
+    with open(path, "rb") as file:
+        # Slicing a memoryview does not copy each record out of the segment.
+        data = memoryview(file.read())
+    offset = 0
+    while offset < len(data):
+        header = data[offset : offset + _FRAME.size]
+        if len(header) == _FRAME.size:
+            length, crc = _FRAME.unpack(header)
+            start = offset + _FRAME.size
+            payload = data[start : start + length]
+            if len(payload) == length and zlib.crc32(payload) == crc:
+                yield pickle.loads(payload)
+                offset = start + length
+                continue
+        if not last:
+            raise JournalError(f"Corrupt record in {path.name} at offset {offset}")
+        # A torn write at the tail of the newest segment: the process died
+        # mid-append, so the record was never acknowledged. Cut it off.
+        with open(path, "r+b") as file:
+            file.truncate(offset)
+        return
+
+
+def write_snapshot(directory: Path, segment: int, state: Any, *, fsync: bool = True) -> None:
+    """
+    Atomically store `state` as the snapshot that segment `segment` continues
+    from, then delete older snapshots.
+    """
+    path = directory / _snapshot_name(segment)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as file:
+        file.write(_SNAPSHOT_MAGIC)
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(tmp, path)
+    if fsync:
+        _fsync_dir(directory)
+    for number in _numbered(directory, _SNAPSHOT_RE):
+        if number < segment:
+            (directory / _snapshot_name(number)).unlink(missing_ok=True)
+
+
+def recover(directory: Path) -> Tuple[Optional[Any], Iterator[Any], int]:
+    """
+    Load the newest snapshot and return it with an iterator over the log
+    records written after it, plus the number for the next fresh segment.
+    The snapshot is None when there is none yet.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    state = None
+    start = 0
+    snapshots = _numbered(directory, _SNAPSHOT_RE)
+    if snapshots:
+        start = snapshots[-1]
+        with open(directory / _snapshot_name(start), "rb") as file:
+            if file.read(len(_SNAPSHOT_MAGIC)) != _SNAPSHOT_MAGIC:
+                raise JournalError(f"{_snapshot_name(start)} is not a store snapshot")
+            state = pickle.load(file)
+    segments = [n for n in _numbered(directory, _SEGMENT_RE) if n >= start]
+
+    def records() -> Iterator[Any]:
+        for number in segments:
+            yield from _read_segment(
+                directory / _segment_name(number), last=number == segments[-1]
+            )
+
+    next_segment = max(segments[-1] if segments else start, start) + 1
+    return state, records(), next_segment
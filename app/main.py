@@ -1,22 +1,128 @@
+import asyncio
 import base64
 import binascii
+import os
 import secrets
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from http import HTTPStatus
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from uuid import uuid4
 
-from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field, field_validator
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing_extensions import TypedDict
 
+from app.attachment_gc import AttachmentCollector
 from app.config import get_settings
-from app.files import AttachmentError, save_attachment
-from app.notifications import NotificationClient, NotificationError, build_notification_client
-
-app = FastAPI(title="SecDev Course App", version="0.1.0")
+from app.files import (
+    AttachmentError,
+    AttachmentMeta,
+    AttachmentRoot,
+    AttachmentWriter,
+    attachment_digest,
+    check_declared_size,
+)
+from app.metrics import (
+    METRICS_CONTENT_TYPE,
+    Exposition,
+    MetricsMiddleware,
+    RequestMetrics,
+)
+from app.notifications import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_HALF_OPEN,
+    CIRCUIT_OPEN,
+    DELIVERY_OUTCOMES,
+    CircuitBreaker,
+    DeliveryOutcomes,
+    NotificationClient,
+    NotificationError,
+    RetryBudget,
+    build_notification_client,
+    create_http_client,
+)
+from app.outbox import OutboxDispatcher
+from app.profiling import profiling_middleware
+from app.responses import (
+    EncodedJSONResponse,
+    FileRangeResponse,
+    RangeNotSatisfiable,
+    RowSerializer,
+    etag_matches,
+    parse_range,
+)
+from app.storage import Repository, build_repository
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the store at boot so misconfiguration (e.g. several workers on the
+    # memory backend) fails the worker instead of every request.
+    get_repository()
+    settings = get_settings()
+    app.state.notification_http = create_http_client(settings)
+    app.state.notification_breaker = CircuitBreaker(
+        failure_threshold=settings.notify_breaker_threshold,
+        reset_timeout=settings.notify_breaker_reset_seconds,
+    )
+    app.state.retry_budget = RetryBudget(ratio=settings.notify_retry_budget_ratio)
+    app.state.notification_outcomes = DeliveryOutcomes()
+    app.state.outbox = OutboxDispatcher(
+        repository_factory=get_repository,
+        client_factory=lambda: NotificationClient(
+            settings=get_settings(),
+            http_client=app.state.notification_http,
+            max_attempts=1,
+            breaker=app.state.notification_breaker,
+            retry_budget=app.state.retry_budget,
+            outcomes=app.state.notification_outcomes,
+        ),
+        workers=settings.notify_outbox_workers,
+        concurrency=settings.notify_concurrency,
+        max_attempts=settings.notify_max_attempts,
+    )
+    app.state.outbox.start()
+    # Attachment disk I/O gets its own bounded pool so a slow volume cannot
+    # starve the request threadpool.
+    app.state.attachment_io = ThreadPoolExecutor(
+        max_workers=settings.attachment_io_workers, thread_name_prefix="attachment-io"
+    )
+    # Opened once; every attachment file operation is relative to this fd.
+    app.state.attachment_root = AttachmentRoot(settings.attachments_dir)
+    app.state.attachment_gc = AttachmentCollector(
+        repository_factory=get_repository,
+        root=app.state.attachment_root,
+        executor=app.state.attachment_io,
+    )
+    app.state.attachment_gc.start()
+    try:
+        yield
+    finally:
+        await app.state.attachment_gc.stop()
+        app.state.attachment_io.shutdown(wait=True)
+        app.state.attachment_root.close()
+        del app.state.attachment_gc, app.state.attachment_io, app.state.attachment_root
+        await app.state.outbox.stop()
+        await app.state.notification_http.aclose()
+        del app.state.outbox, app.state.notification_http
+        del app.state.notification_breaker, app.state.retry_budget
+        del app.state.notification_outcomes
+        reset_app_state()
+
+
+app = FastAPI(title="SecDev Course App", version="0.1.0", lifespan=lifespan)
+# Decides from settings when the middleware stack is built; a no-op unless
+# PROFILE_ENABLED is set.
+app.add_middleware(profiling_middleware, routes=app.routes)
+# Process-wide; survives lifespan restarts like any Prometheus counter would.
+request_metrics = RequestMetrics()
+app.add_middleware(MetricsMiddleware, metrics=request_metrics)
 
 class ApiError(Exception):
     def __init__(
@@ -28,6 +134,7 @@ class ApiError(Exception):
         type_: str = "about:blank",
         code: Optional[str] = None,
         extra: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
     ):
         self.status = status
         self.title = title
@@ -35,6 +142,7 @@ class ApiError(Exception):
         self.type_ = type_
         self.code = code
         self.extra = extra or {}
+        self.headers = headers
         super().__init__(detail)
 
 
@@ -54,7 +162,8 @@ def build_problem(
         "status": status,
         "detail": detail,
         "instance": str(request.url.path),
-        "correlation_id": str(uuid4()),
+        # Profiled requests already have one; it names their profile file.
+        "correlation_id": getattr(request.state, "correlation_id", None) or str(uuid4()),
     }
     if code:
         problem["code"] = code
@@ -74,7 +183,7 @@ async def api_error_handler(request: Request, exc: ApiError):
         code=exc.code,
         extra=exc.extra,
     )
-    return JSONResponse(status_code=exc.status, content=problem)
+    return JSONResponse(status_code=exc.status, content=problem, headers=exc.headers)
 
 
 @app.exception_handler(HTTPException)
@@ -137,40 +246,27 @@ def health():
     return {"status": "ok"}
 
 
-# Example storage for demo/testing purposes
+# Storage backend is selected via `Settings.storage_backend` and created lazily,
+# so tests can switch backends by adjusting the environment and resetting state.
 
-
-def _initial_state() -> Dict[str, Any]:
-    return {
-        "items": [],
-        "users": {},
-        "chores": {},
-        "assignments": {},
-        "attachments": {},
-        "sequence": {
-            "user": 1,
-            "chore": 1,
-            "assignment": 1,
-            "attachment": 1,
-        },
-    }
+_repository: Optional[Repository] = None
 
 
-_DB = _initial_state()
+def get_repository() -> Repository:
+    global _repository
+    if _repository is None:
+        _repository = build_repository(get_settings())
+    return _repository
 
 
 def reset_app_state() -> None:
     """
     Helper used by tests to reset in-memory state between runs.
     """
-    _DB.clear()
-    _DB.update(_initial_state())
-
-
-def _next_sequence(name: str) -> int:
-    sequence = _DB["sequence"][name]
-    _DB["sequence"][name] += 1
-    return sequence
+    global _repository
+    if _repository is not None:
+        _repository.close()
+    _repository = None
 
 
 def _parse_iso_datetime(value: str) -> datetime:
@@ -226,17 +322,16 @@ class ItemCreate(BaseModel):
 def create_item(
     payload: ItemCreate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    item = {"id": len(_DB["items"]) + 1, "name": payload.name}
-    _DB["items"].append(item)
-    return item
+    return repo.create_item(payload.name)
 
 
 @app.get("/items/{item_id}")
-def get_item(item_id: int):
-    for it in _DB["items"]:
-        if it["id"] == item_id:
-            return it
+def get_item(item_id: int, repo: Repository = Depends(get_repository)):
+    item = repo.get_item(item_id)
+    if item is not None:
+        return item
     raise ApiError(
         status=404,
         title="Not Found",
@@ -366,6 +461,36 @@ class AssignmentRead(AssignmentBase):
     status: AssignmentStatus
 
 
+# Store records as they are encoded for the *Read models above. Keep the
+# fields in sync with the models (tests compare them).
+
+
+class UserRow(TypedDict):
+    id: int
+    name: str
+
+
+class ChoreRow(TypedDict):
+    id: int
+    title: str
+    cadence: str
+    description: Optional[str]
+    owner_id: int
+
+
+class AssignmentRow(TypedDict):
+    id: int
+    user_id: int
+    chore_id: int
+    due_at: datetime
+    status: str
+
+
+USER_JSON = RowSerializer(UserRow)
+CHORE_JSON = RowSerializer(ChoreRow)
+ASSIGNMENT_JSON = RowSerializer(AssignmentRow)
+
+
 class AttachmentUpload(BaseModel):
     content: bytes = Field(
         ...,
@@ -391,14 +516,234 @@ class AssignmentStats(BaseModel):
     overdue: int
 
 
+class BulkNotifyRequest(BaseModel):
+    assignment_ids: Optional[List[int]] = Field(default=None, min_length=1, max_length=10_000)
+    status: Optional[AssignmentStatus] = None
+    due_from: Optional[datetime] = None
+    due_to: Optional[datetime] = None
+
+    @field_validator("due_from", "due_to", mode="before")
+    @classmethod
+    def parse_due(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return _parse_iso_datetime(value)
+        return value
+
+    @field_validator("due_from", "due_to")
+    @classmethod
+    def ensure_timezone(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+
+    @model_validator(mode="after")
+    def ensure_selection(self) -> "BulkNotifyRequest":
+        has_filter = self.status is not None or self.due_from or self.due_to
+        if (self.assignment_ids is None) == (not has_filter):
+            raise ValueError("provide either assignment_ids or a status/due filter")
+        if (self.due_from is None) != (self.due_to is None):
+            raise ValueError("due_from and due_to must be provided together")
+        if self.due_from is not None and self.status == AssignmentStatus.completed:
+            # The due window is served from the index of open assignments.
+            raise ValueError("a due window only selects assignments that are not completed")
+        return self
+
+
+class BulkNotifyResult(BaseModel):
+    assignment_id: int
+    status: str
+    notification_id: Optional[int] = None
+
+
+class BulkNotifyResponse(BaseModel):
+    queued: int
+    results: List[BulkNotifyResult]
+
+
+class NotificationRead(BaseModel):
+    id: int
+    assignment_id: int
+    status: str
+    attempts: int
+    next_attempt_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime
+    delivered_at: Optional[datetime] = None
+
+
+class CircuitBreakerStats(BaseModel):
+    state: str
+    consecutive_failures: int
+    calls: int
+    successes: int
+    failures: int
+    rejected: int
+    opened: int
+
+
+class RetryBudgetStats(BaseModel):
+    tokens: float
+    requests: int
+    retries: int
+    denied: int
+
+
+class NotificationStatsResponse(BaseModel):
+    circuit: CircuitBreakerStats
+    retry_budget: RetryBudgetStats
+
+
+class AttachmentStorageStats(BaseModel):
+    references: int
+    blobs: int
+    logical_bytes: int
+    stored_bytes: int
+    bytes_saved: int
+    dedup_ratio: float
+
+
 class StatsResponse(BaseModel):
     total_users: int
     total_chores: int
     assignments: AssignmentStats
+    attachments: AttachmentStorageStats
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+STREAM_PAGE_SIZE = 500
+_CURSOR_PREFIX = "id:"
+# Cursor of GET /assignments/due: "due:<due_at µs since epoch>:<id>".
+_DUE_CURSOR_PREFIX = "due:"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
+def _cursor_token(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
-def _get_user_or_404(user_id: int) -> Dict[str, Any]:
-    user = _DB["users"].get(user_id)
+
+def _encode_cursor(last_id: int) -> str:
+    return _cursor_token(f"{_CURSOR_PREFIX}{last_id}")
+
+
+def _cursor_payload(cursor: str, prefix: str) -> str:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    if not raw.startswith(prefix):
+        raise ValueError(raw)
+    return raw[len(prefix) :]
+
+
+def _invalid_cursor() -> ApiError:
+    return ApiError(
+        status=400,
+        title="Bad Request",
+        detail="Pagination cursor is invalid",
+        type_="https://example.com/problems/invalid-cursor",
+        code="invalid_cursor",
+    )
+
+
+def _decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        last_id = int(_cursor_payload(cursor, _CURSOR_PREFIX))
+        if last_id < 0:
+            raise ValueError(last_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise _invalid_cursor() from exc
+    return last_id
+
+
+def _encode_due_cursor(row: Dict[str, Any]) -> str:
+    micros = (row["due_at"] - _EPOCH) // timedelta(microseconds=1)
+    return _cursor_token(f"{_DUE_CURSOR_PREFIX}{micros}:{row['id']}")
+
+
+def _decode_due_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if not cursor:
+        return None
+    try:
+        micros, last_id = map(int, _cursor_payload(cursor, _DUE_CURSOR_PREFIX).split(":"))
+        if last_id < 0:
+            raise ValueError(last_id)
+        return _EPOCH + timedelta(microseconds=micros), last_id
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError) as exc:
+        raise _invalid_cursor() from exc
+
+
+def _stream_ndjson(
+    fetch: Callable[[int, Optional[int]], List[Dict[str, Any]]],
+    serializer: RowSerializer,
+    after_id: int,
+    limit: Optional[int],
+) -> Iterator[bytes]:
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = STREAM_PAGE_SIZE if remaining is None else min(remaining, STREAM_PAGE_SIZE)
+        rows = fetch(after_id, page_size)
+        for row in rows:
+            yield serializer.row(row) + b"\n"
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1]["id"]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def _validators(version: int) -> Dict[str, str]:
+    # Weak: the version says the data is unchanged, not that the bytes are.
+    # no-cache makes clients revalidate on every poll instead of reusing a
+    # stale copy.
+    return {"ETag": f'W/"{version}"', "Cache-Control": "private, no-cache"}
+
+
+def _not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return None
+
+
+def _paginate(
+    request: Request,
+    fetch: Callable[[int, Optional[int]], List[Dict[str, Any]]],
+    serializer: RowSerializer,
+    limit: Optional[int],
+    cursor: Optional[str],
+    version: int,
+) -> Response:
+    """
+    Serve a list endpoint either as a JSON array page (next page cursor in
+    `X-Next-Cursor`) or, for `Accept: application/x-ndjson`, as a stream of
+    rows fetched page by page so the full collection is never materialised.
+
+    JSON pages carry an ETag built from the collection `version`, and a
+    matching `If-None-Match` is answered with 304 before anything is fetched.
+    The version must be read before the rows: a write in between then only
+    costs the client one extra full response.
+    """
+    after_id = _decode_cursor(cursor)
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _stream_ndjson(fetch, serializer, after_id, limit),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers={"Vary": "Accept"},
+        )
+    headers = {**_validators(version), "Vary": "Accept"}
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+    rows = fetch(after_id, limit)
+    if limit is not None and len(rows) == limit:
+        headers[NEXT_CURSOR_HEADER] = _encode_cursor(rows[-1]["id"])
+    return EncodedJSONResponse(serializer.rows(rows), headers=headers)
+
+
+def _get_user_or_404(repo: Repository, user_id: int) -> Dict[str, Any]:
+    user = repo.get_user(user_id)
     if not user:
         raise ApiError(
             status=404,
@@ -410,8 +755,8 @@ def _get_user_or_404(user_id: int) -> Dict[str, Any]:
     return user
 
 
-def _get_chore_or_404(chore_id: int) -> Dict[str, Any]:
-    chore = _DB["chores"].get(chore_id)
+def _get_chore_or_404(repo: Repository, chore_id: int) -> Dict[str, Any]:
+    chore = repo.get_chore(chore_id)
     if not chore:
         raise ApiError(
             status=404,
@@ -423,8 +768,8 @@ def _get_chore_or_404(chore_id: int) -> Dict[str, Any]:
     return chore
 
 
-def _get_assignment_or_404(assignment_id: int) -> Dict[str, Any]:
-    assignment = _DB["assignments"].get(assignment_id)
+def _get_assignment_or_404(repo: Repository, assignment_id: int) -> Dict[str, Any]:
+    assignment = repo.get_assignment(assignment_id)
     if not assignment:
         raise ApiError(
             status=404,
@@ -440,44 +785,77 @@ def _get_assignment_or_404(assignment_id: int) -> Dict[str, Any]:
 def create_user(
     payload: UserCreate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    user_id = _next_sequence("user")
-    user = {"id": user_id, "name": payload.name}
-    _DB["users"][user_id] = user
-    return user
+    return repo.create_user(payload.name)
 
 
 @app.get("/users", response_model=List[UserRead])
-def list_users(_: None = Depends(require_api_key)):
-    return list(_DB["users"].values())
+def list_users(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, max_length=64),
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    return _paginate(
+        request,
+        lambda after_id, page: repo.list_users(after_id=after_id, limit=page),
+        USER_JSON,
+        limit,
+        cursor,
+        repo.collection_version("users"),
+    )
 
 
 @app.post("/chores", status_code=201, response_model=ChoreRead)
 def create_chore(
     payload: ChoreCreate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    _get_user_or_404(payload.owner_id)
-    chore_id = _next_sequence("chore")
-    chore = {
-        "id": chore_id,
-        "title": payload.title,
-        "cadence": payload.cadence,
-        "description": payload.description,
-        "owner_id": payload.owner_id,
-    }
-    _DB["chores"][chore_id] = chore
-    return chore
+    _get_user_or_404(repo, payload.owner_id)
+    return repo.create_chore(
+        {
+            "title": payload.title,
+            "cadence": payload.cadence.value,
+            "description": payload.description,
+            "owner_id": payload.owner_id,
+        }
+    )
 
 
 @app.get("/chores", response_model=List[ChoreRead])
-def list_chores(_: None = Depends(require_api_key)):
-    return list(_DB["chores"].values())
+def list_chores(
+    request: Request,
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, max_length=64),
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    return _paginate(
+        request,
+        lambda after_id, page: repo.list_chores(after_id=after_id, limit=page),
+        CHORE_JSON,
+        limit,
+        cursor,
+        repo.collection_version("chores"),
+    )
 
 
 @app.get("/chores/{chore_id}", response_model=ChoreRead)
-def get_chore(chore_id: int, _: None = Depends(require_api_key)):
-    return _get_chore_or_404(chore_id)
+def get_chore(
+    chore_id: int,
+    request: Request,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    chore = _get_chore_or_404(repo, chore_id)
+    headers = _validators(chore["version"])
+    not_modified = _not_modified(request, headers)
+    if not_modified is not None:
+        return not_modified
+    return EncodedJSONResponse(CHORE_JSON.row(chore), headers=headers)
 
 
 @app.put("/chores/{chore_id}", response_model=ChoreRead)
@@ -485,95 +863,280 @@ def update_chore(
     chore_id: int,
     payload: ChoreUpdate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    chore = _get_chore_or_404(chore_id).copy()
-    update_data = payload.model_dump(exclude_unset=True)
+    _get_chore_or_404(repo, chore_id)
+    update_data = payload.model_dump(exclude_unset=True, mode="json")
     owner_id = update_data.get("owner_id")
     if owner_id is not None:
-        _get_user_or_404(owner_id)
-    chore.update(update_data)
-    _DB["chores"][chore_id] = chore
+        _get_user_or_404(repo, owner_id)
+    chore = repo.update_chore(chore_id, update_data)
+    if chore is None:
+        _get_chore_or_404(repo, chore_id)
     return chore
 
 
 @app.delete("/chores/{chore_id}", status_code=204)
-def delete_chore(chore_id: int, _: None = Depends(require_api_key)):
-    _get_chore_or_404(chore_id)
-    _DB["chores"].pop(chore_id, None)
-    for assignment_id, assignment in list(_DB["assignments"].items()):
-        if assignment["chore_id"] == chore_id:
-            _DB["assignments"].pop(assignment_id, None)
-    attachments = _DB["attachments"].pop(chore_id, [])
-    settings = get_settings()
-    for attachment in attachments:
-        try:
-            (settings.attachments_dir / attachment["filename"]).unlink(missing_ok=True)
-        except FileNotFoundError:
-            continue
-        except OSError:
-            # Best-effort cleanup; surfacing errors would leak storage layout.
-            continue
+async def delete_chore(
+    chore_id: int,
+    request: Request,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    await run_in_threadpool(_get_chore_or_404, repo, chore_id)
+    attachments = await run_in_threadpool(repo.delete_chore, chore_id)
+    # Files are removed in the background; the response does not wait on disk.
+    request.app.state.attachment_gc.schedule(a["filename"] for a in attachments)
     return None
 
 
+async def _run_attachment_io(request: Request, func: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app.state.attachment_io, func, *args)
+
+
+def _attachment_problem(exc: AttachmentError) -> ApiError:
+    return ApiError(
+        status=exc.status,
+        title="Bad Request",
+        detail=exc.detail,
+        type_="https://example.com/problems/attachment-error",
+        code=exc.code,
+    )
+
+
+def _record_attachment(
+    repo: Repository, chore_id: int, meta: AttachmentMeta
+) -> Dict[str, Any]:
+    return repo.add_attachment(
+        chore_id,
+        {
+            "filename": meta.filename,
+            "content_type": meta.content_type,
+            "size": meta.size,
+            "width": meta.width,
+            "height": meta.height,
+        },
+    )
+
+
+async def _store_attachment(
+    request: Request, repo: Repository, chore_id: int, writer: AttachmentWriter
+) -> Dict[str, Any]:
+    """
+    Link a finished upload into place and record it. The file reference is
+    taken before linking and dropped once the record holds its own, so the
+    collector cannot remove a stored file this upload reuses in between.
+    """
+    meta = await _run_attachment_io(request, writer.finish)
+    await run_in_threadpool(repo.acquire_attachment_file, meta.filename, meta.size)
+    try:
+        await _run_attachment_io(request, writer.commit)
+        return await run_in_threadpool(_record_attachment, repo, chore_id, meta)
+    finally:
+        if await run_in_threadpool(repo.release_attachment_file, meta.filename):
+            # The upload failed and nothing else uses the file.
+            request.app.state.attachment_gc.schedule([meta.filename])
+
+
 @app.post("/chores/{chore_id}/attachments", status_code=201)
-def upload_chore_attachment(
+async def upload_chore_attachment(
     chore_id: int,
     payload: AttachmentUpload,
+    request: Request,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    _get_chore_or_404(chore_id)
+    await run_in_threadpool(_get_chore_or_404, repo, chore_id)
     data = payload.content
-    settings = get_settings()
     try:
-        meta = save_attachment(settings.attachments_dir, data)
+        writer = await _run_attachment_io(
+            request, AttachmentWriter, request.app.state.attachment_root
+        )
+        try:
+            await _run_attachment_io(request, writer.write, data)
+            return await _store_attachment(request, repo, chore_id, writer)
+        finally:
+            await _run_attachment_io(request, writer.abort)
     except AttachmentError as exc:
-        raise ApiError(
-            status=exc.status,
-            title="Bad Request",
-            detail=exc.detail,
-            type_="https://example.com/problems/attachment-error",
-            code=exc.code,
-        ) from exc
-    attachment = {
-        "id": _next_sequence("attachment"),
-        "chore_id": chore_id,
-        "filename": meta.filename,
-        "content_type": meta.content_type,
-        "size": meta.size,
-    }
-    _DB["attachments"].setdefault(chore_id, []).append(attachment)
-    return attachment
+        raise _attachment_problem(exc) from exc
+
+
+@app.post("/chores/{chore_id}/attachments/stream", status_code=201)
+async def stream_chore_attachment(
+    chore_id: int,
+    request: Request,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    """
+    Upload the raw image as the request body. It is written to disk chunk by
+    chunk as it arrives instead of being buffered and base64-decoded.
+    """
+    await run_in_threadpool(_get_chore_or_404, repo, chore_id)
+    try:
+        check_declared_size(request.headers.get("content-length"))
+        writer = await _run_attachment_io(
+            request, AttachmentWriter, request.app.state.attachment_root
+        )
+        try:
+            async for chunk in request.stream():
+                await _run_attachment_io(request, writer.write, chunk)
+            return await _store_attachment(request, repo, chore_id, writer)
+        finally:
+            await _run_attachment_io(request, writer.abort)
+    except AttachmentError as exc:
+        raise _attachment_problem(exc) from exc
+
+
+# Content-addressed files never change, so clients may cache them indefinitely.
+ATTACHMENT_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def _attachment_not_found() -> ApiError:
+    return ApiError(
+        status=404,
+        title="Not Found",
+        detail="Attachment not found",
+        type_="https://example.com/problems/attachment-not-found",
+        code="attachment_not_found",
+    )
+
+
+@app.get("/chores/{chore_id}/attachments/{attachment_id}")
+def download_chore_attachment(
+    chore_id: int,
+    attachment_id: int,
+    request: Request,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    _get_chore_or_404(repo, chore_id)
+    attachment = next(
+        (a for a in repo.list_attachments(chore_id) if a["id"] == attachment_id), None
+    )
+    if attachment is None:
+        raise _attachment_not_found()
+    try:
+        file = request.app.state.attachment_root.open(attachment["filename"])
+    except AttachmentError as exc:
+        raise _attachment_problem(exc) from exc
+    except FileNotFoundError as exc:
+        raise _attachment_not_found() from exc
+    try:
+        etag = f'"{attachment_digest(attachment["filename"], file)}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": ATTACHMENT_CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+            "X-Content-Type-Options": "nosniff",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            file.close()
+            return Response(status_code=304, headers=headers)
+        size = os.fstat(file.fileno()).st_size
+        byte_range = None
+        # A stale If-Range validator means the client's partial copy is
+        # outdated, so it gets the whole file instead.
+        if request.headers.get("if-range", etag) == etag:
+            try:
+                byte_range = parse_range(request.headers.get("range"), size)
+            except RangeNotSatisfiable as exc:
+                raise ApiError(
+                    status=416,
+                    title="Range Not Satisfiable",
+                    detail="Requested range is outside the attachment",
+                    type_="https://example.com/problems/attachment-range",
+                    code="attachment_range_not_satisfiable",
+                    headers={"Content-Range": f"bytes */{size}"},
+                ) from exc
+    except BaseException:
+        file.close()
+        raise
+    if byte_range is None:
+        return FileRangeResponse(
+            file, offset=0, length=size, headers=headers, media_type=attachment["content_type"]
+        )
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(
+        file,
+        offset=start,
+        length=end - start + 1,
+        status_code=206,
+        headers=headers,
+        media_type=attachment["content_type"],
+    )
 
 
 @app.post("/assignments", status_code=201, response_model=AssignmentRead)
 def create_assignment(
     payload: AssignmentCreate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    _get_user_or_404(payload.user_id)
-    _get_chore_or_404(payload.chore_id)
-    assignment_id = _next_sequence("assignment")
-    assignment = {
-        "id": assignment_id,
-        "user_id": payload.user_id,
-        "chore_id": payload.chore_id,
-        "due_at": payload.due_at,
-        "status": payload.status,
-    }
-    _DB["assignments"][assignment_id] = assignment
-    return assignment
+    _get_user_or_404(repo, payload.user_id)
+    _get_chore_or_404(repo, payload.chore_id)
+    return repo.create_assignment(
+        {
+            "user_id": payload.user_id,
+            "chore_id": payload.chore_id,
+            "due_at": payload.due_at,
+            "status": payload.status.value,
+        }
+    )
 
 
 @app.get("/assignments", response_model=List[AssignmentRead])
 def list_assignments(
+    request: Request,
     status: Optional[AssignmentStatus] = Query(default=None),
+    user_id: Optional[int] = Query(default=None, gt=0),
+    chore_id: Optional[int] = Query(default=None, gt=0),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, max_length=64),
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    status_value = status.value if status is not None else None
+    return _paginate(
+        request,
+        lambda after_id, page: repo.list_assignments(
+            status_value,
+            user_id=user_id,
+            chore_id=chore_id,
+            after_id=after_id,
+            limit=page,
+        ),
+        ASSIGNMENT_JSON,
+        limit,
+        cursor,
+        repo.collection_version("assignments"),
+    )
+
+
+@app.get("/assignments/due", response_model=List[AssignmentRead])
+def list_due_assignments(
+    start: datetime = Query(alias="from"),
+    end: datetime = Query(alias="to"),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None, max_length=64),
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    assignments = list(_DB["assignments"].values())
-    if status is not None:
-        assignments = [a for a in assignments if a["status"] == status]
-    return assignments
+    start, end = (
+        value.replace(tzinfo=timezone.utc)
+        if value.tzinfo is None
+        else value.astimezone(timezone.utc)
+        for value in (start, end)
+    )
+    rows = repo.list_open_due_between(
+        start, end, after=_decode_due_cursor(cursor), limit=limit
+    )
+    headers = {}
+    if limit is not None and len(rows) == limit:
+        headers[NEXT_CURSOR_HEADER] = _encode_due_cursor(rows[-1])
+    return EncodedJSONResponse(ASSIGNMENT_JSON.rows(rows), headers=headers)
 
 
 @app.patch("/assignments/{assignment_id}", response_model=AssignmentRead)
@@ -581,27 +1144,33 @@ def update_assignment(
     assignment_id: int,
     payload: AssignmentUpdate,
     _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
 ):
-    assignment = _get_assignment_or_404(assignment_id).copy()
+    _get_assignment_or_404(repo, assignment_id)
     update_data = payload.model_dump(exclude_unset=True)
+    changes: Dict[str, Any] = {}
     if "status" in update_data and update_data["status"] is not None:
-        assignment["status"] = update_data["status"]
+        changes["status"] = update_data["status"].value
     if "due_at" in update_data and update_data["due_at"] is not None:
-        assignment["due_at"] = update_data["due_at"]
-    _DB["assignments"][assignment_id] = assignment
+        changes["due_at"] = update_data["due_at"]
+    assignment = repo.update_assignment(assignment_id, changes)
+    if assignment is None:
+        _get_assignment_or_404(repo, assignment_id)
     return assignment
 
 
-@app.post("/assignments/{assignment_id}/notify")
-def notify_assignment(
-    assignment_id: int,
-    client: NotificationClient = Depends(build_notification_client),
-    _: None = Depends(require_api_key),
-):
-    assignment = _get_assignment_or_404(assignment_id)
-    chore = _get_chore_or_404(assignment["chore_id"])
-    user = _get_user_or_404(assignment["user_id"])
-    payload = {
+def _build_notification_payload(repo: Repository, assignment_id: int) -> Dict[str, Any]:
+    assignment = _get_assignment_or_404(repo, assignment_id)
+    chore = _get_chore_or_404(repo, assignment["chore_id"])
+    user = _get_user_or_404(repo, assignment["user_id"])
+    return _notification_payload(assignment, chore, user)
+
+
+def _notification_payload(
+    assignment: Dict[str, Any], chore: Dict[str, Any], user: Dict[str, Any]
+) -> Dict[str, Any]:
+    assignment_id = assignment["id"]
+    return {
         "assignment_id": assignment_id,
         "chore_title": chore["title"],
         "user_id": user["id"],
@@ -612,8 +1181,97 @@ def notify_assignment(
         if isinstance(assignment["status"], AssignmentStatus)
         else assignment["status"],
     }
+
+
+@app.post("/assignments/{assignment_id}/notify")
+async def notify_assignment(
+    assignment_id: int,
+    request: Request,
+    client: NotificationClient = Depends(build_notification_client),
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    # Storage calls may block (SQLite), so keep them off the event loop.
+    payload = await run_in_threadpool(_build_notification_payload, repo, assignment_id)
+    try:
+        client.check_configured()
+    except NotificationError as exc:
+        raise ApiError(
+            status=exc.status,
+            title="Notification Failed",
+            detail=exc.detail,
+            type_="https://example.com/problems/notification-error",
+            code=exc.code,
+        ) from exc
+    # Delivery happens in the outbox workers; the request only records it.
+    notification = await run_in_threadpool(
+        repo.enqueue_notification, assignment_id, payload, datetime.now(timezone.utc)
+    )
+    request.app.state.outbox.wake()
+    return {"status": "queued", "notification_id": notification["id"]}
+
+
+def _select_bulk_assignments(
+    repo: Repository, request: BulkNotifyRequest
+) -> List[Dict[str, Any]]:
+    status = request.status.value if request.status is not None else None
+    if request.due_from is not None and request.due_to is not None:
+        due = repo.list_open_due_between(request.due_from, request.due_to)
+        return [a for a in due if status is None or a["status"] == status]
+    return repo.list_assignments(status)
+
+
+def _enqueue_bulk_notifications(
+    repo: Repository, request: BulkNotifyRequest
+) -> BulkNotifyResponse:
+    if request.assignment_ids is not None:
+        requested = list(dict.fromkeys(request.assignment_ids))
+        found = {i: repo.get_assignment(i) for i in requested}
+    else:
+        selected = _select_bulk_assignments(repo, request)
+        requested = [a["id"] for a in selected]
+        found = {a["id"]: a for a in selected}
+    # Chores and users repeat across assignments; look each up only once.
+    chores: Dict[int, Optional[Dict[str, Any]]] = {}
+    users: Dict[int, Optional[Dict[str, Any]]] = {}
+    entries = []
+    for assignment_id in requested:
+        assignment = found[assignment_id]
+        if assignment is None:
+            continue
+        chore_id, user_id = assignment["chore_id"], assignment["user_id"]
+        if chore_id not in chores:
+            chores[chore_id] = repo.get_chore(chore_id)
+        if user_id not in users:
+            users[user_id] = repo.get_user(user_id)
+        if chores[chore_id] is None or users[user_id] is None:
+            continue
+        entries.append(
+            (assignment_id, _notification_payload(assignment, chores[chore_id], users[user_id]))
+        )
+    queued = repo.enqueue_notifications(entries, datetime.now(timezone.utc))
+    notification_ids = {n["assignment_id"]: n["id"] for n in queued}
+    results = [
+        BulkNotifyResult(
+            assignment_id=assignment_id,
+            status="queued" if assignment_id in notification_ids else "not_found",
+            notification_id=notification_ids.get(assignment_id),
+        )
+        for assignment_id in requested
+    ]
+    return BulkNotifyResponse(queued=len(queued), results=results)
+
+
+@app.post("/assignments/notify", response_model=BulkNotifyResponse)
+async def notify_assignments_bulk(
+    payload: BulkNotifyRequest,
+    request: Request,
+    client: NotificationClient = Depends(build_notification_client),
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
     try:
-        client.send(payload)
+        client.check_configured()
     except NotificationError as exc:
         raise ApiError(
             status=exc.status,
@@ -622,30 +1280,124 @@ def notify_assignment(
             type_="https://example.com/problems/notification-error",
             code=exc.code,
         ) from exc
-    return {"status": "queued"}
+    # Payloads are built in one pass and queued in a single write; the outbox
+    # workers deliver them with at most NOTIFY_CONCURRENCY calls in flight.
+    response = await run_in_threadpool(_enqueue_bulk_notifications, repo, payload)
+    request.app.state.outbox.wake()
+    return response
+
+
+@app.get("/notifications/{notification_id}", response_model=NotificationRead)
+def get_notification(
+    notification_id: int,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    notification = repo.get_notification(notification_id)
+    if notification is None:
+        raise ApiError(
+            status=404,
+            title="Not Found",
+            detail="Notification not found",
+            type_="https://example.com/problems/notification-not-found",
+            code="notification_not_found",
+        )
+    return notification
+
+
+@app.get("/stats/notifications", response_model=NotificationStatsResponse)
+def get_notification_stats(
+    request: Request,
+    _: None = Depends(require_api_key),
+):
+    return NotificationStatsResponse(
+        circuit=request.app.state.notification_breaker.snapshot(),
+        retry_budget=request.app.state.retry_budget.snapshot(),
+    )
 
 
 @app.get("/stats", response_model=StatsResponse)
-def get_stats(_: None = Depends(require_api_key)):
-    assignments = list(_DB["assignments"].values())
+def get_stats(
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
     by_status: Dict[str, int] = {status.value: 0 for status in AssignmentStatus}
-    for assignment in assignments:
-        key = assignment["status"].value
-        by_status[key] = by_status.get(key, 0) + 1
-    now = datetime.now(timezone.utc)
-    overdue = sum(
-        1
-        for assignment in assignments
-        if assignment["status"] != AssignmentStatus.completed
-        and assignment["due_at"] < now
-    )
+    by_status.update(repo.count_assignments_by_status())
+    overdue = repo.count_overdue(datetime.now(timezone.utc))
+    storage = repo.attachment_storage_stats()
     payload = StatsResponse(
-        total_users=len(_DB["users"]),
-        total_chores=len(_DB["chores"]),
+        total_users=repo.count_users(),
+        total_chores=repo.count_chores(),
         assignments=AssignmentStats(
-            total=len(assignments),
+            total=sum(by_status.values()),
             by_status=by_status,
             overdue=overdue,
         ),
+        attachments=AttachmentStorageStats(
+            **storage,
+            bytes_saved=storage["logical_bytes"] - storage["stored_bytes"],
+            dedup_ratio=(
+                storage["logical_bytes"] / storage["stored_bytes"]
+                if storage["stored_bytes"]
+                else 1.0
+            ),
+        ),
     )
     return payload
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(
+    request: Request,
+    _: None = Depends(require_api_key),
+    repo: Repository = Depends(get_repository),
+):
+    out = Exposition()
+    request_metrics.write(out)
+    sizes = {
+        "users": repo.count_users(),
+        "chores": repo.count_chores(),
+        "assignments": sum(repo.count_assignments_by_status().values()),
+    }
+    out.family(
+        "store_records",
+        "gauge",
+        "Records held by the store per collection.",
+        (("", {"collection": name}, count) for name, count in sizes.items()),
+    )
+    storage = repo.attachment_storage_stats()
+    out.gauge(
+        "attachment_stored_bytes",
+        "Bytes of attachment files on disk after deduplication.",
+        storage["stored_bytes"],
+    )
+    out.gauge(
+        "attachment_logical_bytes",
+        "Bytes of attachments as uploaded, counting duplicates.",
+        storage["logical_bytes"],
+    )
+    out.gauge("attachment_blobs", "Distinct attachment files on disk.", storage["blobs"])
+    out.gauge("attachment_references", "Attachment records.", storage["references"])
+    outcomes = request.app.state.notification_outcomes.snapshot()
+    out.family(
+        "notification_attempts_total",
+        "counter",
+        "Webhook delivery attempts by outcome.",
+        (("", {"outcome": outcome}, outcomes[outcome]) for outcome in DELIVERY_OUTCOMES),
+    )
+    circuit = request.app.state.notification_breaker.snapshot()
+    out.family(
+        "notification_circuit_state",
+        "gauge",
+        "1 for the webhook circuit breaker's current state.",
+        (
+            ("", {"state": state}, int(circuit["state"] == state))
+            for state in (CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN)
+        ),
+    )
+    out.gauge(
+        "notification_retry_budget_tokens",
+        "Retries currently available from the shared retry budget.",
+        request.app.state.retry_budget.snapshot()["tokens"],
+    )
+    return PlainTextResponse(out.render(), media_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, Final, Iterable, List, Mapping, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+METRICS_CONTENT_TYPE: Final = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS: Final = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+UNMATCHED_ROUTE: Final = "unmatched"
+# Anything else is reported as "OTHER" so junk methods cannot add series.
+_METHODS: Final = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+Labels = Mapping[str, str]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class Exposition:
+    """
+    Builder for the Prometheus text format (version 0.0.4): one `# HELP` and
+    `# TYPE` header per family followed by its samples.
+    """
+
+    def __init__(self) -> None:
+        self._lines: List[str] = []
+
+    def family(
+        self,
+        name: str,
+        kind: str,
+        help_text: str,
+        samples: Iterable[Tuple[str, Labels, float]],
+    ) -> None:
+        """
+        `samples` are (name suffix, labels, value), e.g. ("_bucket", {"le": "0.1"}, 3).
+        """
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            if labels:
+                rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                self._lines.append(f"{name}{suffix}{{{rendered}}} {_number(value)}")
+            else:
+                self._lines.append(f"{name}{suffix} {_number(value)}")
+
+    def gauge(self, name: str, help_text: str, value: float) -> None:
+        self.family(name, "gauge", help_text, [("", {}, value)])
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. `counts[i]` holds observations in
+    (buckets[i-1], buckets[i]]; the extra last slot is the +Inf overflow.
+    Cumulative bucket values are only computed when rendering.
+    """
+
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, labels: Labels) -> Iterable[Tuple[str, Labels, float]]:
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            cumulative += count
+            yield "_bucket", {**labels, "le": _number(bound)}, cumulative
+        yield "_sum", labels, self.sum
+        yield "_count", labels, cumulative
+
+
+class RequestMetrics:
+    """
+    Per-route request counters, latency histograms and the in-flight gauge.
+    Only MetricsMiddleware writes them, always from the event loop, so plain
+    dicts and ints need no lock on the hot path. `write` may run in another
+    thread and works from `dict.copy()` snapshots, which are atomic under the
+    GIL; a histogram caught mid-update is off by one observation at most.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float) -> None:
+        if method not in _METHODS:
+            method = "OTHER"
+        key = (method, route, f"{status // 100}xx")
+        self.requests[key] = self.requests.get(key, 0) + 1
+        histogram = self.latency.get((method, route))
+        if histogram is None:
+            histogram = self.latency[(method, route)] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def write(self, out: Exposition) -> None:
+        out.family(
+            "http_requests_total",
+            "counter",
+            "HTTP requests by method, route template and status class.",
+            (
+                ("", {"method": method, "route": route, "status": status}, count)
+                for (method, route, status), count in sorted(self.requests.copy().items())
+            ),
+        )
+        out.gauge(
+            "http_requests_in_flight", "HTTP requests currently being served.", self.in_flight
+        )
+        out.family(
+            "http_request_duration_seconds",
+            "histogram",
+            "Time from receiving a request to finishing its response.",
+            (
+                sample
+                for (method, route), histogram in sorted(self.latency.copy().items())
+                for sample in histogram.samples({"method": method, "route": route})
+            ),
+        )
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware feeding RequestMetrics. Requests are labelled with
+    the route template the router matched (`/chores/{chore_id}`, not the raw
+    path) so series stay bounded; paths no route matched share "unmatched".
+    An exception escaping the app is counted as a 500.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics = self.metrics
+        metrics.in_flight += 1
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - start
+            metrics.in_flight -= 1
+            route = scope.get("route")
+            metrics.observe(
+                scope["method"],
+                getattr(route, "path", UNMATCHED_ROUTE),
+                status,
+                elapsed,
+            )
@@ -0,0 +1,64 @@
+"""
+Move attachment files from the old flat layout into shard directories.
+
+    python -m app.migrate_attachments [--batch 500] [--pause 0.05]
+
+Safe to run while the app is serving: readers fall back to the flat location,
+and each file is linked into its shard before the flat name is removed. The
+remaining flat files are the only state, so an interrupted run is resumed by
+starting the command again.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Optional
+
+from app.config import get_settings
+from app.files import AttachmentRoot
+
+
+def migrate(
+    root: AttachmentRoot,
+    *,
+    batch: int = 500,
+    pause: float = 0.0,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Move every flat file into its shard and return how many were moved.
+    `on_progress` is called with the running total after each batch.
+    """
+    moved = 0
+    while names := root.flat_files(limit=batch):
+        moved += sum(root.migrate(name) for name in names)
+        if on_progress is not None:
+            on_progress(moved)
+        if pause:
+            # Leave disk bandwidth to the serving app between batches.
+            time.sleep(pause)
+    return moved
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0)
+    args = parser.parse_args()
+
+    root = AttachmentRoot(get_settings().attachments_dir)
+    try:
+        moved = migrate(
+            root,
+            batch=args.batch,
+            pause=args.pause,
+            on_progress=lambda total: print(f"moved {total} files", flush=True),
+        )
+    finally:
+        root.close()
+    print(f"done: {moved} files moved")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import threading
 import time
 from dataclasses import dataclass, field
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
 from urllib.parse import urlparse
 
 import httpx
+from fastapi import Request
 
 from app.config import Settings, get_settings
 
@@ -18,13 +22,215 @@ class NotificationError(Exception):
         super().__init__(detail)
 
 
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    Process-wide breaker for the webhook. After `failure_threshold` consecutive
+    failures the circuit opens and calls are rejected without touching the
+    network. Once `reset_timeout` has passed it goes half-open and lets
+    `half_open_max_calls` probes through: a success closes it again, a failure
+    re-opens it for another `reset_timeout`.
+    """
+
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    half_open_max_calls: int = 1
+    clock: Callable[[], float] = time.monotonic
+    _state: str = field(default=CIRCUIT_CLOSED, init=False)
+    _consecutive_failures: int = field(default=0, init=False)
+    _opened_at: float = field(default=0.0, init=False)
+    _probes_in_flight: int = field(default=0, init=False)
+    _counters: Dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(
+            ("calls", "successes", "failures", "rejected", "opened"), 0
+        ),
+        init=False,
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def _current_state(self) -> str:
+        # Caller holds the lock. Open -> half-open happens lazily on read.
+        if (
+            self._state == CIRCUIT_OPEN
+            and self.clock() - self._opened_at >= self.reset_timeout
+        ):
+            self._state = CIRCUIT_HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def _open(self) -> None:
+        self._state = CIRCUIT_OPEN
+        self._opened_at = self.clock()
+        self._probes_in_flight = 0
+        self._counters["opened"] += 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CIRCUIT_OPEN or (
+                state == CIRCUIT_HALF_OPEN
+                and self._probes_in_flight >= self.half_open_max_calls
+            ):
+                self._counters["rejected"] += 1
+                return False
+            if state == CIRCUIT_HALF_OPEN:
+                self._probes_in_flight += 1
+            self._counters["calls"] += 1
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._consecutive_failures = 0
+            if self._current_state() == CIRCUIT_HALF_OPEN:
+                self._state = CIRCUIT_CLOSED
+                self._probes_in_flight = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._counters["failures"] += 1
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == CIRCUIT_HALF_OPEN or (
+                state == CIRCUIT_CLOSED
+                and self._consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def release(self) -> None:
+        """
+        Give back a half-open probe slot for a call that ended without an
+        outcome (e.g. it was cancelled).
+        """
+        with self._lock:
+            if self._state == CIRCUIT_HALF_OPEN and self._probes_in_flight:
+                self._probes_in_flight -= 1
+
+    def retry_after(self) -> float:
+        """
+        Seconds until the open circuit admits a probe; 0 when not open.
+        """
+        with self._lock:
+            if self._current_state() != CIRCUIT_OPEN:
+                return 0.0
+            return max(self.reset_timeout - (self.clock() - self._opened_at), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                **self._counters,
+            }
+
+
+@dataclass
+class RetryBudget:
+    """
+    Token bucket that caps retries across all senders. Every first attempt
+    deposits `ratio` tokens and every retry withdraws one, so retries stay
+    within roughly `ratio` of the request rate; `min_per_second` keeps a
+    trickle of retries available when traffic is low.
+    """
+
+    ratio: float = 0.2
+    min_per_second: float = 1.0
+    max_tokens: float = 10.0
+    clock: Callable[[], float] = time.monotonic
+    _tokens: float = field(default=0.0, init=False)
+    _updated_at: float = field(default=0.0, init=False)
+    _counters: Dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(("requests", "retries", "denied"), 0),
+        init=False,
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def __post_init__(self) -> None:
+        self._tokens = self.max_tokens
+        self._updated_at = self.clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed, self._updated_at = now - self._updated_at, now
+        self._tokens = min(self._tokens + elapsed * self.min_per_second, self.max_tokens)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self._refill()
+            self._counters["requests"] += 1
+            self._tokens = min(self._tokens + self.ratio, self.max_tokens)
+
+    def try_retry(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1.0:
+                self._counters["denied"] += 1
+                return False
+            self._tokens -= 1.0
+            self._counters["retries"] += 1
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill()
+            return {"tokens": round(self._tokens, 3), **self._counters}
+
+
+DELIVERY_OUTCOMES = (
+    "success",
+    "rejected",
+    "server_error",
+    "transport_error",
+    "circuit_open",
+    "budget_exhausted",
+)
+
+
+@dataclass
+class DeliveryOutcomes:
+    """
+    Per-attempt outcome counters for webhook deliveries: 2xx, any other
+    non-5xx status, 5xx/429, network errors, and attempts never made because the circuit was
+    open or the retry budget was spent.
+    """
+
+    _counters: Dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(DELIVERY_OUTCOMES, 0), init=False
+    )
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False)
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self._counters[outcome] += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
 @dataclass
 class NotificationClient:
     settings: Settings
     timeout_seconds: float = 5.0
     max_attempts: int = 3
     backoff_seconds: float = 0.2
-    transport: Optional[httpx.BaseTransport] = field(default=None)
+    transport: Optional[httpx.AsyncBaseTransport] = field(default=None)
+    http_client: Optional[httpx.AsyncClient] = field(default=None)
+    # The app lifespan shares one breaker, budget and outcome tally between
+    # all clients.
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    retry_budget: RetryBudget = field(default_factory=RetryBudget)
+    outcomes: DeliveryOutcomes = field(default_factory=DeliveryOutcomes)
 
     def _validate_url(self) -> str:
         url = self.settings.notify_webhook_url
@@ -51,13 +257,25 @@ class NotificationClient:
             )
         return url
 
+    def check_configured(self) -> None:
+        """
+        Raise the same NotificationError `send` would for a bad webhook setup,
+        without sending anything.
+        """
+        self._validate_url()
+
     def _build_headers(self) -> Dict[str, str]:
         headers = {"Content-Type": "application/json", "Accept": "application/json"}
         if self.settings.notify_token:
             headers["Authorization"] = f"Bearer {self.settings.notify_token}"
         return headers
 
-    def send(self, payload: Dict[str, Any]) -> httpx.Response:
+    async def send(self, payload: Dict[str, Any], *, retry: bool = False) -> httpx.Response:
+        """
+        POST `payload` to the webhook. `retry` marks a redelivery whose
+        retry-budget token the caller has already spent, so its first attempt
+        is not counted as a new request.
+        """
         url = self._validate_url()
         headers = self._build_headers()
         timeout = httpx.Timeout(
@@ -66,30 +284,75 @@ class NotificationClient:
             read=self.timeout_seconds,
             write=self.timeout_seconds / 2,
         )
+        if self.http_client is not None:
+            return await self._send_with_retries(
+                self.http_client, url, payload, headers, timeout, retry
+            )
+        async with httpx.AsyncClient(timeout=timeout, transport=self.transport) as client:
+            return await self._send_with_retries(client, url, payload, headers, timeout, retry)
+
+    async def _send_with_retries(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        timeout: httpx.Timeout,
+        retry: bool,
+    ) -> httpx.Response:
         last_exc: Exception | None = None
         for attempt in range(1, self.max_attempts + 1):
-            try:
-                with httpx.Client(timeout=timeout, transport=self.transport) as client:
-                    response = client.post(url, json=payload, headers=headers)
-                if 200 <= response.status_code < 300:
-                    return response
-                detail = (
-                    f"Notification endpoint returned {response.status_code}"
-                    if response.text == ""
-                    else f"Notification endpoint returned {response.status_code}: {response.text[:200]}"
-                )
+            if attempt == 1:
+                if not retry:
+                    self.retry_budget.record_request()
+            elif not self.retry_budget.try_retry():
+                # Retries are spent across the process; give up instead of
+                # piling more load on an endpoint that is already failing.
+                self.outcomes.record("budget_exhausted")
+                break
+            if not self.breaker.allow():
+                self.outcomes.record("circuit_open")
                 raise NotificationError(
-                    code="notification_bad_status",
-                    detail=detail,
-                    status=502,
+                    code="notification_circuit_open",
+                    detail="Notification endpoint is unavailable; delivery suspended",
+                    status=503,
+                ) from last_exc
+            try:
+                response = await client.post(
+                    url, json=payload, headers=headers, timeout=timeout
                 )
-            except NotificationError:
+            except asyncio.CancelledError:
+                self.breaker.release()
                 raise
             except Exception as exc:  # noqa: BLE001
+                self.breaker.record_failure()
+                self.outcomes.record("transport_error")
                 last_exc = exc
                 if attempt == self.max_attempts:
                     break
-                time.sleep(self.backoff_seconds * attempt)
+                await asyncio.sleep(self.backoff_seconds * attempt)
+                continue
+            # A 4xx means the endpoint is up and rejected this payload; only
+            # server-side errors and throttling count against the circuit.
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+                self.outcomes.record("server_error")
+            else:
+                self.breaker.record_success()
+                if 200 <= response.status_code < 300:
+                    self.outcomes.record("success")
+                    return response
+                self.outcomes.record("rejected")
+            detail = (
+                f"Notification endpoint returned {response.status_code}"
+                if response.text == ""
+                else f"Notification endpoint returned {response.status_code}: {response.text[:200]}"
+            )
+            raise NotificationError(
+                code="notification_bad_status",
+                detail=detail,
+                status=502,
+            )
         raise NotificationError(
             code="notification_failed",
             detail="Notification could not be delivered",
@@ -97,5 +360,29 @@ class NotificationClient:
         ) from last_exc
 
 
-def build_notification_client() -> NotificationClient:
-    return NotificationClient(settings=get_settings())
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """
+    Build the shared webhook connection pool. Created once in the app lifespan
+    so keep-alive connections (and TLS sessions) are reused across requests.
+    """
+
+    # HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it.
+    http2 = settings.notify_http2 and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.notify_max_connections,
+            max_keepalive_connections=settings.notify_max_connections,
+            keepalive_expiry=30.0,
+        ),
+    )
+
+
+def build_notification_client(request: Request) -> NotificationClient:
+    return NotificationClient(
+        settings=get_settings(),
+        http_client=getattr(request.app.state, "notification_http", None),
+        breaker=request.app.state.notification_breaker,
+        retry_budget=request.app.state.retry_budget,
+        outcomes=request.app.state.notification_outcomes,
+    )
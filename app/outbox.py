@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.notifications import NotificationClient, NotificationError
+from app.storage import Repository
+
+RETRY_BUDGET_EXHAUSTED = "notification_retry_budget_exhausted: retry budget is spent"
+
+
+@dataclass
+class OutboxDispatcher:
+    """
+    Background delivery for the notification outbox. Each worker task claims a
+    batch of due notifications from the repository, posts them to the webhook
+    and records the outcome. Failures are retried with exponential backoff and
+    dead-lettered after `max_attempts`. At most `concurrency` webhook calls are
+    in flight per process, shared by all workers. A worker finishes its batch
+    before claiming the next one, so each claim takes at least the worker's
+    share of `concurrency`; otherwise `workers * batch_size` would cap it. Deliveries
+    refused by an open circuit breaker are deferred until it half-opens and
+    keep their attempt. Every redelivery spends a token of the client's retry
+    budget, which inline sends share; without one the row is deferred by its
+    backoff delay, again keeping its attempt.
+    """
+
+    repository_factory: Callable[[], Repository]
+    client_factory: Callable[[], NotificationClient]
+    workers: int = 4
+    concurrency: int = 16
+    batch_size: int = 10
+    max_attempts: int = 5
+    backoff_seconds: float = 1.0
+    max_backoff_seconds: float = 300.0
+    lease_seconds: float = 60.0
+    poll_interval: float = 1.0
+    _wakeup: asyncio.Event = field(default_factory=asyncio.Event, init=False)
+    _tasks: List[asyncio.Task] = field(default_factory=list, init=False)
+    _in_flight: asyncio.Semaphore = field(init=False)
+    _claim_size: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._in_flight = asyncio.Semaphore(self.concurrency)
+        self._claim_size = max(self.batch_size, -(-self.concurrency // self.workers))
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"outbox-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        # Claimed but unfinished notifications are retried once their lease
+        # expires, so cancelling mid-delivery loses nothing.
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delivered = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa: BLE001
+                # A storage hiccup must not kill the worker; back off and retry.
+                delivered = 0
+            if delivered:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self) -> int:
+        """
+        Claim and process one batch. Returns the number of claimed rows.
+        """
+        repo = self.repository_factory()
+        now = datetime.now(timezone.utc)
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+        batch = await run_in_threadpool(
+            repo.claim_notifications, now, lease_until, self._claim_size
+        )
+        await asyncio.gather(*(self._deliver(repo, notification) for notification in batch))
+        return len(batch)
+
+    async def _deliver(self, repo: Repository, notification: Dict[str, Any]) -> None:
+        client = self.client_factory()
+        # Claiming counted this attempt, so anything above 1 is a retry.
+        retry = notification["attempts"] > 1
+        if retry and not client.retry_budget.try_retry():
+            client.outcomes.record("budget_exhausted")
+            delay = self.retry_delay(notification["attempts"] - 1)
+            retry_at = datetime.now(timezone.utc) + timedelta(
+                seconds=max(delay, self.poll_interval)
+            )
+            await run_in_threadpool(
+                repo.defer_notification, notification["id"], RETRY_BUDGET_EXHAUSTED, retry_at
+            )
+            return
+        try:
+            async with self._in_flight:
+                await client.send(notification["payload"], retry=retry)
+        except NotificationError as exc:
+            error = f"{exc.code}: {exc.detail}"
+            if exc.code == "notification_circuit_open":
+                delay = max(client.breaker.retry_after(), self.poll_interval)
+                retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                await run_in_threadpool(
+                    repo.defer_notification, notification["id"], error, retry_at
+                )
+                return
+        else:
+            await run_in_threadpool(
+                repo.complete_notification,
+                notification["id"],
+                datetime.now(timezone.utc),
+            )
+            return
+        retry_at = None
+        if notification["attempts"] < self.max_attempts:
+            delay = self.retry_delay(notification["attempts"])
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        await run_in_threadpool(repo.fail_notification, notification["id"], error, retry_at)
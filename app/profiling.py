@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+from uuid import uuid4
+
+from starlette.datastructures import MutableHeaders
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import Settings, get_settings
+from app.metrics import UNMATCHED_ROUTE
+
+PROFILE_TOKEN_HEADER: Final = b"x-profile-token"
+CORRELATION_ID_HEADER: Final = "X-Correlation-ID"
+PROFILE_SUFFIX: Final = ".folded"
+# Each profiled request adds a stack walk per sample; cap how many run at once.
+MAX_ACTIVE_PROFILES: Final = 4
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar(
+    "profile_session", default=None
+)
+
+
+def _frame_label(code: CodeType, frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}"
+
+
+class ProfileSession:
+    """
+    Stack samples of one request. A request runs on the event loop thread and,
+    for sync endpoints, in a threadpool worker; each of those threads is
+    attached with an anchor frame, and only stacks that contain the anchor are
+    counted, so other requests interleaved on the loop are left out.
+    """
+
+    def __init__(self, correlation_id: str) -> None:
+        self.correlation_id = correlation_id
+        # Set once routing is done: "GET /chores/{chore_id}".
+        self.root = UNMATCHED_ROUTE
+        self.stacks: Counter[Tuple[str, ...]] = Counter()
+        self._anchors: Dict[int, FrameType] = {}
+
+    def attach(self, anchor: FrameType) -> None:
+        self._anchors[threading.get_ident()] = anchor
+
+    def detach(self) -> None:
+        self._anchors.pop(threading.get_ident(), None)
+
+    def sample(self, frames: Dict[int, FrameType], labels: Dict[CodeType, str]) -> None:
+        for thread_id, anchor in list(self._anchors.items()):
+            frame: Optional[FrameType] = frames.get(thread_id)
+            stack: List[str] = []
+            while frame is not None and frame is not anchor:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code, frame)
+                stack.append(label)
+                frame = frame.f_back
+            if frame is anchor:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """
+        Samples in the collapsed-stack format read by flamegraph.pl and
+        speedscope: `request;caller;callee count` per distinct stack.
+        """
+        return "".join(
+            f"{';'.join((self.root, *stack))} {count}\n" for stack, count in self.stacks.items()
+        )
+
+
+class StackSampler:
+    """
+    Background thread that samples every active ProfileSession each
+    `interval` seconds through `sys._current_frames()`, and writes finished
+    sessions to `directory` as `<correlation_id>.folded`, deleting the oldest
+    files beyond `max_files`. It sleeps on a condition while nothing is being
+    profiled, and all disk I/O happens here rather than on the event loop.
+    """
+
+    def __init__(self, directory: Path, *, interval: float, max_files: int) -> None:
+        self.directory = directory
+        self.interval = interval
+        self.max_files = max_files
+        self._active: Dict[int, ProfileSession] = {}
+        self._finished: List[ProfileSession] = []
+        self._labels: Dict[CodeType, str] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, session: ProfileSession) -> bool:
+        with self._cond:
+            if len(self._active) >= MAX_ACTIVE_PROFILES:
+                return False
+            if self._thread is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._thread = threading.Thread(
+                    target=self._run, name="request-profiler", daemon=True
+                )
+                self._thread.start()
+            self._active[id(session)] = session
+            self._cond.notify()
+            return True
+
+    def end(self, session: ProfileSession) -> None:
+        with self._cond:
+            self._active.pop(id(session), None)
+            self._finished.append(session)
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._active and not self._finished:
+                    self._cond.wait()
+                finished, self._finished = self._finished, []
+            for session in finished:
+                self._write(session)
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._cond:
+                active = list(self._active.values())
+            for session in active:
+                session.sample(frames, self._labels)
+            del frames
+
+    def _write(self, session: ProfileSession) -> None:
+        path = self.directory / f"{session.correlation_id}{PROFILE_SUFFIX}"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(session.folded())
+        os.replace(tmp, path)
+        profiles = sorted(self.directory.glob(f"*{PROFILE_SUFFIX}"), key=_mtime)
+        for old in profiles[: max(len(profiles) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _attach_worker(call: Callable[..., Any]) -> Callable[..., Any]:
+    # Sync endpoints run in the threadpool, which copies the request's context;
+    # attach that worker thread to the request's session while the call runs.
+    @functools.wraps(call)
+    def profiled(*args: Any, **kwargs: Any) -> Any:
+        session = _current_session.get()
+        if session is None:
+            return call(*args, **kwargs)
+        session.attach(sys._getframe())
+        try:
+            return call(*args, **kwargs)
+        finally:
+            session.detach()
+
+    profiled.__profiled__ = True  # type: ignore[attr-defined]
+    return profiled
+
+
+class ProfilingMiddleware:
+    """
+    Samples the call stacks of selected requests (see StackSampler). A request
+    is profiled when it carries the configured `X-Profile-Token`, or at random
+    with probability `sample_rate`. Its correlation id names the profile file,
+    is returned in `X-Correlation-ID` and is reused by problem responses.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        sampler: StackSampler,
+        *,
+        token: Optional[str],
+        sample_rate: float,
+    ) -> None:
+        self.app = app
+        self.sampler = sampler
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+
+    def _selected(self, scope: Scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_TOKEN_HEADER:
+                    return secrets.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+        correlation_id = str(uuid4())
+        session = ProfileSession(correlation_id)
+        if not self.sampler.begin(session):
+            await self.app(scope, receive, send)
+            return
+        scope.setdefault("state", {})["correlation_id"] = correlation_id
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(CORRELATION_ID_HEADER, correlation_id)
+            await send(message)
+
+        session.attach(sys._getframe())
+        reset = _current_session.set(session)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current_session.reset(reset)
+            session.detach()
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            session.root = f"{scope['method']} {route}"
+            self.sampler.end(session)
+
+
+def profiling_middleware(
+    app: ASGIApp, routes: List[BaseRoute], settings: Optional[Settings] = None
+) -> ASGIApp:
+    """
+    Middleware factory for `app.add_middleware`. Starlette calls it once, when
+    it builds the middleware stack on the first ASGI call; with profiling off
+    it returns `app` itself, so disabled profiling adds nothing per request.
+    When on, sync endpoints in `routes` are wrapped so their threadpool worker
+    is sampled too.
+    """
+    settings = settings or get_settings()
+    if not settings.profile_enabled:
+        return app
+    for route in routes:
+        dependant = getattr(route, "dependant", None)
+        if (
+            dependant is not None
+            and not asyncio.iscoroutinefunction(dependant.call)
+            and not getattr(dependant.call, "__profiled__", False)
+        ):
+            dependant.call = _attach_worker(dependant.call)
+    sampler = StackSampler(
+        settings.profile_dir,
+        interval=settings.profile_interval,
+        max_files=settings.profile_max_files,
+    )
+    return ProfilingMiddleware(
+        app,
+        sampler,
+        token=settings.profile_token,
+        sample_rate=settings.profile_sample_rate,
+    )
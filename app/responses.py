@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import os
+from typing import Any, BinaryIO, Iterable, List, Mapping, Optional, Tuple
+
+import anyio.to_thread
+from pydantic import TypeAdapter
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of `If-None-Match` against `etag`, as RFC 9110 requires
+    for GET revalidation.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def _is_digits(value: str) -> bool:
+    # str.isdigit alone accepts digits int() rejects, such as "²".
+    return value.isascii() and value.isdigit()
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be served (no header, another unit,
+    several ranges, which servers may ignore, or an invalid range such as
+    `bytes=5-3`, which RFC 9110 says to ignore). Raises RangeNotSatisfiable
+    when the range starts at or past the end of the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last):
+        return None
+    if (first and not _is_digits(first)) or (last and not _is_digits(last)):
+        return None
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class EncodedJSONResponse(Response):
+    """
+    JSON response around a body that is already encoded, e.g. by RowSerializer.
+    Returning it from an endpoint bypasses FastAPI's `response_model` pass.
+    """
+
+    media_type = "application/json"
+
+
+class RowSerializer:
+    """
+    Precompiled JSON encoder for store records. `row_type` is a TypedDict with
+    the fields of the matching response model, enum fields typed as plain str
+    since the store keeps their values. Records were validated when written,
+    so instead of building a model per row and running FastAPI's
+    `jsonable_encoder` over the result, pydantic-core writes the rows straight
+    to bytes in one call. Keys the row type does not declare are dropped.
+    """
+
+    def __init__(self, row_type: Any) -> None:
+        self._row = TypeAdapter(row_type)
+        self._rows = TypeAdapter(List[row_type])  # type: ignore[valid-type]
+
+    def row(self, record: Mapping[str, Any]) -> bytes:
+        return self._row.dump_json(record)
+
+    def rows(self, records: Iterable[Mapping[str, Any]]) -> bytes:
+        return self._rows.dump_json(records)
+
+
+class FileRangeResponse(Response):
+    """
+    Serve `length` bytes of an open file starting at `offset`. When the server
+    offers the ASGI zero-copy extension the file is handed over for sendfile;
+    otherwise it is sent in `chunk_size` pieces read with pread, so memory use
+    does not grow with the file. The response owns `file` and closes it.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        *,
+        offset: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ) -> None:
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send(
+                    {
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": self.file,
+                        "offset": self.offset,
+                        "count": self.length,
+                        "more_body": False,
+                    }
+                )
+                return
+            fd = self.file.fileno()
+            position, remaining = self.offset, self.length
+            while True:
+                chunk = await anyio.to_thread.run_sync(
+                    os.pread, fd, min(self.chunk_size, remaining), position
+                )
+                position += len(chunk)
+                remaining -= len(chunk)
+                more_body = remaining > 0 and bool(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    break
+        finally:
+            self.file.close()
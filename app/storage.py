@@ -0,0 +1,1658 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import json
+import random
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice, takewhile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import Settings
+from app.journal import FsyncMode, WriteAheadLog, recover, write_snapshot
+
+COMPLETED_STATUS = "completed"
+NOTIFICATION_QUEUED = "queued"
+NOTIFICATION_DELIVERED = "delivered"
+NOTIFICATION_DEAD = "dead"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class Repository(ABC):
+    """
+    Storage interface used by the API handlers. Records are plain dicts shaped
+    like the response models; `status` and `cadence` are stored as strings.
+
+    Users, chores and assignments also carry a `version`: every mutation of one
+    of these collections bumps its counter (see `collection_version`) and
+    stamps the new value on the records it wrote. Counters of a new store start
+    at a random value, so versions are not reused after the store is recreated.
+    """
+
+    @abstractmethod
+    def collection_version(self, collection: str) -> int:
+        """
+        Current version of "users", "chores" or "assignments".
+        """
+
+    @abstractmethod
+    def create_user(self, name: str) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_users(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        List users with `id > after_id` ordered by id, at most `limit` rows.
+        The other `list_*` methods page the same way.
+        """
+
+    @abstractmethod
+    def count_users(self) -> int: ...
+
+    @abstractmethod
+    def create_chore(self, data: Dict[str, Any]) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_chore(self, chore_id: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_chores(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def count_chores(self) -> int: ...
+
+    @abstractmethod
+    def update_chore(
+        self, chore_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def delete_chore(self, chore_id: int) -> List[Dict[str, Any]]:
+        """
+        Delete a chore together with its assignments and attachment records.
+        Attachment files are content-addressed and shared between chores, so
+        only records whose file lost its last reference are returned for the
+        caller to unlink.
+        """
+
+    @abstractmethod
+    def create_assignment(self, data: Dict[str, Any]) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_assignment(self, assignment_id: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_assignments(
+        self,
+        status: Optional[str] = None,
+        *,
+        user_id: Optional[int] = None,
+        chore_id: Optional[int] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List assignments ordered by id, optionally filtered by status, user and
+        chore.
+        """
+
+    @abstractmethod
+    def update_assignment(
+        self, assignment_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def count_assignments_by_status(self) -> Dict[str, int]: ...
+
+    @abstractmethod
+    def count_overdue(self, now: datetime) -> int:
+        """
+        Count assignments that are not completed and are due before `now`.
+        """
+
+    @abstractmethod
+    def list_open_due_between(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List non-completed assignments with `start <= due_at < end`, ordered by
+        `(due_at, id)`. Pages continue after the `(due_at, id)` of the
+        previous page's last row.
+        """
+
+    @abstractmethod
+    def add_attachment(self, chore_id: int, data: Dict[str, Any]) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def list_attachments(self, chore_id: int) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def acquire_attachment_file(self, filename: str, size: int) -> None:
+        """
+        Take a reference on a stored file before linking or reusing it, so the
+        collector cannot remove it while the upload is being recorded. Every
+        acquire is paired with `release_attachment_file` once the record is
+        stored (or the upload failed).
+        """
+
+    @abstractmethod
+    def release_attachment_file(self, filename: str) -> bool:
+        """
+        Drop a reference taken by `acquire_attachment_file`. Returns True when
+        it was the last one and the file should be collected.
+        """
+
+    @abstractmethod
+    def count_attachment_references(self, filename: str) -> int: ...
+
+    @abstractmethod
+    def attachment_storage_stats(self) -> Dict[str, int]:
+        """
+        Reference and byte totals over stored attachment files: `references`,
+        `blobs`, `logical_bytes` (as if every reference had its own copy) and
+        `stored_bytes`.
+        """
+
+    @abstractmethod
+    def create_item(self, name: str) -> Dict[str, Any]: ...
+
+    @abstractmethod
+    def get_item(self, item_id: int) -> Optional[Dict[str, Any]]: ...
+
+    def enqueue_notification(
+        self, assignment_id: int, payload: Dict[str, Any], now: datetime
+    ) -> Dict[str, Any]:
+        return self.enqueue_notifications([(assignment_id, payload)], now)[0]
+
+    @abstractmethod
+    def enqueue_notifications(
+        self, entries: List[Tuple[int, Dict[str, Any]]], now: datetime
+    ) -> List[Dict[str, Any]]:
+        """
+        Queue `(assignment_id, payload)` pairs in one write, in order.
+        """
+
+    @abstractmethod
+    def get_notification(self, notification_id: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def claim_notifications(
+        self, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Atomically take up to `limit` queued notifications that are due at `now`.
+        Claimed rows are hidden until `lease_until`, so a crashed worker's batch
+        is picked up again, and their `attempts` counter is incremented.
+        """
+
+    @abstractmethod
+    def complete_notification(self, notification_id: int, now: datetime) -> None: ...
+
+    @abstractmethod
+    def fail_notification(
+        self, notification_id: int, error: str, retry_at: Optional[datetime]
+    ) -> None:
+        """
+        Record a failed attempt; reschedule at `retry_at`, or dead-letter the
+        notification when `retry_at` is None.
+        """
+
+    @abstractmethod
+    def defer_notification(
+        self, notification_id: int, error: str, retry_at: datetime
+    ) -> None:
+        """
+        Put a claimed notification back for `retry_at` without spending an
+        attempt, e.g. when delivery was refused before reaching the endpoint.
+        """
+
+    def close(self) -> None:
+        return None
+
+
+def _new_notification(
+    notification_id: int, assignment_id: int, payload: Dict[str, Any], now: datetime
+) -> Dict[str, Any]:
+    return {
+        "id": notification_id,
+        "assignment_id": assignment_id,
+        "payload": payload,
+        "status": NOTIFICATION_QUEUED,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None,
+        "created_at": now,
+        "delivered_at": None,
+    }
+
+
+VERSIONED_COLLECTIONS = ("users", "chores", "assignments")
+
+
+def _initial_version() -> int:
+    return random.getrandbits(31)
+
+
+class _SortedList:
+    """
+    Sorted multiset kept as a list of sorted chunks of up to `2 * _LOAD`
+    values, plus the maximum of each chunk. Inserts and removals bisect the
+    maxima and then one chunk, so they move at most a chunk's worth of
+    pointers instead of shifting the whole index like a flat sorted list.
+
+    `count_below` adds up chunk sizes through a Fenwick tree, so it is
+    O(log n) too. The tree is updated in place while values come and go, and
+    rebuilt on the next count after a chunk was split or dropped.
+    """
+
+    _LOAD = 1000
+
+    __slots__ = ("_chunks", "_maxes", "_len", "_tree")
+
+    def __init__(self, values: Iterable[Any] = ()) -> None:
+        self._set_sorted(sorted(values))
+
+    def _set_sorted(self, values: List[Any]) -> None:
+        load = self._LOAD
+        self._chunks = [values[i : i + load] for i in range(0, len(values), load)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self._len = len(values)
+        self._tree: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def add(self, value: Any) -> None:
+        maxes = self._maxes
+        if not maxes:
+            self._chunks.append([value])
+            maxes.append(value)
+            self._len = 1
+            self._tree = None
+            return
+        position = bisect.bisect_left(maxes, value)
+        if position == len(maxes):
+            # Past the last maximum: the common case for growing ids.
+            position -= 1
+            self._chunks[position].append(value)
+            maxes[position] = value
+        else:
+            bisect.insort(self._chunks[position], value)
+        self._len += 1
+        chunk = self._chunks[position]
+        if len(chunk) > 2 * self._LOAD:
+            half = chunk[self._LOAD :]
+            del chunk[self._LOAD :]
+            self._chunks.insert(position + 1, half)
+            maxes[position] = chunk[-1]
+            maxes.insert(position + 1, half[-1])
+            self._tree = None
+        elif self._tree is not None:
+            self._update_tree(position, 1)
+
+    def discard(self, value: Any) -> bool:
+        maxes = self._maxes
+        position = bisect.bisect_left(maxes, value)
+        if position == len(maxes):
+            return False
+        chunk = self._chunks[position]
+        index = bisect.bisect_left(chunk, value)
+        if chunk[index] != value:
+            return False
+        del chunk[index]
+        self._len -= 1
+        if chunk:
+            maxes[position] = chunk[-1]
+            if self._tree is not None:
+                self._update_tree(position, -1)
+        else:
+            del self._chunks[position]
+            del maxes[position]
+            self._tree = None
+        return True
+
+    def discard_many(self, values: Iterable[Any]) -> None:
+        """
+        Remove a batch of values. A large batch is removed in one filtering
+        pass over the whole list rather than value by value.
+        """
+        doomed = set(values)
+        if len(doomed) * 16 < self._len:
+            for value in doomed:
+                self.discard(value)
+        elif doomed:
+            self._set_sorted([value for value in self if value not in doomed])
+
+    def _update_tree(self, position: int, delta: int) -> None:
+        tree = self._tree
+        assert tree is not None
+        node = position + 1
+        while node < len(tree):
+            tree[node] += delta
+            node += node & -node
+
+    def _chunks_total(self, count: int) -> int:
+        # Number of values in the first `count` chunks.
+        tree = self._tree
+        if tree is None:
+            tree = [0, *map(len, self._chunks)]
+            for node in range(1, len(tree)):
+                parent = node + (node & -node)
+                if parent < len(tree):
+                    tree[parent] += tree[node]
+            self._tree = tree
+        total = 0
+        while count:
+            total += tree[count]
+            count -= count & -count
+        return total
+
+    def count_below(self, value: Any) -> int:
+        """
+        Number of values `< value`.
+        """
+        position = bisect.bisect_left(self._maxes, value)
+        count = self._chunks_total(position)
+        if position < len(self._chunks):
+            count += bisect.bisect_left(self._chunks[position], value)
+        return count
+
+    def irange(self, start: Any, *, inclusive: bool = True) -> Iterator[Any]:
+        """
+        Values from `start` upwards (`> start` when not `inclusive`), in order.
+        """
+        find = bisect.bisect_left if inclusive else bisect.bisect_right
+        position = find(self._maxes, start)
+        if position == len(self._chunks):
+            return
+        yield from islice(self._chunks[position], find(self._chunks[position], start), None)
+        for chunk in self._chunks[position + 1 :]:
+            yield from chunk
+
+
+_EMPTY_BUCKET = _SortedList()
+# Assignment id indexes and the record field each one is keyed by.
+_ASSIGNMENT_INDEXES = (
+    ("assignments_by_chore", "chore_id"),
+    ("assignments_by_user", "user_id"),
+    ("assignments_by_status", "status"),
+)
+
+
+def _initial_state() -> Dict[str, Any]:
+    return {
+        "versions": {name: _initial_version() for name in VERSIONED_COLLECTIONS},
+        "items": {},
+        "users": {},
+        "chores": {},
+        "assignments": {},
+        # Secondary indexes: owner id -> _SortedList of assignment ids, so a
+        # page is a bisect to the cursor even after PATCH moved ids around.
+        "assignments_by_chore": {},
+        "assignments_by_user": {},
+        # status -> assignment ids; bucket sizes double as the status counters.
+        "assignments_by_status": {},
+        # Sorted (due_at, id) pairs of assignments that are not completed.
+        "open_by_due": _SortedList(),
+        "attachments": {},
+        # filename -> {"size", "refcount"}; one entry per stored file.
+        "attachment_blobs": {},
+        "sequence": {
+            "user": 1,
+            "chore": 1,
+            "assignment": 1,
+            "attachment": 1,
+            "item": 1,
+            "notification": 1,
+        },
+        "notifications": {},
+        # Heap of (next_attempt_at, id) for queued notifications. Entries are
+        # invalidated lazily: a popped entry only counts if it still matches
+        # the record.
+        "notification_queue": [],
+    }
+
+
+class MemoryRepository(Repository):
+    """
+    Process-local dict storage. Fast, but data is lost on restart (unless
+    wrapped by DurableMemoryRepository) and is not shared between workers.
+
+    Handlers run on the threadpool, so every collection has its own lock and
+    writes (including the copy-modify-replace of updates and index upkeep)
+    happen under it. Id allocation is guarded separately per sequence. Point
+    reads are single dict lookups and stay lock-free. Locks are always taken
+    in the order chores -> assignments -> attachments.
+    """
+
+    def __init__(self) -> None:
+        self._db = _initial_state()
+        self._locks = {
+            table: threading.RLock()
+            for table in (
+                "users",
+                "chores",
+                "assignments",
+                "attachments",
+                "items",
+                "notifications",
+            )
+        }
+        self._sequence_locks = {name: threading.Lock() for name in self._db["sequence"]}
+
+    def _next_sequence(self, name: str) -> int:
+        with self._sequence_locks[name]:
+            sequence = self._db["sequence"][name]
+            self._db["sequence"][name] += 1
+        return sequence
+
+    def _bump_version(self, collection: str) -> int:
+        # Callers hold the collection's lock.
+        self._db["versions"][collection] += 1
+        return self._db["versions"][collection]
+
+    def collection_version(self, collection: str) -> int:
+        return self._db["versions"][collection]
+
+    def create_user(self, name: str) -> Dict[str, Any]:
+        with self._locks["users"]:
+            user_id = self._next_sequence("user")
+            user = {"id": user_id, "name": name, "version": self._bump_version("users")}
+            self._db["users"][user_id] = user
+        return user
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._db["users"].get(user_id)
+
+    def _page(
+        self,
+        table: str,
+        sequence: str,
+        after_id: int,
+        limit: Optional[int],
+        ids: Optional[Iterable[int]] = None,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> List[Dict[str, Any]]:
+        rows: Iterable[Optional[Dict[str, Any]]]
+        records = self._db[table]
+        if ids is not None:
+            rows = (records.get(i) for i in ids)
+        elif after_id <= 0:
+            # Dict insertion order is id order: ids only grow and updates
+            # replace values in place.
+            rows = records.values()
+        else:
+            # Probe the id space instead of skipping `after_id` entries;
+            # costs O(limit + deleted ids in the scanned range).
+            next_id = self._db["sequence"][sequence]
+            rows = (records.get(i) for i in range(after_id + 1, next_id))
+        matches = (
+            row
+            for row in rows
+            if row is not None and (predicate is None or predicate(row))
+        )
+        with self._locks[table]:
+            return list(islice(matches, limit))
+
+    def list_users(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return self._page("users", "user", after_id, limit)
+
+    def count_users(self) -> int:
+        return len(self._db["users"])
+
+    def create_chore(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._locks["chores"]:
+            chore_id = self._next_sequence("chore")
+            chore = {"id": chore_id, **data, "version": self._bump_version("chores")}
+            self._db["chores"][chore_id] = chore
+        return chore
+
+    def get_chore(self, chore_id: int) -> Optional[Dict[str, Any]]:
+        return self._db["chores"].get(chore_id)
+
+    def list_chores(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return self._page("chores", "chore", after_id, limit)
+
+    def count_chores(self) -> int:
+        return len(self._db["chores"])
+
+    def update_chore(
+        self, chore_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        with self._locks["chores"]:
+            current = self._db["chores"].get(chore_id)
+            if current is None:
+                return None
+            chore = {**current, **changes, "version": self._bump_version("chores")}
+            self._db["chores"][chore_id] = chore
+        return chore
+
+    def delete_chore(self, chore_id: int) -> List[Dict[str, Any]]:
+        with self._locks["chores"], self._locks["assignments"], self._locks["attachments"]:
+            if self._db["chores"].pop(chore_id, None) is not None:
+                self._bump_version("chores")
+            assignment_ids = self._db["assignments_by_chore"].pop(chore_id, None)
+            if assignment_ids:
+                assignments = self._db["assignments"]
+                self._unindex_assignments([assignments.pop(i) for i in assignment_ids])
+                self._bump_version("assignments")
+            return [
+                attachment
+                for attachment in self._db["attachments"].pop(chore_id, [])
+                if self._release_blob(attachment["filename"])
+            ]
+
+    def _acquire_blob(self, filename: str, size: int) -> None:
+        # Callers hold the attachments lock.
+        blob = self._db["attachment_blobs"].setdefault(filename, {"size": size, "refcount": 0})
+        blob["refcount"] += 1
+
+    def _release_blob(self, filename: str) -> bool:
+        blobs = self._db["attachment_blobs"]
+        blob = blobs.get(filename)
+        if blob is not None:
+            blob["refcount"] -= 1
+            if blob["refcount"] > 0:
+                return False
+            del blobs[filename]
+        # Files stored before dedup have no blob entry and are always released.
+        return True
+
+    def _index_assignment(self, assignment: Dict[str, Any]) -> None:
+        for index_name, field in _ASSIGNMENT_INDEXES:
+            index = self._db[index_name]
+            bucket = index.get(assignment[field])
+            if bucket is None:
+                bucket = index[assignment[field]] = _SortedList()
+            bucket.add(assignment["id"])
+        self._index_due(assignment)
+
+    def _index_due(self, assignment: Dict[str, Any]) -> None:
+        if assignment["status"] != COMPLETED_STATUS:
+            self._db["open_by_due"].add((assignment["due_at"], assignment["id"]))
+
+    def _unindex_assignment(self, assignment: Dict[str, Any]) -> None:
+        for index_name, field in _ASSIGNMENT_INDEXES:
+            index = self._db[index_name]
+            bucket = index.get(assignment[field])
+            if bucket is None:
+                continue
+            bucket.discard(assignment["id"])
+            if not bucket:
+                del index[assignment[field]]
+        self._unindex_due(assignment)
+
+    def _unindex_due(self, assignment: Dict[str, Any]) -> None:
+        if assignment["status"] != COMPLETED_STATUS:
+            self._db["open_by_due"].discard((assignment["due_at"], assignment["id"]))
+
+    def _unindex_assignments(self, assignments: List[Dict[str, Any]]) -> None:
+        # Batch form of _unindex_assignment for deleting a chore: each index
+        # is updated once per bucket. The caller has already dropped the
+        # chore's own bucket, so the chore index (listed first) is skipped.
+        for index_name, field in _ASSIGNMENT_INDEXES[1:]:
+            index = self._db[index_name]
+            grouped: Dict[Any, List[int]] = {}
+            for assignment in assignments:
+                grouped.setdefault(assignment[field], []).append(assignment["id"])
+            for key, ids in grouped.items():
+                bucket = index.get(key)
+                if bucket is None:
+                    continue
+                bucket.discard_many(ids)
+                if not bucket:
+                    del index[key]
+        self._unindex_due_many(assignments)
+
+    def _unindex_due_many(self, assignments: List[Dict[str, Any]]) -> None:
+        self._db["open_by_due"].discard_many(
+            (assignment["due_at"], assignment["id"])
+            for assignment in assignments
+            if assignment["status"] != COMPLETED_STATUS
+        )
+
+    def create_assignment(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._locks["assignments"]:
+            assignment_id = self._next_sequence("assignment")
+            assignment = {
+                "id": assignment_id,
+                **data,
+                "version": self._bump_version("assignments"),
+            }
+            self._db["assignments"][assignment_id] = assignment
+            self._index_assignment(assignment)
+        return assignment
+
+    def get_assignment(self, assignment_id: int) -> Optional[Dict[str, Any]]:
+        return self._db["assignments"].get(assignment_id)
+
+    def list_assignments(
+        self,
+        status: Optional[str] = None,
+        *,
+        user_id: Optional[int] = None,
+        chore_id: Optional[int] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        with self._locks["assignments"]:
+            candidates: Optional[_SortedList] = None
+            for index, key in (
+                (self._db["assignments_by_chore"], chore_id),
+                (self._db["assignments_by_user"], user_id),
+                (self._db["assignments_by_status"], status),
+            ):
+                if key is None:
+                    continue
+                bucket = index.get(key, _EMPTY_BUCKET)
+                if candidates is None or len(bucket) < len(candidates):
+                    candidates = bucket
+            ids: Optional[Iterable[int]] = None
+            if candidates is not None:
+                ids = candidates.irange(after_id, inclusive=False)
+            return self._page(
+                "assignments",
+                "assignment",
+                after_id,
+                limit,
+                ids=ids,
+                predicate=lambda a: (
+                    (status is None or a["status"] == status)
+                    and (user_id is None or a["user_id"] == user_id)
+                    and (chore_id is None or a["chore_id"] == chore_id)
+                ),
+            )
+
+    def update_assignment(
+        self, assignment_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        with self._locks["assignments"]:
+            current = self._db["assignments"].get(assignment_id)
+            if current is None:
+                return None
+            assignment = {**current, **changes, "version": self._bump_version("assignments")}
+            self._db["assignments"][assignment_id] = assignment
+            if (
+                assignment["chore_id"] != current["chore_id"]
+                or assignment["user_id"] != current["user_id"]
+                or assignment["status"] != current["status"]
+                or assignment["due_at"] != current["due_at"]
+            ):
+                self._unindex_assignment(current)
+                self._index_assignment(assignment)
+        return assignment
+
+    def count_assignments_by_status(self) -> Dict[str, int]:
+        with self._locks["assignments"]:
+            return {
+                status: len(bucket)
+                for status, bucket in self._db["assignments_by_status"].items()
+            }
+
+    def count_overdue(self, now: datetime) -> int:
+        with self._locks["assignments"]:
+            return self._db["open_by_due"].count_below((now,))
+
+    def list_open_due_between(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        with self._locks["assignments"]:
+            open_by_due = self._db["open_by_due"]
+            # (start,) sorts before every (start, id) entry.
+            if after is not None and after >= (start,):
+                entries = open_by_due.irange(after, inclusive=False)
+            else:
+                entries = open_by_due.irange((start,))
+            assignments = self._db["assignments"]
+            rows = (
+                assignments[assignment_id]
+                for _, assignment_id in takewhile(lambda entry: entry[0] < end, entries)
+            )
+            return list(islice(rows, limit))
+
+    def add_attachment(self, chore_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._locks["attachments"]:
+            attachment = {
+                "id": self._next_sequence("attachment"),
+                "chore_id": chore_id,
+                "width": None,
+                "height": None,
+                **data,
+            }
+            self._db["attachments"].setdefault(chore_id, []).append(attachment)
+            self._acquire_blob(attachment["filename"], attachment["size"])
+        return attachment
+
+    def acquire_attachment_file(self, filename: str, size: int) -> None:
+        with self._locks["attachments"]:
+            self._acquire_blob(filename, size)
+
+    def release_attachment_file(self, filename: str) -> bool:
+        with self._locks["attachments"]:
+            return self._release_blob(filename)
+
+    def list_attachments(self, chore_id: int) -> List[Dict[str, Any]]:
+        with self._locks["attachments"]:
+            return list(self._db["attachments"].get(chore_id, []))
+
+    def count_attachment_references(self, filename: str) -> int:
+        blob = self._db["attachment_blobs"].get(filename)
+        return blob["refcount"] if blob is not None else 0
+
+    def attachment_storage_stats(self) -> Dict[str, int]:
+        with self._locks["attachments"]:
+            blobs = list(self._db["attachment_blobs"].values())
+        return {
+            "references": sum(b["refcount"] for b in blobs),
+            "blobs": len(blobs),
+            "logical_bytes": sum(b["size"] * b["refcount"] for b in blobs),
+            "stored_bytes": sum(b["size"] for b in blobs),
+        }
+
+    def create_item(self, name: str) -> Dict[str, Any]:
+        with self._locks["items"]:
+            item_id = self._next_sequence("item")
+            item = {"id": item_id, "name": name}
+            self._db["items"][item_id] = item
+        return item
+
+    def get_item(self, item_id: int) -> Optional[Dict[str, Any]]:
+        return self._db["items"].get(item_id)
+
+    def enqueue_notifications(
+        self, entries: List[Tuple[int, Dict[str, Any]]], now: datetime
+    ) -> List[Dict[str, Any]]:
+        queued = []
+        with self._locks["notifications"]:
+            for assignment_id, payload in entries:
+                notification = _new_notification(
+                    self._next_sequence("notification"), assignment_id, payload, now
+                )
+                self._db["notifications"][notification["id"]] = notification
+                heapq.heappush(self._db["notification_queue"], (now, notification["id"]))
+                queued.append(dict(notification))
+        return queued
+
+    def get_notification(self, notification_id: int) -> Optional[Dict[str, Any]]:
+        with self._locks["notifications"]:
+            notification = self._db["notifications"].get(notification_id)
+            return dict(notification) if notification is not None else None
+
+    def claim_notifications(
+        self, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Dict[str, Any]]:
+        claimed: List[Dict[str, Any]] = []
+        with self._locks["notifications"]:
+            queue = self._db["notification_queue"]
+            while queue and len(claimed) < limit and queue[0][0] <= now:
+                due_at, notification_id = heapq.heappop(queue)
+                notification = self._db["notifications"].get(notification_id)
+                if (
+                    notification is None
+                    or notification["status"] != NOTIFICATION_QUEUED
+                    or notification["next_attempt_at"] != due_at
+                ):
+                    continue
+                notification["attempts"] += 1
+                notification["next_attempt_at"] = lease_until
+                heapq.heappush(queue, (lease_until, notification_id))
+                claimed.append(dict(notification))
+        return claimed
+
+    def complete_notification(self, notification_id: int, now: datetime) -> None:
+        with self._locks["notifications"]:
+            notification = self._db["notifications"].get(notification_id)
+            if notification is None:
+                return
+            notification.update(
+                status=NOTIFICATION_DELIVERED,
+                next_attempt_at=None,
+                last_error=None,
+                delivered_at=now,
+            )
+
+    def fail_notification(
+        self, notification_id: int, error: str, retry_at: Optional[datetime]
+    ) -> None:
+        with self._locks["notifications"]:
+            notification = self._db["notifications"].get(notification_id)
+            if notification is None:
+                return
+            notification["last_error"] = error
+            notification["next_attempt_at"] = retry_at
+            if retry_at is None:
+                notification["status"] = NOTIFICATION_DEAD
+            else:
+                heapq.heappush(self._db["notification_queue"], (retry_at, notification_id))
+
+    def defer_notification(
+        self, notification_id: int, error: str, retry_at: datetime
+    ) -> None:
+        with self._locks["notifications"]:
+            notification = self._db["notifications"].get(notification_id)
+            if notification is None:
+                return
+            notification["attempts"] = max(notification["attempts"] - 1, 0)
+            notification["last_error"] = error
+            notification["next_attempt_at"] = retry_at
+            heapq.heappush(self._db["notification_queue"], (retry_at, notification_id))
+
+
+# Mutating MemoryRepository methods that go through the write-ahead log, with
+# the collection locks each one needs, in the documented order.
+_LOGGED_OPERATIONS: Dict[str, Tuple[str, ...]] = {
+    "create_user": ("users",),
+    "create_chore": ("chores",),
+    "update_chore": ("chores",),
+    "delete_chore": ("chores", "assignments", "attachments"),
+    "create_assignment": ("assignments",),
+    "update_assignment": ("assignments",),
+    "add_attachment": ("attachments",),
+    "acquire_attachment_file": ("attachments",),
+    "release_attachment_file": ("attachments",),
+    "create_item": ("items",),
+}
+_SNAPSHOT_LOCKS = ("chores", "assignments", "attachments", "users", "items")
+_DURABLE_SEQUENCES = ("user", "chore", "assignment", "attachment", "item")
+
+
+class DurableMemoryRepository(MemoryRepository):
+    """
+    MemoryRepository that survives restarts. Each mutation is appended to a
+    write-ahead log (see app.journal) under the collection lock that orders it
+    in memory, then synced after the lock is released, so concurrent writers
+    share fsyncs instead of queueing on them.
+
+    Every `snapshot_every` log records a background thread takes shallow
+    copies of the collections under all locks, switches the log to a new
+    segment and writes the copies out as a snapshot; older segments are then
+    deleted. `close` writes a final snapshot. Startup loads the newest
+    snapshot, rebuilds the secondary indexes and replays the log tail through
+    the regular methods, which reproduces the same ids.
+
+    Users, chores, assignments, attachments and items are durable; the
+    notification outbox stays process-local and starts empty.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        *,
+        fsync: FsyncMode = "always",
+        fsync_interval: float = 0.05,
+        snapshot_every: int = 100_000,
+    ) -> None:
+        super().__init__()
+        self._directory = directory
+        self._snapshot_every = snapshot_every
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        state, records, next_segment = recover(directory)
+        if state is not None:
+            self._restore(state)
+        # Nothing reads the due index during replay, so instead of a sorted
+        # insert per record it is rebuilt once at the end.
+        self._replaying = True
+        for operation, args in records:
+            getattr(MemoryRepository, operation)(self, *args)
+        self._replaying = False
+        self._rebuild_due_index()
+        self._wal = WriteAheadLog(
+            directory, next_segment, fsync=fsync, interval=fsync_interval
+        )
+        if state is None:
+            # Pin down the random starting versions of a new store, which
+            # replay alone would not reproduce.
+            self.snapshot()
+
+    def _restore(self, state: Dict[str, Any]) -> None:
+        db = self._db
+        for table in ("users", "chores", "assignments", "attachments", "attachment_blobs", "items"):
+            db[table] = state[table]
+        db["sequence"].update(state["sequence"])
+        db["versions"].update(state["versions"])
+        for index_name, field in _ASSIGNMENT_INDEXES:
+            grouped: Dict[Any, List[int]] = {}
+            for assignment in db["assignments"].values():
+                grouped.setdefault(assignment[field], []).append(assignment["id"])
+            db[index_name] = {key: _SortedList(ids) for key, ids in grouped.items()}
+
+    def _rebuild_due_index(self) -> None:
+        self._db["open_by_due"] = _SortedList(
+            (assignment["due_at"], assignment["id"])
+            for assignment in self._db["assignments"].values()
+            if assignment["status"] != COMPLETED_STATUS
+        )
+
+    def _index_due(self, assignment: Dict[str, Any]) -> None:
+        if not self._replaying:
+            super()._index_due(assignment)
+
+    def _unindex_due(self, assignment: Dict[str, Any]) -> None:
+        if not self._replaying:
+            super()._unindex_due(assignment)
+
+    def _unindex_due_many(self, assignments: List[Dict[str, Any]]) -> None:
+        if not self._replaying:
+            super()._unindex_due_many(assignments)
+
+    def _logged(self, operation: str, *args: Any) -> Any:
+        with ExitStack() as stack:
+            for table in _LOGGED_OPERATIONS[operation]:
+                stack.enter_context(self._locks[table])
+            lsn = self._wal.append((operation, args))
+            result = getattr(MemoryRepository, operation)(self, *args)
+        self._wal.sync(lsn)
+        if self._wal.records_since_rotate >= self._snapshot_every:
+            self._start_snapshot()
+        return result
+
+    def create_user(self, name: str) -> Dict[str, Any]:
+        return self._logged("create_user", name)
+
+    def create_chore(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._logged("create_chore", data)
+
+    def update_chore(
+        self, chore_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        return self._logged("update_chore", chore_id, changes)
+
+    def delete_chore(self, chore_id: int) -> List[Dict[str, Any]]:
+        return self._logged("delete_chore", chore_id)
+
+    def create_assignment(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._logged("create_assignment", data)
+
+    def update_assignment(
+        self, assignment_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        return self._logged("update_assignment", assignment_id, changes)
+
+    def add_attachment(self, chore_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._logged("add_attachment", chore_id, data)
+
+    def acquire_attachment_file(self, filename: str, size: int) -> None:
+        return self._logged("acquire_attachment_file", filename, size)
+
+    def release_attachment_file(self, filename: str) -> bool:
+        return self._logged("release_attachment_file", filename)
+
+    def create_item(self, name: str) -> Dict[str, Any]:
+        return self._logged("create_item", name)
+
+    def _start_snapshot(self) -> None:
+        with self._snapshot_lock:
+            if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+                return
+            self._snapshot_thread = threading.Thread(
+                target=self.snapshot, name="store-snapshot", daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def snapshot(self) -> None:
+        """
+        Write a snapshot of the current state and drop the log it replaces.
+        Writers are blocked only while the collections are copied.
+        """
+        with ExitStack() as stack:
+            for table in _SNAPSHOT_LOCKS:
+                stack.enter_context(self._locks[table])
+            db = self._db
+            # Records are replaced rather than mutated on update, so copying
+            # the containers is enough; blob counters are mutated in place.
+            state = {
+                "users": dict(db["users"]),
+                "chores": dict(db["chores"]),
+                "assignments": dict(db["assignments"]),
+                "attachments": {k: list(v) for k, v in db["attachments"].items()},
+                "attachment_blobs": {k: dict(v) for k, v in db["attachment_blobs"].items()},
+                "items": dict(db["items"]),
+                "sequence": {name: db["sequence"][name] for name in _DURABLE_SEQUENCES},
+                "versions": dict(db["versions"]),
+            }
+            segment = self._wal.rotate()
+        write_snapshot(self._directory, segment, state, fsync=self._wal.fsync_mode != "off")
+        self._wal.drop_before(segment)
+
+    def close(self) -> None:
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join()
+        self.snapshot()
+        self._wal.close()
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    cadence TEXT NOT NULL,
+    description TEXT,
+    owner_id INTEGER NOT NULL REFERENCES users(id),
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_chores_owner ON chores(owner_id);
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    chore_id INTEGER NOT NULL REFERENCES chores(id) ON DELETE CASCADE,
+    due_at INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_assignments_chore ON assignments(chore_id);
+CREATE INDEX IF NOT EXISTS ix_assignments_user ON assignments(user_id);
+CREATE INDEX IF NOT EXISTS ix_assignments_due ON assignments(due_at);
+CREATE INDEX IF NOT EXISTS ix_assignments_status_due ON assignments(status, due_at);
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chore_id INTEGER NOT NULL REFERENCES chores(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_attachments_chore ON attachments(chore_id);
+CREATE TABLE IF NOT EXISTS attachment_blobs (
+    filename TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assignment_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER,
+    last_error TEXT,
+    created_at INTEGER NOT NULL,
+    delivered_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_notifications_due ON notifications(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS collection_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# Statements are kept as constants so sqlite3's per-connection statement cache
+# reuses the prepared form instead of re-parsing SQL on every call.
+_SEED_VERSION = "INSERT OR IGNORE INTO collection_versions (name, version) VALUES (?, ?)"
+_BUMP_VERSION = (
+    "UPDATE collection_versions SET version = version + 1 WHERE name = ? RETURNING version"
+)
+_SELECT_VERSION = "SELECT version FROM collection_versions WHERE name = ?"
+_INSERT_USER = "INSERT INTO users (name, version) VALUES (?, ?)"
+_SELECT_USER = "SELECT id, name, version FROM users WHERE id = ?"
+_SELECT_USERS = "SELECT id, name, version FROM users WHERE id > ? ORDER BY id LIMIT ?"
+_COUNT_USERS = "SELECT COUNT(*) FROM users"
+_INSERT_CHORE = (
+    "INSERT INTO chores (title, cadence, description, owner_id, version) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+_SELECT_CHORE = (
+    "SELECT id, title, cadence, description, owner_id, version FROM chores WHERE id = ?"
+)
+_SELECT_CHORES = (
+    "SELECT id, title, cadence, description, owner_id, version FROM chores "
+    "WHERE id > ? ORDER BY id LIMIT ?"
+)
+_COUNT_CHORES = "SELECT COUNT(*) FROM chores"
+_UPDATE_CHORE = (
+    "UPDATE chores SET title = ?, cadence = ?, description = ?, owner_id = ?, version = ? "
+    "WHERE id = ?"
+)
+_DELETE_CHORE = "DELETE FROM chores WHERE id = ?"
+_COUNT_CHORE_ASSIGNMENTS = "SELECT COUNT(*) FROM assignments WHERE chore_id = ?"
+_INSERT_ASSIGNMENT = (
+    "INSERT INTO assignments (user_id, chore_id, due_at, status, version) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+_SELECT_ASSIGNMENT = (
+    "SELECT id, user_id, chore_id, due_at, status, version FROM assignments WHERE id = ?"
+)
+_SELECT_ASSIGNMENTS = "SELECT id, user_id, chore_id, due_at, status, version FROM assignments"
+# Filter fragments are fixed strings, so only a handful of distinct statements are
+# ever built and each stays in the statement cache.
+_ASSIGNMENT_FILTERS = (
+    ("after_id", "id > ?"),
+    ("status", "status = ?"),
+    ("user_id", "user_id = ?"),
+    ("chore_id", "chore_id = ?"),
+)
+_UPDATE_ASSIGNMENT = (
+    "UPDATE assignments SET due_at = ?, status = ?, version = ? WHERE id = ?"
+)
+_COUNT_BY_STATUS = "SELECT status, COUNT(*) FROM assignments GROUP BY status"
+_COUNT_OVERDUE = (
+    "SELECT (SELECT COUNT(*) FROM assignments WHERE due_at < ?1)"
+    " - (SELECT COUNT(*) FROM assignments WHERE status = ?2 AND due_at < ?1)"
+)
+_SELECT_OPEN_DUE_BETWEEN = (
+    "SELECT id, user_id, chore_id, due_at, status, version FROM assignments "
+    "WHERE due_at >= ? AND due_at < ? AND status != ? AND (due_at, id) > (?, ?) "
+    "ORDER BY due_at, id LIMIT ?"
+)
+_INSERT_ATTACHMENT = (
+    "INSERT INTO attachments (chore_id, filename, content_type, size, width, height) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SELECT_ATTACHMENTS = (
+    "SELECT id, chore_id, filename, content_type, size, width, height FROM attachments "
+    "WHERE chore_id = ? ORDER BY id"
+)
+_ACQUIRE_BLOB = (
+    "INSERT INTO attachment_blobs (filename, size, refcount) VALUES (?, ?, 1) "
+    "ON CONFLICT(filename) DO UPDATE SET refcount = refcount + 1"
+)
+_RELEASE_BLOB = "UPDATE attachment_blobs SET refcount = refcount - 1 WHERE filename = ?"
+_SELECT_BLOB_REFCOUNT = "SELECT refcount FROM attachment_blobs WHERE filename = ?"
+_DELETE_BLOB = "DELETE FROM attachment_blobs WHERE filename = ?"
+_ATTACHMENT_STORAGE_STATS = (
+    "SELECT COALESCE(SUM(refcount), 0) AS \"references\", COUNT(*) AS blobs, "
+    "COALESCE(SUM(size * refcount), 0) AS logical_bytes, "
+    "COALESCE(SUM(size), 0) AS stored_bytes FROM attachment_blobs"
+)
+_INSERT_ITEM = "INSERT INTO items (name) VALUES (?)"
+_SELECT_ITEM = "SELECT id, name FROM items WHERE id = ?"
+_NOTIFICATION_COLUMNS = (
+    "id, assignment_id, payload, status, attempts, next_attempt_at, last_error, "
+    "created_at, delivered_at"
+)
+_INSERT_NOTIFICATION = (
+    "INSERT INTO notifications (assignment_id, payload, status, next_attempt_at, created_at)"
+    " VALUES (?, ?, ?, ?, ?)"
+)
+_SELECT_NOTIFICATION = f"SELECT {_NOTIFICATION_COLUMNS} FROM notifications WHERE id = ?"
+_SELECT_DUE_NOTIFICATIONS = (
+    f"SELECT {_NOTIFICATION_COLUMNS} FROM notifications "
+    "WHERE status = ? AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT ?"
+)
+_LEASE_NOTIFICATION = (
+    "UPDATE notifications SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?"
+)
+_COMPLETE_NOTIFICATION = (
+    "UPDATE notifications SET status = ?, next_attempt_at = NULL, last_error = NULL, "
+    "delivered_at = ? WHERE id = ?"
+)
+_FAIL_NOTIFICATION = (
+    "UPDATE notifications SET status = ?, next_attempt_at = ?, last_error = ? WHERE id = ?"
+)
+_DEFER_NOTIFICATION = (
+    "UPDATE notifications SET attempts = MAX(attempts - 1, 0), next_attempt_at = ?, "
+    "last_error = ? WHERE id = ?"
+)
+
+
+# Columns added after a table was first shipped. CREATE TABLE IF NOT EXISTS
+# leaves existing tables alone, so older database files get them here.
+_ADDED_COLUMNS = (
+    ("attachments", "width", "INTEGER"),
+    ("attachments", "height", "INTEGER"),
+    ("users", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("chores", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("assignments", "version", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def _add_missing_columns(conn: sqlite3.Connection) -> None:
+    for table, column, declaration in _ADDED_COLUMNS:
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column in existing:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        except sqlite3.OperationalError as exc:
+            # Another worker added it between the check and the ALTER.
+            if "duplicate column" not in str(exc):
+                raise
+
+
+def _to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _notification_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    notification = dict(row)
+    notification["payload"] = json.loads(notification["payload"])
+    for key in ("next_attempt_at", "created_at", "delivered_at"):
+        if notification[key] is not None:
+            notification[key] = _from_micros(notification[key])
+    return notification
+
+
+def _sql_limit(limit: Optional[int]) -> int:
+    # SQLite treats a negative LIMIT as "no limit".
+    return -1 if limit is None else limit
+
+
+def _assignment_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    assignment = dict(row)
+    assignment["due_at"] = _from_micros(assignment["due_at"])
+    return assignment
+
+
+class SQLiteRepository(Repository):
+    """
+    SQLite storage in WAL mode. Each thread gets its own connection so the
+    FastAPI threadpool can read concurrently while writes are serialised by
+    SQLite itself.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        _add_missing_columns(conn)
+        conn.executemany(
+            _SEED_VERSION, [(name, _initial_version()) for name in VERSIONED_COLLECTIONS]
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = sqlite3.connect(
+            self._path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=128,
+        )
+        conn.row_factory = sqlite3.Row
+        # busy_timeout goes first: several worker processes may open the same
+        # file at once and switching to WAL needs a brief exclusive lock.
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _fetch_one(self, sql: str, params: tuple) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def _fetch_all(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def _scalar(self, sql: str, params: tuple = ()) -> int:
+        return self._connect().execute(sql, params).fetchone()[0]
+
+    @staticmethod
+    def _bump_version(conn: sqlite3.Connection, collection: str) -> int:
+        return conn.execute(_BUMP_VERSION, (collection,)).fetchone()[0]
+
+    def collection_version(self, collection: str) -> int:
+        return self._scalar(_SELECT_VERSION, (collection,))
+
+    def create_user(self, name: str) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            version = self._bump_version(conn, "users")
+            cursor = conn.execute(_INSERT_USER, (name, version))
+        return {"id": cursor.lastrowid, "name": name, "version": version}
+
+    def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return self._fetch_one(_SELECT_USER, (user_id,))
+
+    def list_users(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return self._fetch_all(_SELECT_USERS, (after_id, _sql_limit(limit)))
+
+    def count_users(self) -> int:
+        return self._scalar(_COUNT_USERS)
+
+    def create_chore(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            version = self._bump_version(conn, "chores")
+            cursor = conn.execute(
+                _INSERT_CHORE,
+                (data["title"], data["cadence"], data["description"], data["owner_id"], version),
+            )
+        return {"id": cursor.lastrowid, **data, "version": version}
+
+    def get_chore(self, chore_id: int) -> Optional[Dict[str, Any]]:
+        return self._fetch_one(_SELECT_CHORE, (chore_id,))
+
+    def list_chores(
+        self, *, after_id: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        return self._fetch_all(_SELECT_CHORES, (after_id, _sql_limit(limit)))
+
+    def count_chores(self) -> int:
+        return self._scalar(_COUNT_CHORES)
+
+    def update_chore(
+        self, chore_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute(_SELECT_CHORE, (chore_id,)).fetchone()
+            if row is None:
+                return None
+            chore = {**dict(row), **changes, "version": self._bump_version(conn, "chores")}
+            conn.execute(
+                _UPDATE_CHORE,
+                (
+                    chore["title"],
+                    chore["cadence"],
+                    chore["description"],
+                    chore["owner_id"],
+                    chore["version"],
+                    chore_id,
+                ),
+            )
+        return chore
+
+    def delete_chore(self, chore_id: int) -> List[Dict[str, Any]]:
+        with self._transaction() as conn:
+            released = [
+                dict(row)
+                for row in conn.execute(_SELECT_ATTACHMENTS, (chore_id,)).fetchall()
+                if self._release_blob(conn, row["filename"])
+            ]
+            if conn.execute(_COUNT_CHORE_ASSIGNMENTS, (chore_id,)).fetchone()[0]:
+                self._bump_version(conn, "assignments")
+            # Assignments and attachment rows go with it via ON DELETE CASCADE.
+            if conn.execute(_DELETE_CHORE, (chore_id,)).rowcount:
+                self._bump_version(conn, "chores")
+        return released
+
+    def create_assignment(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            version = self._bump_version(conn, "assignments")
+            cursor = conn.execute(
+                _INSERT_ASSIGNMENT,
+                (
+                    data["user_id"],
+                    data["chore_id"],
+                    _to_micros(data["due_at"]),
+                    data["status"],
+                    version,
+                ),
+            )
+        return {"id": cursor.lastrowid, **data, "version": version}
+
+    def get_assignment(self, assignment_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(_SELECT_ASSIGNMENT, (assignment_id,)).fetchone()
+        return _assignment_from_row(row) if row is not None else None
+
+    def list_assignments(
+        self,
+        status: Optional[str] = None,
+        *,
+        user_id: Optional[int] = None,
+        chore_id: Optional[int] = None,
+        after_id: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        values = {
+            "after_id": after_id or None,
+            "status": status,
+            "user_id": user_id,
+            "chore_id": chore_id,
+        }
+        active = [
+            (clause, values[name])
+            for name, clause in _ASSIGNMENT_FILTERS
+            if values[name] is not None
+        ]
+        sql = _SELECT_ASSIGNMENTS
+        if active:
+            sql += " WHERE " + " AND ".join(clause for clause, _ in active)
+        params = tuple(value for _, value in active) + (_sql_limit(limit),)
+        rows = self._connect().execute(sql + " ORDER BY id LIMIT ?", params)
+        return [_assignment_from_row(row) for row in rows]
+
+    def update_assignment(
+        self, assignment_id: int, changes: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        with self._transaction() as conn:
+            row = conn.execute(_SELECT_ASSIGNMENT, (assignment_id,)).fetchone()
+            if row is None:
+                return None
+            assignment = {
+                **_assignment_from_row(row),
+                **changes,
+                "version": self._bump_version(conn, "assignments"),
+            }
+            conn.execute(
+                _UPDATE_ASSIGNMENT,
+                (
+                    _to_micros(assignment["due_at"]),
+                    assignment["status"],
+                    assignment["version"],
+                    assignment_id,
+                ),
+            )
+        return assignment
+
+    def count_assignments_by_status(self) -> Dict[str, int]:
+        rows = self._connect().execute(_COUNT_BY_STATUS)
+        return {status: count for status, count in rows}
+
+    def count_overdue(self, now: datetime) -> int:
+        return self._scalar(_COUNT_OVERDUE, (_to_micros(now), COMPLETED_STATUS))
+
+    def list_open_due_between(
+        self,
+        start: datetime,
+        end: datetime,
+        *,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        # Without a cursor, start from just before (start, 1). The plain
+        # due_at bound lets the range scan on ix_assignments_due skip ahead.
+        after_due, after_id = (start, 0) if after is None else after
+        rows = self._connect().execute(
+            _SELECT_OPEN_DUE_BETWEEN,
+            (
+                _to_micros(max(start, after_due)),
+                _to_micros(end),
+                COMPLETED_STATUS,
+                _to_micros(after_due),
+                after_id,
+                _sql_limit(limit),
+            ),
+        )
+        return [_assignment_from_row(row) for row in rows]
+
+    def add_attachment(self, chore_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                _INSERT_ATTACHMENT,
+                (
+                    chore_id,
+                    data["filename"],
+                    data["content_type"],
+                    data["size"],
+                    data.get("width"),
+                    data.get("height"),
+                ),
+            )
+            conn.execute(_ACQUIRE_BLOB, (data["filename"], data["size"]))
+        return {
+            "id": cursor.lastrowid,
+            "chore_id": chore_id,
+            "width": None,
+            "height": None,
+            **data,
+        }
+
+    def list_attachments(self, chore_id: int) -> List[Dict[str, Any]]:
+        return self._fetch_all(_SELECT_ATTACHMENTS, (chore_id,))
+
+    @staticmethod
+    def _release_blob(conn: sqlite3.Connection, filename: str) -> bool:
+        # Files stored before dedup have no blob row and are always released.
+        if conn.execute(_RELEASE_BLOB, (filename,)).rowcount:
+            (refcount,) = conn.execute(_SELECT_BLOB_REFCOUNT, (filename,)).fetchone()
+            if refcount > 0:
+                return False
+            conn.execute(_DELETE_BLOB, (filename,))
+        return True
+
+    def acquire_attachment_file(self, filename: str, size: int) -> None:
+        with self._transaction() as conn:
+            conn.execute(_ACQUIRE_BLOB, (filename, size))
+
+    def release_attachment_file(self, filename: str) -> bool:
+        with self._transaction() as conn:
+            return self._release_blob(conn, filename)
+
+    def count_attachment_references(self, filename: str) -> int:
+        row = self._connect().execute(_SELECT_BLOB_REFCOUNT, (filename,)).fetchone()
+        return row["refcount"] if row is not None else 0
+
+    def attachment_storage_stats(self) -> Dict[str, int]:
+        return self._fetch_one(_ATTACHMENT_STORAGE_STATS, ())
+
+    def create_item(self, name: str) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            cursor = conn.execute(_INSERT_ITEM, (name,))
+        return {"id": cursor.lastrowid, "name": name}
+
+    def get_item(self, item_id: int) -> Optional[Dict[str, Any]]:
+        return self._fetch_one(_SELECT_ITEM, (item_id,))
+
+    def enqueue_notifications(
+        self, entries: List[Tuple[int, Dict[str, Any]]], now: datetime
+    ) -> List[Dict[str, Any]]:
+        queued = []
+        stamp = _to_micros(now)
+        with self._transaction() as conn:
+            for assignment_id, payload in entries:
+                cursor = conn.execute(
+                    _INSERT_NOTIFICATION,
+                    (assignment_id, json.dumps(payload), NOTIFICATION_QUEUED, stamp, stamp),
+                )
+                queued.append(
+                    _new_notification(cursor.lastrowid, assignment_id, payload, now)
+                )
+        return queued
+
+    def get_notification(self, notification_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(_SELECT_NOTIFICATION, (notification_id,)).fetchone()
+        return _notification_from_row(row) if row is not None else None
+
+    def claim_notifications(
+        self, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Dict[str, Any]]:
+        # BEGIN IMMEDIATE holds the write lock between SELECT and UPDATE, so
+        # workers in other processes cannot claim the same rows.
+        with self._transaction() as conn:
+            rows = conn.execute(
+                _SELECT_DUE_NOTIFICATIONS,
+                (NOTIFICATION_QUEUED, _to_micros(now), limit),
+            ).fetchall()
+            lease = _to_micros(lease_until)
+            conn.executemany(_LEASE_NOTIFICATION, [(lease, row["id"]) for row in rows])
+        claimed = []
+        for row in rows:
+            notification = _notification_from_row(row)
+            notification["attempts"] += 1
+            notification["next_attempt_at"] = lease_until
+            claimed.append(notification)
+        return claimed
+
+    def complete_notification(self, notification_id: int, now: datetime) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                _COMPLETE_NOTIFICATION,
+                (NOTIFICATION_DELIVERED, _to_micros(now), notification_id),
+            )
+
+    def fail_notification(
+        self, notification_id: int, error: str, retry_at: Optional[datetime]
+    ) -> None:
+        status = NOTIFICATION_QUEUED if retry_at is not None else NOTIFICATION_DEAD
+        next_attempt_at = _to_micros(retry_at) if retry_at is not None else None
+        with self._transaction() as conn:
+            conn.execute(_FAIL_NOTIFICATION, (status, next_attempt_at, error, notification_id))
+
+    def defer_notification(
+        self, notification_id: int, error: str, retry_at: datetime
+    ) -> None:
+        with self._transaction() as conn:
+            conn.execute(_DEFER_NOTIFICATION, (_to_micros(retry_at), error, notification_id))
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def build_repository(settings: Settings) -> Repository:
+    if settings.storage_backend == "sqlite":
+        return SQLiteRepository(settings.database_path)
+    if settings.memory_wal_dir is not None:
+        return DurableMemoryRepository(
+            settings.memory_wal_dir,
+            fsync=settings.memory_wal_fsync,
+            fsync_interval=settings.memory_wal_fsync_interval,
+            snapshot_every=settings.memory_snapshot_every,
+        )
+    return MemoryRepository()
@@ -0,0 +1,126 @@
+"""
+Multi-threaded stress test for the storage backends.
+
+    python benchmarks/bench_concurrency.py --threads 1,2,4,8,16
+
+Every thread runs a mix of creates and status/due-date updates against one
+shared repository, like FastAPI's threadpool does. After each run the script
+verifies that no id was handed out twice and that the secondary indexes agree
+with a full recount, then reports throughput per thread count.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.storage import MemoryRepository, Repository, SQLiteRepository  # noqa: E402
+
+STATUSES = ("pending", "completed", "skipped")
+
+
+def _worker(repo: Repository, ops: int, seed: int, created: list, barrier) -> None:
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    mine = []
+    barrier.wait()
+    for _ in range(ops):
+        roll = rng.random()
+        if roll < 0.2:
+            mine.append(("user", repo.create_user("stress")["id"]))
+        elif roll < 0.6 or len(mine) < 2:
+            assignment = repo.create_assignment(
+                {
+                    "user_id": 1,
+                    "chore_id": 1,
+                    "due_at": now + timedelta(minutes=rng.randint(-600, 600)),
+                    "status": rng.choice(STATUSES),
+                }
+            )
+            mine.append(("assignment", assignment["id"]))
+        else:
+            # Update a random assignment, possibly one another thread is also
+            # touching, to provoke lost updates on the shared indexes.
+            target = rng.randint(1, max(1, len(mine) * 4))
+            repo.update_assignment(target, {"status": rng.choice(STATUSES)})
+    created.extend(mine)
+
+
+def _verify(repo: Repository, created: list) -> None:
+    counts = Counter(kind for kind, _ in created)
+    for kind in counts:
+        ids = [i for k, i in created if k == kind]
+        if len(ids) != len(set(ids)):
+            raise AssertionError(f"duplicate {kind} ids allocated")
+    assignments = repo.list_assignments()
+    recount = Counter(a["status"] for a in assignments)
+    if repo.count_assignments_by_status() != dict(recount):
+        raise AssertionError("status counters diverged from recount")
+    now = datetime.now(timezone.utc)
+    overdue = sum(1 for a in assignments if a["status"] != "completed" and a["due_at"] < now)
+    if repo.count_overdue(now) != overdue:
+        raise AssertionError("due-date index diverged from recount")
+
+
+def run(backend: str, threads: int, ops: int, workdir: Path) -> float:
+    if backend == "sqlite":
+        repo: Repository = SQLiteRepository(workdir / f"stress-{threads}.db")
+    else:
+        repo = MemoryRepository()
+    owner = repo.create_user("owner")
+    repo.create_chore(
+        {"title": "stress", "cadence": "daily", "description": None, "owner_id": owner["id"]}
+    )
+    created: list = [("user", owner["id"])]
+    barrier = threading.Barrier(threads + 1)
+    pool = [
+        threading.Thread(target=_worker, args=(repo, ops, seed, created, barrier))
+        for seed in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    _verify(repo, created)
+    repo.close()
+    return threads * ops / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", default="1,2,4,8,16")
+    parser.add_argument("--ops", type=int, default=5_000, help="Operations per thread")
+    parser.add_argument("--backends", default="memory,sqlite")
+    parser.add_argument(
+        "--switch-interval",
+        type=float,
+        default=1e-5,
+        help="sys.setswitchinterval value; small values force more interleaving",
+    )
+    args = parser.parse_args()
+
+    sys.setswitchinterval(args.switch_interval)
+    print(f"{'backend':>8} {'threads':>8} {'ops/s':>12}  checks")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(","):
+            for threads in (int(raw) for raw in args.threads.split(",")):
+                throughput = run(backend, threads, args.ops, Path(tmp))
+                print(f"{backend:>8} {threads:>8} {throughput:>12.0f}  ok")
+
+
+if __name__ == "__main__":
+    main()
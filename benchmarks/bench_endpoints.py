@@ -0,0 +1,417 @@
+"""
+Latency and throughput of every API route at several store sizes, with a
+regression check against a stored baseline.
+
+    python benchmarks/bench_endpoints.py --sizes 1000,100000,1000000 --output base.json
+    python benchmarks/bench_endpoints.py --sizes 1000,100000 --compare base.json
+    python benchmarks/bench_endpoints.py --current new.json --compare base.json
+
+For each size the store is reset and seeded through the repository API with
+that many records (1% users, 9% chores, 90% assignments, plus 1% as items),
+then every route registered on the app is driven in-process through
+`httpx.ASGITransport` with the app lifespan running, so the outbox, attachment
+pool and middleware are the real ones. Webhook deliveries go to an httpx mock
+transport. The run stops with an error if a route has no request defined here,
+so new endpoints cannot silently drop out of the suite.
+
+Each route gets `--warmup` untimed requests and then `--requests` timed ones
+issued by `--concurrency` tasks; list routes fetch pages of `PAGE` rows.
+Results (p50/p95/p99/mean latency, throughput, error count) are written as
+JSON to `--output`. With `--compare`, every route whose `--metric` grew by
+more than `--threshold` (relative) and `--min-delta-ms` (absolute) against the
+baseline is reported and the script exits with status 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import math
+import os
+import platform
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+
+from app.config import get_settings, reload_settings  # noqa: E402
+from app.files import PNG_MAGIC  # noqa: E402
+from app.main import app, get_repository, reset_app_state  # noqa: E402
+from app.notifications import NotificationClient  # noqa: E402
+
+API_KEY = "bench-key"
+HEADERS = {"X-API-Key": API_KEY}
+PAGE = 100
+STATUSES = ("pending", "completed", "skipped")
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "mean_ms")
+
+
+def _png(salt: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    ihdr = struct.pack(">IIBBBBB", 64, 64, 8, 2, 0, 0, 0)
+    # A distinct IDAT per upload, so content-addressed storage writes every one.
+    idat = salt.to_bytes(8, "big") * 64
+    return PNG_MAGIC + chunk(b"IHDR", ihdr) + chunk(b"IDAT", idat) + chunk(b"IEND", b"")
+
+
+@dataclass
+class Seeded:
+    users: int
+    chores: int
+    assignments: int
+    items: int
+    now: datetime
+    # Chores without assignments for DELETE, one per request.
+    spare_chores: List[int] = field(default_factory=list)
+    attachment: Tuple[int, int] = (0, 0)
+    notification: int = 0
+
+
+def seed(size: int, spare: int) -> Seeded:
+    repo = get_repository()
+    now = datetime.now(timezone.utc)
+    users = max(size // 100, 1)
+    chores = max(size * 9 // 100, 1)
+    assignments = max(size - users - chores, 1)
+    items = max(size // 100, 1)
+    for i in range(users):
+        repo.create_user(f"user-{i}")
+    for i in range(chores):
+        repo.create_chore(
+            {"title": f"chore-{i}", "cadence": "weekly", "description": None, "owner_id": 1}
+        )
+    for i in range(assignments):
+        repo.create_assignment(
+            {
+                "user_id": i % users + 1,
+                "chore_id": i % chores + 1,
+                # One per minute, centred on now, so due windows stay small.
+                "due_at": now + timedelta(minutes=i - assignments // 2),
+                "status": STATUSES[i % len(STATUSES)],
+            }
+        )
+    for i in range(items):
+        repo.create_item(f"item-{i}")
+    seeded = Seeded(users, chores, assignments, items, now)
+    for i in range(spare):
+        chore = repo.create_chore(
+            {"title": f"spare-{i}", "cadence": "daily", "description": None, "owner_id": 1}
+        )
+        seeded.spare_chores.append(chore["id"])
+    return seeded
+
+
+Request = Dict[str, Any]
+Case = Callable[[Seeded, int], Request]
+
+
+def _due_window(s: Seeded) -> Dict[str, str]:
+    return {"from": s.now.isoformat(), "to": (s.now + timedelta(hours=1)).isoformat()}
+
+
+# Keyed like "METHOD /route/template"; each builds the i-th request.
+CASES: Dict[str, Case] = {
+    "GET /health": lambda s, i: {"url": "/health"},
+    "POST /items": lambda s, i: {"url": "/items", "json": {"name": f"bench-{i}"}},
+    "GET /items/{item_id}": lambda s, i: {"url": f"/items/{i % s.items + 1}"},
+    "POST /users": lambda s, i: {"url": "/users", "json": {"name": f"bench-{i}"}},
+    "GET /users": lambda s, i: {"url": "/users", "params": {"limit": PAGE}},
+    "POST /chores": lambda s, i: {
+        "url": "/chores",
+        "json": {"title": f"bench-{i}", "cadence": "weekly", "owner_id": i % s.users + 1},
+    },
+    "GET /chores": lambda s, i: {"url": "/chores", "params": {"limit": PAGE}},
+    "GET /chores/{chore_id}": lambda s, i: {"url": f"/chores/{i % s.chores + 1}"},
+    "PUT /chores/{chore_id}": lambda s, i: {
+        "url": f"/chores/{i % s.chores + 1}",
+        "json": {"title": f"renamed-{i}"},
+    },
+    "DELETE /chores/{chore_id}": lambda s, i: {"url": f"/chores/{s.spare_chores[i]}"},
+    "POST /chores/{chore_id}/attachments": lambda s, i: {
+        "url": f"/chores/{i % s.chores + 1}/attachments",
+        "json": {"content": base64.b64encode(_png(2 * i)).decode()},
+    },
+    "POST /chores/{chore_id}/attachments/stream": lambda s, i: {
+        "url": f"/chores/{i % s.chores + 1}/attachments/stream",
+        "content": _png(2 * i + 1),
+        "headers": {"Content-Type": "image/png"},
+    },
+    "GET /chores/{chore_id}/attachments/{attachment_id}": lambda s, i: {
+        "url": "/chores/{}/attachments/{}".format(*s.attachment)
+    },
+    "POST /assignments": lambda s, i: {
+        "url": "/assignments",
+        "json": {
+            "user_id": i % s.users + 1,
+            "chore_id": i % s.chores + 1,
+            "due_at": (s.now + timedelta(days=1)).isoformat(),
+        },
+    },
+    "GET /assignments": lambda s, i: {
+        "url": "/assignments",
+        "params": {"status": STATUSES[i % len(STATUSES)], "limit": PAGE},
+    },
+    "GET /assignments/due": lambda s, i: {"url": "/assignments/due", "params": _due_window(s)},
+    "PATCH /assignments/{assignment_id}": lambda s, i: {
+        "url": f"/assignments/{i % s.assignments + 1}",
+        "json": {"status": STATUSES[i % len(STATUSES)]},
+    },
+    "POST /assignments/{assignment_id}/notify": lambda s, i: {
+        "url": f"/assignments/{i % s.assignments + 1}/notify"
+    },
+    "POST /assignments/notify": lambda s, i: {
+        "url": "/assignments/notify",
+        "json": {"assignment_ids": [(i * 10 + k) % s.assignments + 1 for k in range(10)]},
+    },
+    "GET /notifications/{notification_id}": lambda s, i: {
+        "url": f"/notifications/{s.notification}"
+    },
+    "GET /stats/notifications": lambda s, i: {"url": "/stats/notifications"},
+    "GET /stats": lambda s, i: {"url": "/stats"},
+    "GET /metrics": lambda s, i: {"url": "/metrics"},
+}
+
+
+def routes() -> List[str]:
+    names = [
+        f"{method} {route.path}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in sorted(route.methods)
+    ]
+    missing = [name for name in names if name not in CASES]
+    if missing:
+        raise SystemExit(f"no benchmark request defined for: {', '.join(missing)}")
+    return names
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    # Nearest-rank on sorted samples.
+    return samples[max(math.ceil(q * len(samples)) - 1, 0)]
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    method: str,
+    case: Case,
+    seeded: Seeded,
+    counter: "itertools.count[int]",
+    count: int,
+    concurrency: int,
+) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = count
+
+    async def worker() -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            request = case(seeded, next(counter))
+            headers = {**HEADERS, **request.pop("headers", {})}
+            start = time.perf_counter()
+            response = await client.request(method, headers=headers, **request)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def _bench_size(seeded: Seeded, args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    async with app.router.lifespan_context(app):
+        # Deliver webhooks to a mock instead of the network.
+        app.state.outbox.client_factory = lambda: NotificationClient(
+            settings=get_settings(),
+            max_attempts=1,
+            transport=httpx.MockTransport(lambda request: httpx.Response(200)),
+        )
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            upload = await client.post(
+                "/chores/1/attachments/stream",
+                # A salt the upload cases never reach.
+                content=_png(2**64 - 1),
+                headers={**HEADERS, "Content-Type": "image/png"},
+            )
+            seeded.attachment = (1, upload.json()["id"])
+            notify = await client.post("/assignments/1/notify", headers=HEADERS)
+            seeded.notification = notify.json()["notification_id"]
+
+            for name in routes():
+                method, _ = name.split(" ", 1)
+                counter = itertools.count()
+                await _drive(client, method, CASES[name], seeded, counter, args.warmup, 1)
+                latencies, errors, elapsed = await _drive(
+                    client,
+                    method,
+                    CASES[name],
+                    seeded,
+                    counter,
+                    args.requests,
+                    args.concurrency,
+                )
+                latencies.sort()
+                results[name] = {
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "throughput_rps": len(latencies) / elapsed,
+                    "mean_ms": statistics.fmean(latencies),
+                    "p50_ms": _percentile(latencies, 0.50),
+                    "p95_ms": _percentile(latencies, 0.95),
+                    "p99_ms": _percentile(latencies, 0.99),
+                }
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+        },
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            APP_API_KEY=API_KEY,
+            STORAGE_BACKEND=args.backend,
+            DATABASE_PATH=str(Path(tmp) / "bench.db"),
+            ATTACHMENTS_DIR=str(Path(tmp) / "attachments"),
+            NOTIFY_WEBHOOK_URL="https://hooks.bench.invalid/notify",
+            NOTIFY_ALLOWED_HOSTS="hooks.bench.invalid",
+        )
+        for size in args.sizes:
+            reload_settings()
+            reset_app_state()
+            Path(tmp, "bench.db").unlink(missing_ok=True)
+            print(f"seeding {size} records ...", flush=True)
+            start = time.perf_counter()
+            seeded = seed(size, spare=args.warmup + args.requests)
+            seed_seconds = time.perf_counter() - start
+            routes_result = asyncio.run(_bench_size(seeded, args))
+            reset_app_state()
+            report["sizes"][str(size)] = {"seed_seconds": seed_seconds, "routes": routes_result}
+            _print_size(size, seed_seconds, routes_result)
+    return report
+
+
+def _print_size(size: int, seed_seconds: float, results: Dict[str, Dict[str, float]]) -> None:
+    print(f"\nsize {size} (seeded in {seed_seconds:.1f} s)")
+    print(f"{'route':52} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name, stats in results.items():
+        print(
+            f"{name:52} {stats['throughput_rps']:>8.0f} {stats['p50_ms']:>8.3f} "
+            f"{stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['errors']:>6}"
+        )
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    metric: str,
+    threshold: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """
+    Print `metric` for every size and route present in both reports and
+    return the ones that regressed.
+    """
+    regressions = []
+    print(f"\n{'size':>8} {'route':52} {'base':>9} {'current':>9} {'change':>8}")
+    for size, base_size in baseline["sizes"].items():
+        current_size = current["sizes"].get(size)
+        if current_size is None:
+            continue
+        for name, base in base_size["routes"].items():
+            stats = current_size["routes"].get(name)
+            if stats is None:
+                continue
+            before, after = base[metric], stats[metric]
+            change = after / before - 1 if before else 0.0
+            regressed = change > threshold and after - before > min_delta_ms
+            if regressed:
+                regressions.append(f"{name} @ {size}")
+            print(
+                f"{size:>8} {name:52} {before:>9.3f} {after:>9.3f} {change:>+7.0%}"
+                + ("  REGRESSION" if regressed else "")
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[1_000, 100_000, 1_000_000],
+    )
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--output", type=Path, default=Path("bench_endpoints.json"))
+    parser.add_argument("--compare", type=Path, help="Baseline results to check against")
+    parser.add_argument(
+        "--current", type=Path, help="Compare this results file instead of running"
+    )
+    parser.add_argument("--metric", choices=METRICS, default="p95_ms")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.current is not None:
+        report = json.loads(args.current.read_text())
+    else:
+        report = run(args)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nresults written to {args.output}")
+    if args.compare is None:
+        return
+    regressions = compare(
+        json.loads(args.compare.read_text()),
+        report,
+        metric=args.metric,
+        threshold=args.threshold,
+        min_delta_ms=args.min_delta_ms,
+    )
+    if regressions:
+        raise SystemExit(
+            f"{len(regressions)} route(s) regressed beyond {args.threshold:.0%} "
+            f"on {args.metric}: {', '.join(regressions)}"
+        )
+    print(f"\nno route regressed beyond {args.threshold:.0%} on {args.metric}")
+
+
+if __name__ == "__main__":
+    main()
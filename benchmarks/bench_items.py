@@ -0,0 +1,69 @@
+"""
+Show that `GET /items/{id}` lookup latency does not grow with the item count.
+
+    python benchmarks/bench_items.py --sizes 1000,10000,100000,1000000
+
+For each size a fresh memory repository is filled, then random existing ids are
+looked up both directly on the repository and through the HTTP handler.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.config import reload_settings  # noqa: E402
+from app.main import app, get_repository, reset_app_state  # noqa: E402
+
+
+def _per_call_ns(fn, ids) -> float:
+    start = time.perf_counter_ns()
+    for item_id in ids:
+        fn(item_id)
+    return (time.perf_counter_ns() - start) / len(ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--http-lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ["APP_API_KEY"] = "bench-key"
+    os.environ["STORAGE_BACKEND"] = "memory"
+    rng = random.Random(42)
+    print(f"{'items':>10} {'repo ns/lookup':>16} {'http us/lookup':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ATTACHMENTS_DIR"] = tmp
+        reload_settings()
+        for size in (int(raw) for raw in args.sizes.split(",")):
+            reset_app_state()
+            repo = get_repository()
+            for i in range(size):
+                repo.create_item(f"item-{i}")
+            ids = [rng.randint(1, size) for _ in range(args.lookups)]
+            repo_ns = statistics.median(
+                _per_call_ns(repo.get_item, ids) for _ in range(3)
+            )
+            with TestClient(app) as client:
+                http_ids = ids[: args.http_lookups]
+                http_ns = _per_call_ns(lambda i: client.get(f"/items/{i}"), http_ids)
+            print(f"{size:>10} {repo_ns:>16.1f} {http_ns / 1000:>16.1f}")
+    reset_app_state()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Compare per-endpoint latency of the memory and SQLite storage backends.
+
+    python benchmarks/bench_storage.py --assignments 100000
+
+The store is seeded through the repository API, then every endpoint is timed
+in-process through FastAPI's TestClient so that only storage cost differs
+between runs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.config import reload_settings  # noqa: E402
+from app.main import app, get_repository, reset_app_state  # noqa: E402
+
+API_KEY = "bench-key"
+HEADERS = {"X-API-Key": API_KEY}
+STATUSES = ("pending", "completed", "skipped")
+
+
+def seed(users: int, chores: int, assignments: int) -> None:
+    repo = get_repository()
+    now = datetime.now(timezone.utc)
+    for i in range(users):
+        repo.create_user(f"user-{i}")
+    for i in range(chores):
+        repo.create_chore(
+            {
+                "title": f"chore-{i}",
+                "cadence": "weekly",
+                "description": None,
+                "owner_id": i % users + 1,
+            }
+        )
+    for i in range(assignments):
+        repo.create_assignment(
+            {
+                "user_id": i % users + 1,
+                "chore_id": i % chores + 1,
+                "due_at": now + timedelta(minutes=i - assignments // 2),
+                "status": STATUSES[i % len(STATUSES)],
+            }
+        )
+    for i in range(1000):
+        repo.create_item(f"item-{i}")
+
+
+def _timed(fn: Callable[[], object], iterations: int) -> Dict[str, float]:
+    samples: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def run_backend(backend: str, args: argparse.Namespace, workdir: Path) -> Dict[str, object]:
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["DATABASE_PATH"] = str(workdir / f"{backend}.db")
+    reload_settings()
+    reset_app_state()
+
+    start = time.perf_counter()
+    seed(args.users, args.chores, args.assignments)
+    seed_seconds = time.perf_counter() - start
+
+    due_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    n, list_n = args.iterations, args.list_iterations
+    with TestClient(app) as client:
+        endpoints = {
+            "GET /items/{id}": (lambda: client.get("/items/500"), n),
+            "POST /items": (
+                lambda: client.post("/items", json={"name": "bench"}, headers=HEADERS),
+                n,
+            ),
+            "GET /chores/{id}": (lambda: client.get("/chores/42", headers=HEADERS), n),
+            "PUT /chores/{id}": (
+                lambda: client.put(
+                    "/chores/42", json={"title": "renamed"}, headers=HEADERS
+                ),
+                n,
+            ),
+            "POST /assignments": (
+                lambda: client.post(
+                    "/assignments",
+                    json={"user_id": 1, "chore_id": 1, "due_at": due_at},
+                    headers=HEADERS,
+                ),
+                n,
+            ),
+            "PATCH /assignments/{id}": (
+                lambda: client.patch(
+                    "/assignments/7", json={"status": "completed"}, headers=HEADERS
+                ),
+                n,
+            ),
+            "GET /stats": (lambda: client.get("/stats", headers=HEADERS), n),
+            "GET /users": (lambda: client.get("/users", headers=HEADERS), list_n),
+            "GET /chores": (lambda: client.get("/chores", headers=HEADERS), list_n),
+            "GET /assignments?status=skipped": (
+                lambda: client.get(
+                    "/assignments", params={"status": "skipped"}, headers=HEADERS
+                ),
+                list_n,
+            ),
+        }
+        results = {name: _timed(fn, iters) for name, (fn, iters) in endpoints.items()}
+    reset_app_state()
+    return {"seed_seconds": seed_seconds, "endpoints": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--chores", type=int, default=10_000)
+    parser.add_argument("--assignments", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--list-iterations", type=int, default=5)
+    parser.add_argument("--backends", default="memory,sqlite")
+    parser.add_argument("--json", type=Path, help="Write raw results to this file")
+    args = parser.parse_args()
+
+    os.environ["APP_API_KEY"] = API_KEY
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        os.environ["ATTACHMENTS_DIR"] = str(workdir / "attachments")
+        report = {
+            backend: run_backend(backend, args, workdir)
+            for backend in args.backends.split(",")
+        }
+
+    backends = list(report)
+    print(f"{'endpoint':34}" + "".join(f"{b + ' p50/p95 ms':>26}" for b in backends))
+    for name in report[backends[0]]["endpoints"]:
+        row = f"{name:34}"
+        for backend in backends:
+            stats = report[backend]["endpoints"][name]
+            row += f"{stats['p50_ms']:>15.3f} /{stats['p95_ms']:>8.3f}"
+        print(row)
+    for backend in backends:
+        print(f"seed[{backend}]: {report[backend]['seed_seconds']:.1f}s")
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
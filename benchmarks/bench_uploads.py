@@ -0,0 +1,113 @@
+"""
+Compare per-upload latency of the path-based attachment writer with the
+directory-fd one.
+
+    python benchmarks/bench_uploads.py --uploads 2000 --size 4096 --depth 8
+
+`path` reproduces the previous containment scheme: resolve the root, check the
+target path has the root as a string prefix, `is_symlink()` every parent, then
+mkstemp + rename. `dirfd` is `save_attachment` on an `AttachmentRoot` opened
+once. The root is nested `--depth` directories deep, since the old parent walk
+costs one lstat per level. fsync is skipped unless `--fsync` is given, so the
+numbers show containment overhead rather than disk flush time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.files import PNG_MAGIC, AttachmentRoot, save_attachment  # noqa: E402
+
+
+def _png(idat: bytes) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    ihdr = struct.pack(">IIBBBBB", 64, 64, 8, 2, 0, 0, 0)
+    return PNG_MAGIC + chunk(b"IHDR", ihdr) + chunk(b"IDAT", idat) + chunk(b"IEND", b"")
+
+
+def _path_based_save(root: Path, data: bytes) -> None:
+    root = root.resolve(strict=True)
+    path = (root / f"{hashlib.sha256(data).hexdigest()}.png").resolve()
+    if not str(path).startswith(str(root)):
+        raise RuntimeError("escape")
+    for parent in path.parents:
+        if parent.is_symlink():
+            raise RuntimeError("symlink")
+    fd, tmp_name = tempfile.mkstemp(dir=root, prefix=".upload-", suffix=".part")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    if path.exists():
+        os.unlink(tmp_name)
+    else:
+        os.replace(tmp_name, path)
+
+
+def _per_upload_us(save, payloads) -> float:
+    start = time.perf_counter_ns()
+    for data in payloads:
+        save(data)
+    return (time.perf_counter_ns() - start) / len(payloads) / 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fsync", action="store_true")
+    args = parser.parse_args()
+
+    filler = os.urandom(args.size)
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+        os, "fsync", os.fsync if args.fsync else (lambda fd: None)
+    ):
+        base = Path(tmp).joinpath(*(f"d{i}" for i in range(args.depth)))
+        results = {"path": [], "dirfd": []}
+        for round_no in range(args.rounds):
+            for scheme in results:
+                root = base / f"{scheme}-{round_no}"
+                root.mkdir(parents=True)
+                # Unique payloads, so every upload stores a new file.
+                payloads = [
+                    _png(i.to_bytes(8, "big") + round_no.to_bytes(2, "big") + filler)
+                    for i in range(args.uploads)
+                ]
+                if scheme == "path":
+                    us = _per_upload_us(lambda d: _path_based_save(root, d), payloads)
+                else:
+                    attachment_root = AttachmentRoot(root)
+                    try:
+                        us = _per_upload_us(
+                            lambda d: save_attachment(attachment_root, d), payloads
+                        )
+                    finally:
+                        attachment_root.close()
+                results[scheme].append(us)
+
+    print(f"{'scheme':>8} {'median us/upload':>18} {'min':>10}")
+    for scheme, samples in results.items():
+        print(f"{scheme:>8} {statistics.median(samples):>18.1f} {min(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
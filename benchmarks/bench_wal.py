@@ -0,0 +1,144 @@
+"""
+Measure restart time and write overhead of the durable memory store.
+
+    python benchmarks/bench_wal.py --records 1000000 --threads 8 --writes 500
+
+Recovery: the store is filled with `--records` records (1% users, 9% chores,
+the rest assignments, a quarter of them later completed) with fsync off, then
+reopened twice: after a simulated crash, when the whole log is replayed, and
+after a clean close, when only the snapshot is loaded.
+
+Write latency: `--threads` threads each create `--writes` assignments against
+a plain MemoryRepository and against the durable store in every fsync mode.
+Latency is per call, so "always" includes waiting for the group commit.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.storage import DurableMemoryRepository, MemoryRepository, Repository  # noqa: E402
+
+NOW = datetime.now(timezone.utc)
+
+
+def fill(repo: Repository, records: int) -> None:
+    users = max(records // 100, 1)
+    chores = max(records * 9 // 100, 1)
+    for i in range(users):
+        repo.create_user(f"user-{i}")
+    for i in range(chores):
+        repo.create_chore(
+            {"title": f"chore-{i}", "cadence": "weekly", "description": None, "owner_id": 1}
+        )
+    for i in range(records - users - chores):
+        assignment = repo.create_assignment(
+            {
+                "user_id": i % users + 1,
+                "chore_id": i % chores + 1,
+                "due_at": NOW + timedelta(minutes=i % 10_000),
+                "status": "pending",
+            }
+        )
+        if i % 4 == 0:
+            repo.update_assignment(assignment["id"], {"status": "completed"})
+
+
+def timed(action: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def bench_recovery(records: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        repo = DurableMemoryRepository(directory, fsync="off", snapshot_every=records * 2)
+        print(f"filling {records} records ...", flush=True)
+        fill_s = timed(lambda: fill(repo, records))
+        log_bytes = sum(p.stat().st_size for p in directory.glob("wal-*.log"))
+        repo._wal.close()  # crash: no final snapshot
+
+        reopened: List[DurableMemoryRepository] = []
+        replay_s = timed(lambda: reopened.append(DurableMemoryRepository(directory)))
+        snapshot_s = timed(reopened[0].close)
+        snapshot_bytes = sum(p.stat().st_size for p in directory.glob("snapshot-*"))
+        load_s = timed(lambda: reopened.append(DurableMemoryRepository(directory)))
+        first, second = reopened
+        assert second.count_assignments_by_status() == first.count_assignments_by_status()
+        second.close()
+
+    print(f"fill (fsync off)       {fill_s:8.2f} s   log {log_bytes / 2**20:7.1f} MiB")
+    print(f"recover: replay log    {replay_s:8.2f} s")
+    print(f"write snapshot         {snapshot_s:8.2f} s   {snapshot_bytes / 2**20:7.1f} MiB")
+    print(f"recover: snapshot      {load_s:8.2f} s")
+
+
+def bench_writes(threads: int, writes: int) -> None:
+    print(f"\n{'store':>16} {'p50 us':>9} {'p99 us':>9} {'writes/s':>10}")
+    for label in ("memory", "wal fsync=off", "wal fsync=interval", "wal fsync=always"):
+        with tempfile.TemporaryDirectory() as tmp:
+            if label == "memory":
+                repo: Repository = MemoryRepository()
+            else:
+                mode = label.rsplit("=", 1)[1]
+                repo = DurableMemoryRepository(Path(tmp), fsync=mode)  # type: ignore[arg-type]
+            repo.create_user("bench")
+            repo.create_chore(
+                {"title": "bench", "cadence": "daily", "description": None, "owner_id": 1}
+            )
+            latencies: List[float] = []
+            lock = threading.Lock()
+
+            def worker() -> None:
+                local = []
+                for _ in range(writes):
+                    start = time.perf_counter()
+                    repo.create_assignment(
+                        {"user_id": 1, "chore_id": 1, "due_at": NOW, "status": "pending"}
+                    )
+                    local.append(time.perf_counter() - start)
+                with lock:
+                    latencies.extend(local)
+
+            pool = [threading.Thread(target=worker) for _ in range(threads)]
+            start = time.perf_counter()
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            repo.close()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(
+            f"{label:>16} {statistics.median(latencies) * 1e6:>9.1f} {p99 * 1e6:>9.1f} "
+            f"{len(latencies) / elapsed:>10.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=500)
+    args = parser.parse_args()
+
+    bench_recovery(args.records)
+    bench_writes(args.threads, args.writes)
+
+
+if __name__ == "__main__":
+    main()
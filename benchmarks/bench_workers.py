@@ -0,0 +1,156 @@
+"""
+Load test for the multi-worker deployment on the shared SQLite store.
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --duration 10
+
+For each worker count a real `uvicorn --workers N` server is started against a
+fresh SQLite file, driven by concurrent HTTP clients with a read/write mix, and
+then checked for consistency: every worker must report the same totals.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+API_KEY = "bench-key"
+HEADERS = {"X-API-Key": API_KEY}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(workers: int, workdir: Path, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "APP_API_KEY": API_KEY,
+        "STORAGE_BACKEND": "sqlite",
+        "DATABASE_PATH": str(workdir / "app.db"),
+        "ATTACHMENTS_DIR": str(workdir / "attachments"),
+        "WEB_CONCURRENCY": str(workers),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+async def _drive(
+    client: httpx.AsyncClient, deadline: float, write_ratio: float, seed: int
+) -> tuple[int, int]:
+    rng = random.Random(seed)
+    due_at = (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    done = errors = 0
+    while time.monotonic() < deadline:
+        if rng.random() < write_ratio:
+            response = await client.post(
+                "/assignments",
+                json={"user_id": 1, "chore_id": 1, "due_at": due_at},
+                headers=HEADERS,
+            )
+        elif rng.random() < 0.5:
+            response = await client.get("/chores/1", headers=HEADERS)
+        else:
+            response = await client.get("/stats", headers=HEADERS)
+        done += 1
+        errors += response.status_code >= 400
+    return done, errors
+
+
+async def run(workers: int, args: argparse.Namespace, workdir: Path) -> None:
+    port = _free_port()
+    server = _start_server(workers, workdir, port)
+    limits = httpx.Limits(max_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30
+        ) as client:
+            await _wait_ready(client)
+            owner = (await client.post("/users", json={"name": "o"}, headers=HEADERS)).json()
+            await client.post(
+                "/chores",
+                json={"title": "load", "cadence": "daily", "owner_id": owner["id"]},
+                headers=HEADERS,
+            )
+            deadline = time.monotonic() + args.duration
+            results = await asyncio.gather(
+                *(
+                    _drive(client, deadline, args.write_ratio, seed)
+                    for seed in range(args.concurrency)
+                )
+            )
+            # Fresh connections land on different workers; all must agree.
+            totals = set()
+            for _ in range(workers * 4):
+                async with httpx.AsyncClient(base_url=client.base_url) as probe:
+                    stats = (await probe.get("/stats", headers=HEADERS)).json()
+                totals.add(stats["assignments"]["total"])
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    requests = sum(done for done, _ in results)
+    errors = sum(err for _, err in results)
+    state = "consistent" if len(totals) == 1 else f"DIVERGED {sorted(totals)}"
+    print(
+        f"{workers:>8} {requests / args.duration:>10.0f} {errors:>8}"
+        f" {totals.pop() if len(totals) == 1 else '-':>12}  {state}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'req/s':>10} {'errors':>8} {'assignments':>12}  state")
+    for workers in (int(raw) for raw in args.workers.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            asyncio.run(run(workers, args, Path(tmp)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,64 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import hashlib
+import struct
+import time
+import zlib
 from pathlib import Path
 
-from app.files import MAX_ATTACHMENT_BYTES, PNG_MAGIC
+import pytest
+
+from app.attachment_gc import AttachmentCollector
+from app.files import (
+    MAX_ATTACHMENT_BYTES,
+    PNG_MAGIC,
+    AttachmentError,
+    AttachmentRoot,
+    AttachmentWriter,
+    shard_of,
+)
+from app.images import ImageError, ImageInfo, ImageValidator
+from app.migrate_attachments import migrate
+from app.responses import ZEROCOPY_EXTENSION, FileRangeResponse
+from app.storage import MemoryRepository
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _png(width: int = 4, height: int = 3, idat: bytes = zlib.compress(b"\x00" * 16)) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        PNG_MAGIC
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", idat)
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _jpeg(width: int = 4, height: int = 3, scan: bytes = b"\x12\xff\x00\x34") -> bytes:
+    def segment(code: int, payload: bytes) -> bytes:
+        return bytes([0xFF, code]) + struct.pack(">H", len(payload) + 2) + payload
+
+    return (
+        b"\xff\xd8"
+        + segment(0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00")
+        + segment(0xC0, struct.pack(">BHHB", 8, height, width, 1) + b"\x01\x11\x00")
+        + segment(0xDA, b"\x01\x01\x00\x00\x3f\x00")
+        + scan
+        + b"\xff\xd9"
+    )
+
+
+def _stored_path(root: Path, filename: str) -> Path:
+    return root.joinpath(*shard_of(filename), filename)
+
+
+def _stored_files(root: Path):
+    return sorted(p for p in root.rglob("*") if p.is_file())
 
 
 def _create_user(client, auth_headers):
@@ -30,7 +85,7 @@ def _create_chore(client, auth_headers, owner_id):
 def test_upload_attachment_success(client, auth_headers, attachments_root: Path):
     user = _create_user(client, auth_headers)
     chore = _create_chore(client, auth_headers, owner_id=user["id"])
-    payload = PNG_MAGIC + b"\x00" * 10
+    payload = _png()
 
     response = client.post(
         f"/chores/{chore['id']}/attachments",
@@ -41,7 +96,7 @@ def test_upload_attachment_success(client, auth_headers, attachments_root: Path)
     assert response.status_code == 201
     body = response.json()
     assert body["filename"].endswith(".png")
-    saved_file = attachments_root / body["filename"]
+    saved_file = _stored_path(attachments_root, body["filename"])
     assert saved_file.exists()
     assert saved_file.read_bytes() == payload
 
@@ -75,3 +130,395 @@ def test_upload_attachment_rejects_large_file(client, auth_headers):
     assert response.status_code == 413
     problem = response.json()
     assert problem["code"] == "attachment_too_large"
+
+
+def _chunks(data: bytes, size: int = 1024):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_stream_upload_writes_chunks(client, auth_headers, attachments_root: Path):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    payload = _jpeg(width=640, height=480, scan=bytes(range(256)) * 40)
+
+    response = client.post(
+        f"/chores/{chore['id']}/attachments/stream",
+        headers={**auth_headers, "Content-Type": "image/jpeg"},
+        content=_chunks(payload),
+    )
+
+    assert response.status_code == 201
+    body = response.json()
+    assert body["filename"].endswith(".jpg")
+    assert body["size"] == len(payload)
+    assert (body["width"], body["height"]) == (640, 480)
+    assert _stored_path(attachments_root, body["filename"]).read_bytes() == payload
+    assert [p.name for p in _stored_files(attachments_root)] == [body["filename"]]
+
+
+def test_stream_upload_rejects_type_from_first_chunk(
+    client, auth_headers, attachments_root: Path
+):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+
+    response = client.post(
+        f"/chores/{chore['id']}/attachments/stream",
+        headers=auth_headers,
+        content=_chunks(b"GIF89a" + b"\x00" * 10_000),
+    )
+
+    assert response.status_code == 415
+    assert response.json()["code"] == "attachment_type_unsupported"
+    assert _stored_files(attachments_root) == []
+
+
+def test_stream_upload_enforces_limit_while_streaming(
+    client, auth_headers, attachments_root: Path
+):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    # A well-formed start announcing one huge IDAT chunk.
+    payload = (
+        _png()[:33] + struct.pack(">I", MAX_ATTACHMENT_BYTES) + b"IDAT"
+        + b"\x00" * MAX_ATTACHMENT_BYTES
+    )
+
+    response = client.post(
+        f"/chores/{chore['id']}/attachments/stream",
+        headers=auth_headers,
+        content=_chunks(payload, 64 * 1024),
+    )
+
+    assert response.status_code == 413
+    assert response.json()["code"] == "attachment_too_large"
+    assert _stored_files(attachments_root) == []
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_identical_uploads_share_one_file(client, auth_headers, attachments_root: Path):
+    user = _create_user(client, auth_headers)
+    chores = [_create_chore(client, auth_headers, owner_id=user["id"]) for _ in range(2)]
+    payload = _png(idat=b"\x01" * 100)
+
+    filenames = {
+        client.post(
+            f"/chores/{chore['id']}/attachments/stream", headers=auth_headers, content=payload
+        ).json()["filename"]
+        for chore in chores
+    }
+
+    assert len(filenames) == 1
+    (filename,) = filenames
+    assert filename == hashlib.sha256(payload).hexdigest() + ".png"
+    storage = client.get("/stats", headers=auth_headers).json()["attachments"]
+    assert storage["bytes_saved"] == len(payload)
+    assert storage["dedup_ratio"] == 2.0
+
+    client.delete(f"/chores/{chores[0]['id']}", headers=auth_headers)
+    client.delete(f"/chores/{chores[1]['id']}", headers=auth_headers)
+    assert _wait_until(lambda: not _stored_files(attachments_root))
+
+
+def _upload(client, auth_headers, payload):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    response = client.post(
+        f"/chores/{chore['id']}/attachments/stream", headers=auth_headers, content=payload
+    )
+    assert response.status_code == 201
+    return f"/chores/{chore['id']}/attachments/{response.json()['id']}"
+
+
+def test_download_attachment_with_etag_revalidation(client, auth_headers):
+    payload = _png(idat=bytes(range(256)) * 300)
+    url = _upload(client, auth_headers, payload)
+
+    response = client.get(url, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.content == payload
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{hashlib.sha256(payload).hexdigest()}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+    cached = client.get(
+        url, headers={**auth_headers, "If-None-Match": response.headers["etag"]}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == response.headers["etag"]
+
+
+def test_download_attachment_ranges(client, auth_headers):
+    payload = _png(idat=bytes(range(256)) * 300)
+    url = _upload(client, auth_headers, payload)
+    size = len(payload)
+
+    partial = client.get(url, headers={**auth_headers, "Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == payload[100:200]
+    assert partial.headers["content-range"] == f"bytes 100-199/{size}"
+
+    suffix = client.get(url, headers={**auth_headers, "Range": "bytes=-10"})
+    assert suffix.content == payload[-10:]
+
+    stale = client.get(
+        url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": '"stale"'}
+    )
+    assert stale.status_code == 200
+    assert stale.content == payload
+
+    outside = client.get(url, headers={**auth_headers, "Range": f"bytes={size}-"})
+    assert outside.status_code == 416
+    assert outside.headers["content-range"] == f"bytes */{size}"
+
+    # last < first is an invalid range, which is ignored rather than refused.
+    inverted = client.get(url, headers={**auth_headers, "Range": "bytes=5-3"})
+    assert inverted.status_code == 200
+    assert inverted.content == payload
+
+    # So are bounds that are not plain digits.
+    for spec in ("bytes=x-5", "bytes=+1-5", "bytes=1_0-20", "bytes=-x"):
+        malformed = client.get(url, headers={**auth_headers, "Range": spec})
+        assert malformed.status_code == 200
+        assert malformed.content == payload
+
+
+def test_download_unknown_attachment_returns_404(client, auth_headers):
+    url = _upload(client, auth_headers, _png())
+
+    response = client.get(url.rsplit("/", 1)[0] + "/999", headers=auth_headers)
+
+    assert response.status_code == 404
+    assert response.json()["code"] == "attachment_not_found"
+    assert client.get(url).status_code == 401
+
+
+def test_file_response_uses_zerocopy_when_offered(tmp_path: Path):
+    path = tmp_path / "blob.bin"
+    path.write_bytes(b"0123456789")
+    file = path.open("rb")
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    response = FileRangeResponse(file, offset=2, length=5, status_code=206)
+    scope = {"type": "http", "method": "GET", "extensions": {ZEROCOPY_EXTENSION: {}}}
+    asyncio.run(response(scope, None, send))
+
+    body = messages[1]
+    assert body["type"] == ZEROCOPY_EXTENSION
+    assert (body["offset"], body["count"]) == (2, 5)
+    assert (b"content-length", b"5") in messages[0]["headers"]
+    assert file.closed
+
+
+def test_collector_skips_files_referenced_again(attachments_root: Path):
+    repo = MemoryRepository()
+    for name in ("kept.png", "released.png"):
+        (attachments_root / name).write_bytes(PNG_MAGIC)
+    repo.add_attachment(1, {"filename": "kept.png", "content_type": "image/png", "size": 8})
+    root = AttachmentRoot(attachments_root)
+    collector = AttachmentCollector(repository_factory=lambda: repo, root=root)
+
+    async def collect():
+        collector.start()
+        collector.schedule(["kept.png", "released.png"])
+        await collector.join()
+        await collector.stop()
+
+    asyncio.run(collect())
+    root.close()
+
+    assert [p.name for p in attachments_root.iterdir()] == ["kept.png"]
+
+
+@pytest.mark.parametrize("upload_links", ["before_retire", "after_retire"])
+def test_collector_keeps_file_reused_by_upload_in_flight(attachments_root: Path, upload_links):
+    repo = MemoryRepository()
+    root = AttachmentRoot(attachments_root)
+    with AttachmentWriter(root) as writer:
+        writer.write(_png())
+        meta = writer.commit()
+    record = {"filename": meta.filename, "content_type": meta.content_type, "size": meta.size}
+    repo.add_attachment(1, record)
+    # The file lost its last reference; the collector found it unreferenced
+    # and an identical upload now links it while the collector removes it.
+    assert [a["filename"] for a in repo.delete_chore(1)] == [meta.filename]
+    upload = AttachmentWriter(root)
+    upload.write(_png())
+    real_retire = root.retire
+
+    def link_upload():
+        repo.acquire_attachment_file(meta.filename, meta.size)
+        upload.commit()
+
+    def retire(name):
+        if upload_links == "before_retire":
+            link_upload()
+            return real_retire(name)
+        retired = real_retire(name)
+        link_upload()
+        return retired
+
+    root.retire = retire
+    collector = AttachmentCollector(repository_factory=lambda: repo, root=root)
+
+    async def collect():
+        collector.start()
+        collector.schedule([meta.filename])
+        await collector.join()
+        await collector.stop()
+
+    asyncio.run(collect())
+    repo.add_attachment(2, record)
+    assert not repo.release_attachment_file(meta.filename)
+
+    with root.open(meta.filename) as stored:
+        assert hashlib.sha256(stored.read()).hexdigest() == meta.sha256
+    assert [p.name for p in _stored_files(attachments_root)] == [meta.filename]
+    root.close()
+
+
+def test_download_refuses_symlinked_file(client, auth_headers, attachments_root: Path, tmp_path):
+    url = _upload(client, auth_headers, _png())
+    (stored,) = _stored_files(attachments_root)
+    secret = tmp_path / "secret.png"
+    secret.write_bytes(PNG_MAGIC + b"secret")
+    stored.unlink()
+    stored.symlink_to(secret)
+
+    response = client.get(url, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert response.json()["code"] == "attachment_symlink"
+
+
+def test_download_of_unusable_stored_path_returns_404(
+    client, auth_headers, attachments_root: Path
+):
+    url = _upload(client, auth_headers, _png())
+    (stored,) = _stored_files(attachments_root)
+    shard = stored.parent.parent
+
+    # The entry turned into a directory.
+    stored.unlink()
+    stored.mkdir()
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 404
+    assert response.json()["code"] == "attachment_not_found"
+
+    # A shard component is a regular file, so the lookup fails with ENOTDIR.
+    stored.rmdir()
+    stored.parent.rmdir()
+    shard.rmdir()
+    shard.write_bytes(b"not a directory")
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == 404
+    assert response.json()["code"] == "attachment_not_found"
+
+
+def test_attachment_root_rejects_nested_names(attachments_root: Path):
+    root = AttachmentRoot(attachments_root)
+    try:
+        for name in ("../escape.png", "..", "a/b.png"):
+            with pytest.raises(AttachmentError):
+                root.create(name)
+    finally:
+        root.close()
+    assert _stored_files(attachments_root) == []
+
+
+def test_migration_moves_flat_files_into_shards(attachments_root: Path):
+    digest = hashlib.sha256(b"flat").hexdigest()
+    names = [f"{digest}.png", "legacy-name.jpg"]
+    for name in names:
+        (attachments_root / name).write_bytes(PNG_MAGIC)
+    (attachments_root / ".upload-x.part").write_bytes(b"partial")
+    root = AttachmentRoot(attachments_root)
+    try:
+        assert root.open(names[0]).read() == PNG_MAGIC  # found before migration
+        assert sorted(root.flat_files(limit=10)) == sorted(names)
+        progress = []
+        assert migrate(root, batch=1, on_progress=progress.append) == 2
+        assert progress == [1, 2]
+        assert root.migrate(names[0]) is False  # already moved; safe to rerun
+        assert root.flat_files(limit=10) == []
+        assert _stored_path(attachments_root, names[0]).exists()
+        assert shard_of(names[0]) == (digest[:2], digest[2:4])
+        with root.open(names[1]) as moved:
+            assert moved.read() == PNG_MAGIC
+        root.unlink(names[1])
+    finally:
+        root.close()
+    assert [p.name for p in _stored_files(attachments_root)] == [".upload-x.part", names[0]]
+
+
+def test_validator_reads_dimensions_from_any_chunking():
+    for payload, expected in (
+        (_png(width=1920, height=1080), ImageInfo("image/png", 1920, 1080)),
+        (_jpeg(width=800, height=600), ImageInfo("image/jpeg", 800, 600)),
+    ):
+        for size in (1, 3, len(payload)):
+            validator = ImageValidator()
+            for piece in _chunks(payload, size):
+                validator.feed(piece)
+            assert validator.finish() == expected
+
+
+@pytest.mark.parametrize(
+    "payload, message",
+    [
+        (_png()[:-4] + b"\x00\x00\x00\x00", "bad CRC"),
+        (_png()[:40], "truncated"),
+        (_png() + b"junk", "after end"),
+        (PNG_MAGIC + _png_chunk(b"IDAT", b"x"), "IHDR"),
+        (_jpeg()[:-2], "truncated"),
+        (_jpeg(height=0), "non-zero"),
+        (b"\xff\xd8\xff\xda\x00\x08" + b"\x00" * 6 + b"\xff\xd9", "before frame"),
+    ],
+)
+def test_validator_rejects_malformed_images(payload, message):
+    validator = ImageValidator()
+    with pytest.raises(ImageError, match=message):
+        validator.feed(payload)
+        validator.finish()
+
+
+def test_validator_ignores_data_after_jpeg_end():
+    # MPF/MPO photos store further images after the first EOI.
+    payload = _jpeg(width=800, height=600) + _jpeg(width=160, height=120)
+    for size in (1, 5, len(payload)):
+        validator = ImageValidator()
+        for piece in _chunks(payload, size):
+            validator.feed(piece)
+        assert validator.finish() == ImageInfo("image/jpeg", 800, 600)
+
+
+def test_stream_upload_rejects_corrupt_chunk_early(client, auth_headers, attachments_root: Path):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    corrupt = bytearray(_png())
+    corrupt[30] ^= 0xFF  # inside the IHDR CRC
+
+    response = client.post(
+        f"/chores/{chore['id']}/attachments/stream",
+        headers=auth_headers,
+        content=_chunks(bytes(corrupt) + b"\x00" * 100_000),
+    )
+
+    assert response.status_code == 400
+    assert response.json()["code"] == "attachment_malformed"
+    assert _stored_files(attachments_root) == []
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta, timezone
 
+from app.main import get_repository
+
 
 def _create_user(client, headers, name="Alice"):
     response = client.post("/users", json={"name": name}, headers=headers)
@@ -122,3 +124,110 @@ def test_assignments_and_stats_flow(client, auth_headers):
     assert stats["assignments"]["total"] == 1
     assert stats["assignments"]["by_status"]["completed"] == 1
     assert stats["assignments"]["overdue"] == 0
+
+
+def test_due_assignments_window(client, auth_headers):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, user["id"])
+    soon = _create_assignment(
+        client, auth_headers, user["id"], chore["id"], due_at=_future_due_date(days=1)
+    )
+    _create_assignment(
+        client, auth_headers, user["id"], chore["id"], due_at=_future_due_date(days=5)
+    )
+
+    response = client.get(
+        "/assignments/due",
+        params={"from": _future_due_date(days=0), "to": _future_due_date(days=2)},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert [a["id"] for a in response.json()] == [soon["id"]]
+
+
+def test_due_assignments_pages_with_cursor(client, auth_headers):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, user["id"])
+    shared_due = _future_due_date(days=1)
+    created = [
+        _create_assignment(client, auth_headers, user["id"], chore["id"], due_at=due_at)
+        for due_at in (_future_due_date(days=2), shared_due, shared_due, shared_due)
+    ]
+    window = {"from": _future_due_date(days=0), "to": _future_due_date(days=3)}
+
+    seen = []
+    params = {**window, "limit": 2}
+    while True:
+        response = client.get("/assignments/due", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        seen.extend(a["id"] for a in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {**window, "limit": 2, "cursor": cursor}
+
+    assert seen == [a["id"] for a in created[1:]] + [created[0]["id"]]
+
+    invalid = client.get(
+        "/assignments/due", params={**window, "cursor": "not-a-cursor"}, headers=auth_headers
+    )
+    assert invalid.status_code == 400
+    assert invalid.json()["code"] == "invalid_cursor"
+
+
+def _revalidate(client, headers, path, etag):
+    return client.get(path, headers={**headers, "If-None-Match": etag})
+
+
+def test_list_etag_changes_only_when_collection_changes(client, auth_headers):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    first = client.get("/chores", headers=auth_headers)
+    etag = first.headers["ETag"]
+
+    assert etag.startswith('W/"')
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    cached = _revalidate(client, auth_headers, "/chores", etag)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+
+    # Writes to other collections leave the chores ETag alone.
+    _create_assignment(client, auth_headers, user["id"], chore["id"])
+    assert _revalidate(client, auth_headers, "/chores", etag).status_code == 304
+
+    client.put(f"/chores/{chore['id']}", json={"title": "Laundry"}, headers=auth_headers)
+    changed = _revalidate(client, auth_headers, "/chores", etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["title"] == "Laundry"
+
+
+def test_not_modified_skips_fetching_rows(client, auth_headers, monkeypatch):
+    _create_user(client, auth_headers)
+    etag = client.get("/users", headers=auth_headers).headers["ETag"]
+
+    def fail(**kwargs):
+        raise AssertionError("rows fetched for a 304")
+
+    monkeypatch.setattr(get_repository(), "list_users", fail)
+    assert _revalidate(client, auth_headers, "/users", etag).status_code == 304
+
+
+def test_chore_etag_tracks_record_version(client, auth_headers):
+    user = _create_user(client, auth_headers)
+    chore = _create_chore(client, auth_headers, owner_id=user["id"])
+    other = _create_chore(client, auth_headers, owner_id=user["id"])
+    path = f"/chores/{chore['id']}"
+    etag = client.get(path, headers=auth_headers).headers["ETag"]
+
+    assert _revalidate(client, auth_headers, path, etag).status_code == 304
+    client.put(f"/chores/{other['id']}", json={"title": "Other"}, headers=auth_headers)
+    assert _revalidate(client, auth_headers, path, etag).status_code == 304
+
+    client.put(path, json={"cadence": "weekly"}, headers=auth_headers)
+    response = _revalidate(client, auth_headers, path, etag)
+    assert response.status_code == 200
+    assert response.json()["cadence"] == "weekly"
+    assert "version" not in response.json()
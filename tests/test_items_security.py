@@ -3,6 +3,7 @@ from uuid import UUID
 from fastapi.testclient import TestClient
 
 from app import main as main_module
+from app.storage import MemoryRepository
 
 
 def _assert_problem(payload, *, status: int, code: str):
@@ -33,11 +34,15 @@ def test_create_item_rejects_wrong_api_key(client):
 
 
 def test_internal_error_is_sanitized(api_key, auth_headers, monkeypatch):
-    class BoomList(list):
-        def append(self, item):
+    class BoomRepository(MemoryRepository):
+        def create_item(self, name):
             raise RuntimeError("boom")
 
-    monkeypatch.setitem(main_module._DB, "items", BoomList())
+    monkeypatch.setitem(
+        main_module.app.dependency_overrides,
+        main_module.get_repository,
+        BoomRepository,
+    )
 
     with TestClient(main_module.app, raise_server_exceptions=False) as test_client:
         response = test_client.post(
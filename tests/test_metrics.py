@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import re
+
+import pytest
+
+from app.metrics import Exposition, MetricsMiddleware, RequestMetrics
+
+
+def _samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def _scrape(client, auth_headers):
+    response = client.get("/metrics", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return _samples(response.text)
+
+
+def test_metrics_requires_api_key(client):
+    assert client.get("/metrics").status_code == 401
+
+
+def test_metrics_count_requests_by_route_template(client, auth_headers):
+    before = _scrape(client, auth_headers)
+    user = client.post("/users", json={"name": "Metrics"}, headers=auth_headers).json()
+    client.post(
+        "/chores",
+        json={"title": "Dust", "cadence": "weekly", "owner_id": user["id"]},
+        headers=auth_headers,
+    )
+    client.get("/chores/1", headers=auth_headers)
+    client.get("/chores/999", headers=auth_headers)
+    client.get("/no/such/path", headers=auth_headers)
+    after = _scrape(client, auth_headers)
+
+    def delta(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    get_chore = 'http_requests_total{method="GET",route="/chores/{chore_id}",status="%s"}'
+    assert delta(get_chore % "2xx") == 1
+    assert delta(get_chore % "4xx") == 1
+    assert delta('http_requests_total{method="GET",route="unmatched",status="4xx"}') == 1
+    histogram = 'http_request_duration_seconds_%s{method="GET",route="/chores/{chore_id}"}'
+    assert delta(histogram % "count") == 2
+    assert delta(histogram % "sum") > 0
+    assert (
+        delta(
+            'http_request_duration_seconds_bucket'
+            '{method="GET",route="/chores/{chore_id}",le="+Inf"}'
+        )
+        == 2
+    )
+    # The scrape itself is in flight while it renders.
+    assert after["http_requests_in_flight"] == 1
+    assert after['store_records{collection="users"}'] == 1
+    assert after['store_records{collection="chores"}'] == 1
+    assert after['store_records{collection="assignments"}'] == 0
+    assert after["attachment_stored_bytes"] == 0
+    assert after['notification_circuit_state{state="closed"}'] == 1
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = RequestMetrics(buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        metrics.observe("GET", "/x", 200, seconds)
+    metrics.observe("BREW", "/x", 418, 0.2)
+    out = Exposition()
+    metrics.write(out)
+    text = out.render()
+
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    samples = _samples(text)
+    assert samples['http_request_duration_seconds_bucket{method="GET",route="/x",le="0.1"}'] == 2
+    assert samples['http_request_duration_seconds_bucket{method="GET",route="/x",le="1.0"}'] == 3
+    assert samples['http_request_duration_seconds_bucket{method="GET",route="/x",le="+Inf"}'] == 4
+    assert samples['http_request_duration_seconds_count{method="GET",route="/x"}'] == 4
+    assert samples['http_request_duration_seconds_sum{method="GET",route="/x"}'] == 3.65
+    assert samples['http_requests_total{method="OTHER",route="/x",status="4xx"}'] == 1
+
+
+def test_exposition_escapes_label_values():
+    out = Exposition()
+    out.family("things", "gauge", "Things.", [("", {"name": 'a"b\\c\nd'}, 1)])
+    assert 'things{name="a\\"b\\\\c\\nd"} 1' in out.render()
+
+
+def test_middleware_counts_unhandled_errors_as_500():
+    metrics = RequestMetrics()
+
+    async def broken(scope, receive, send):
+        assert metrics.in_flight == 1
+        raise RuntimeError("boom")
+
+    middleware = MetricsMiddleware(broken, metrics)
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    with pytest.raises(RuntimeError):
+        asyncio.run(middleware(scope, None, None))
+
+    assert metrics.in_flight == 0
+    assert metrics.requests == {("GET", "unmatched", "5xx"): 1}
+
+
+def test_scrape_output_is_well_formed(client, auth_headers):
+    client.get("/health")
+    text = client.get("/metrics", headers=auth_headers).text
+    sample = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)+\})? -?[0-9.e+-]+|\+Inf$')
+    for line in text.splitlines():
+        assert line.startswith(("# HELP ", "# TYPE ")) or sample.match(line), line
@@ -1,12 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import time
 from datetime import datetime, timedelta, timezone
 
 import httpx
+import pytest
 
 from app.config import get_settings, reload_settings
-from app.notifications import NotificationClient, build_notification_client
+from app.notifications import (
+    CircuitBreaker,
+    NotificationClient,
+    NotificationError,
+    RetryBudget,
+)
 
 
 def _create_user(client, auth_headers, name):
@@ -67,6 +75,17 @@ def test_notify_rejects_host_not_in_allowlist(
     assert problem["code"] == "notification_host_blocked"
 
 
+def _wait_for_notification(client, auth_headers, notification_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(f"/notifications/{notification_id}", headers=auth_headers)
+        assert response.status_code == 200
+        body = response.json()
+        if body["status"] == status or time.monotonic() > deadline:
+            return body
+        time.sleep(0.02)
+
+
 def test_notify_succeeds_with_allowed_host(
     client, auth_headers, monkeypatch
 ):
@@ -77,38 +96,377 @@ def test_notify_succeeds_with_allowed_host(
     monkeypatch.setenv("NOTIFY_ALLOWED_HOSTS", "hooks.example.com")
     monkeypatch.setenv("NOTIFY_TOKEN", "notif-secret")
     reload_settings()
+    received = []
 
     def handler(request: httpx.Request) -> httpx.Response:
         assert request.headers["Authorization"] == "Bearer notif-secret"
         body = json.loads(request.content.decode())
         assert "assignment_id" in body
+        received.append(body)
         return httpx.Response(200, json={"ok": True})
 
     transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        client.app.state.outbox,
+        "client_factory",
+        lambda: NotificationClient(settings=get_settings(), transport=transport),
+    )
 
-    def override_notification_client():
-        return NotificationClient(
-            settings=get_settings(),
-            transport=transport,
-        )
+    owner = _create_user(client, auth_headers, name="Owner")
+    roommate = _create_user(client, auth_headers, name="Roommate")
+    chore = _create_chore(client, auth_headers, owner_id=owner["id"])
+    assignment = _create_assignment(
+        client, auth_headers, user_id=roommate["id"], chore_id=chore["id"]
+    )
+
+    response = client.post(
+        f"/assignments/{assignment['id']}/notify", headers=auth_headers
+    )
 
-    client.app.dependency_overrides[build_notification_client] = (
-        override_notification_client
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "queued"
+    notification = _wait_for_notification(
+        client, auth_headers, body["notification_id"], "delivered"
     )
+    assert notification["status"] == "delivered"
+    assert notification["attempts"] == 1
+    assert [item["assignment_id"] for item in received] == [assignment["id"]]
 
-    try:
-        owner = _create_user(client, auth_headers, name="Owner")
-        roommate = _create_user(client, auth_headers, name="Roommate")
-        chore = _create_chore(client, auth_headers, owner_id=owner["id"])
-        assignment = _create_assignment(
-            client, auth_headers, user_id=roommate["id"], chore_id=chore["id"]
-        )
 
+def _configure_webhook(monkeypatch):
+    monkeypatch.setenv("NOTIFY_WEBHOOK_URL", "https://hooks.example.com/webhook")
+    monkeypatch.setenv("NOTIFY_ALLOWED_HOSTS", "hooks.example.com")
+    reload_settings()
+
+
+def test_notify_reuses_lifespan_connection_pool(client, auth_headers, monkeypatch):
+    _configure_webhook(monkeypatch)
+    pool = client.app.state.notification_http
+    assert isinstance(pool, httpx.AsyncClient)
+    calls = []
+
+    async def fake_post(url, **kwargs):
+        calls.append(url)
+        return httpx.Response(200, request=httpx.Request("POST", url))
+
+    monkeypatch.setattr(pool, "post", fake_post)
+    owner = _create_user(client, auth_headers, name="Owner")
+    chore = _create_chore(client, auth_headers, owner_id=owner["id"])
+    assignment = _create_assignment(
+        client, auth_headers, user_id=owner["id"], chore_id=chore["id"]
+    )
+
+    for _ in range(2):
         response = client.post(
             f"/assignments/{assignment['id']}/notify", headers=auth_headers
         )
-
         assert response.status_code == 200
-        assert response.json() == {"status": "queued"}
-    finally:
-        client.app.dependency_overrides.pop(build_notification_client, None)
+        notification_id = response.json()["notification_id"]
+        _wait_for_notification(client, auth_headers, notification_id, "delivered")
+
+    assert calls == ["https://hooks.example.com/webhook"] * 2
+
+
+def test_send_retries_with_async_backoff(monkeypatch, api_key):
+    _configure_webhook(monkeypatch)
+    attempts = []
+    sleeps = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(204)
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    notifier = NotificationClient(
+        settings=get_settings(),
+        backoff_seconds=0.5,
+        transport=httpx.MockTransport(handler),
+    )
+
+    response = asyncio.run(notifier.send({"assignment_id": 1}))
+
+    assert response.status_code == 204
+    assert len(attempts) == 2
+    assert sleeps == [0.5]
+
+
+def _capture_deliveries(client, monkeypatch):
+    delivered = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        delivered.append(json.loads(request.content.decode())["assignment_id"])
+        return httpx.Response(200)
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        client.app.state.outbox,
+        "client_factory",
+        lambda: NotificationClient(settings=get_settings(), transport=transport),
+    )
+    return delivered
+
+
+def test_bulk_notify_by_ids_reports_each_assignment(client, auth_headers, monkeypatch):
+    _configure_webhook(monkeypatch)
+    delivered = _capture_deliveries(client, monkeypatch)
+    owner = _create_user(client, auth_headers, name="Owner")
+    chore = _create_chore(client, auth_headers, owner_id=owner["id"])
+    first, second = (
+        _create_assignment(client, auth_headers, user_id=owner["id"], chore_id=chore["id"])
+        for _ in range(2)
+    )
+
+    response = client.post(
+        "/assignments/notify",
+        json={"assignment_ids": [second["id"], 999, first["id"]]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["queued"] == 2
+    assert [(r["assignment_id"], r["status"]) for r in body["results"]] == [
+        (second["id"], "queued"),
+        (999, "not_found"),
+        (first["id"], "queued"),
+    ]
+    last = body["results"][-1]["notification_id"]
+    _wait_for_notification(client, auth_headers, last, "delivered")
+    _wait_for_notification(client, auth_headers, body["results"][0]["notification_id"], "delivered")
+    assert sorted(delivered) == sorted([first["id"], second["id"]])
+
+
+def test_bulk_notify_by_due_window(client, auth_headers, monkeypatch):
+    _configure_webhook(monkeypatch)
+    _capture_deliveries(client, monkeypatch)
+    owner = _create_user(client, auth_headers, name="Owner")
+    chore = _create_chore(client, auth_headers, owner_id=owner["id"])
+    due_soon = _create_assignment(
+        client, auth_headers, user_id=owner["id"], chore_id=chore["id"]
+    )
+    later = client.post(
+        "/assignments",
+        json={
+            "user_id": owner["id"],
+            "chore_id": chore["id"],
+            "due_at": (datetime.now(timezone.utc) + timedelta(days=5)).isoformat(),
+        },
+        headers=auth_headers,
+    ).json()
+    assert later["id"] != due_soon["id"]
+    now = datetime.now(timezone.utc)
+
+    response = client.post(
+        "/assignments/notify",
+        json={
+            "status": "pending",
+            "due_from": now.isoformat(),
+            "due_to": (now + timedelta(hours=48)).isoformat(),
+        },
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert [r["assignment_id"] for r in response.json()["results"]] == [due_soon["id"]]
+
+
+def test_bulk_notify_requires_single_selection(client, auth_headers):
+    response = client.post(
+        "/assignments/notify",
+        json={"assignment_ids": [1], "status": "pending"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 422
+    assert response.json()["code"] == "validation_error"
+
+
+def test_bulk_notify_rejects_completed_status_with_due_window(client, auth_headers):
+    now = datetime.now(timezone.utc)
+    response = client.post(
+        "/assignments/notify",
+        json={
+            "status": "completed",
+            "due_from": now.isoformat(),
+            "due_to": (now + timedelta(hours=48)).isoformat(),
+        },
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 422
+    assert response.json()["code"] == "validation_error"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_transitions():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10.0
+
+    clock.now = 10.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.snapshot() == {
+        "state": "closed",
+        "consecutive_failures": 0,
+        "calls": 3,
+        "successes": 1,
+        "failures": 3,
+        "rejected": 2,
+        "opened": 2,
+    }
+
+
+def test_open_circuit_fails_fast(monkeypatch, api_key):
+    _configure_webhook(monkeypatch)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(503)
+
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0)
+    notifier = NotificationClient(
+        settings=get_settings(), transport=httpx.MockTransport(handler), breaker=breaker
+    )
+
+    for _ in range(2):
+        with pytest.raises(NotificationError) as failed:
+            asyncio.run(notifier.send({"assignment_id": 1}))
+        assert failed.value.code == "notification_bad_status"
+    with pytest.raises(NotificationError) as rejected:
+        asyncio.run(notifier.send({"assignment_id": 1}))
+
+    assert rejected.value.code == "notification_circuit_open"
+    assert rejected.value.status == 503
+    assert len(calls) == 2
+
+
+def test_retry_budget_limits_retries(monkeypatch, api_key):
+    _configure_webhook(monkeypatch)
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(request)
+        raise httpx.ConnectError("refused", request=request)
+
+    async def fake_sleep(delay):
+        return None
+
+    monkeypatch.setattr(asyncio, "sleep", fake_sleep)
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, max_tokens=1.0)
+    notifier = NotificationClient(
+        settings=get_settings(),
+        max_attempts=5,
+        transport=httpx.MockTransport(handler),
+        breaker=CircuitBreaker(failure_threshold=100),
+        retry_budget=budget,
+    )
+
+    for _ in range(2):
+        with pytest.raises(NotificationError) as failed:
+            asyncio.run(notifier.send({"assignment_id": 1}))
+        assert failed.value.code == "notification_failed"
+
+    # One retry from the initial token, then one per two first attempts.
+    assert len(attempts) == 3
+    assert budget.snapshot() == {"tokens": 0.5, "requests": 2, "retries": 1, "denied": 2}
+
+
+def test_redelivery_does_not_count_as_request(monkeypatch, api_key):
+    _configure_webhook(monkeypatch)
+    budget = RetryBudget()
+    notifier = NotificationClient(
+        settings=get_settings(),
+        max_attempts=1,
+        transport=httpx.MockTransport(lambda request: httpx.Response(204)),
+        retry_budget=budget,
+    )
+
+    asyncio.run(notifier.send({"assignment_id": 1}, retry=True))
+
+    # The caller spent the retry token; no first-attempt deposit is made.
+    assert budget.snapshot()["requests"] == 0
+
+
+def test_notification_stats_expose_breaker(client, auth_headers):
+    client.app.state.notification_breaker.record_failure()
+
+    response = client.get("/stats/notifications", headers=auth_headers)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["circuit"]["state"] == "closed"
+    assert body["circuit"]["failures"] == 1
+    assert body["retry_budget"]["denied"] == 0
+    assert client.get("/stats/notifications").status_code == 401
+
+
+def test_send_counts_attempt_outcomes(monkeypatch, api_key):
+    _configure_webhook(monkeypatch)
+    # None stands for a connection failure.
+    replies = iter([None, 400, 200, None, 503])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = next(replies)
+        if status is None:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(status)
+
+    notifier = NotificationClient(
+        settings=get_settings(),
+        max_attempts=2,
+        backoff_seconds=0,
+        transport=httpx.MockTransport(handler),
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0),
+        retry_budget=RetryBudget(max_tokens=1.0, min_per_second=0.0),
+    )
+
+    async def deliver_all():
+        # Connection error, then the retry gets a 400.
+        with pytest.raises(NotificationError, match="400"):
+            await notifier.send({"assignment_id": 1})
+        await notifier.send({"assignment_id": 2})
+        # Connection error (its retry finds the budget spent by the first
+        # call) and a 503 in a row open the circuit for the last call.
+        for assignment_id in (3, 4, 5):
+            with pytest.raises(NotificationError):
+                await notifier.send({"assignment_id": assignment_id})
+
+    asyncio.run(deliver_all())
+
+    assert notifier.outcomes.snapshot() == {
+        "success": 1,
+        "rejected": 1,
+        "server_error": 1,
+        "transport_error": 2,
+        "circuit_open": 1,
+        "budget_exhausted": 1,
+    }
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.notifications import CircuitBreaker, DeliveryOutcomes, NotificationError, RetryBudget
+from app.outbox import RETRY_BUDGET_EXHAUSTED, OutboxDispatcher
+from app.storage import MemoryRepository, SQLiteRepository
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repo(request, tmp_path):
+    repository = (
+        MemoryRepository() if request.param == "memory" else SQLiteRepository(tmp_path / "o.db")
+    )
+    yield repository
+    repository.close()
+
+
+class FlakyClient:
+    def __init__(self, failures: int, retry_budget=None):
+        self.failures = failures
+        self.sent = []
+        self.retry_budget = retry_budget or RetryBudget()
+        self.outcomes = DeliveryOutcomes()
+
+    async def send(self, payload, *, retry=False):
+        self.sent.append((payload, retry))
+        if len(self.sent) <= self.failures:
+            raise NotificationError(code="notification_failed", detail="down", status=504)
+
+
+class OpenCircuitClient:
+    breaker = CircuitBreaker(reset_timeout=30.0)
+    retry_budget = RetryBudget()
+
+    async def send(self, payload, *, retry=False):
+        raise NotificationError(code="notification_circuit_open", detail="open", status=503)
+
+
+def _dispatcher(repo, client, **overrides):
+    options = {"backoff_seconds": 0.0, "max_attempts": 3}
+    options.update(overrides)
+    return OutboxDispatcher(
+        repository_factory=lambda: repo,
+        client_factory=lambda: client,
+        **options,
+    )
+
+
+def test_outbox_retries_then_delivers(repo):
+    client = FlakyClient(failures=2)
+    dispatcher = _dispatcher(repo, client)
+    queued = repo.enqueue_notification(7, {"assignment_id": 7}, datetime.now(timezone.utc))
+
+    for _ in range(3):
+        assert asyncio.run(dispatcher.run_once()) == 1
+
+    notification = repo.get_notification(queued["id"])
+    assert notification["status"] == "delivered"
+    assert notification["attempts"] == 3
+    assert notification["last_error"] is None
+    assert asyncio.run(dispatcher.run_once()) == 0
+
+
+def test_outbox_dead_letters_after_max_attempts(repo):
+    dispatcher = _dispatcher(repo, FlakyClient(failures=10))
+    queued = repo.enqueue_notification(7, {"assignment_id": 7}, datetime.now(timezone.utc))
+
+    for _ in range(5):
+        asyncio.run(dispatcher.run_once())
+
+    notification = repo.get_notification(queued["id"])
+    assert notification["status"] == "dead"
+    assert notification["attempts"] == 3
+    assert notification["last_error"] == "notification_failed: down"
+    assert notification["next_attempt_at"] is None
+
+
+def test_outbox_defers_open_circuit_without_spending_attempts(repo):
+    dispatcher = _dispatcher(repo, OpenCircuitClient(), max_attempts=1)
+    queued = repo.enqueue_notification(7, {"assignment_id": 7}, datetime.now(timezone.utc))
+
+    assert asyncio.run(dispatcher.run_once()) == 1
+
+    notification = repo.get_notification(queued["id"])
+    assert notification["status"] == "queued"
+    assert notification["attempts"] == 0
+    assert notification["last_error"] == "notification_circuit_open: open"
+    assert notification["next_attempt_at"] > datetime.now(timezone.utc)
+    assert asyncio.run(dispatcher.run_once()) == 0
+
+
+def test_claimed_notification_is_reclaimed_after_lease(repo):
+    now = datetime.now(timezone.utc)
+    queued = repo.enqueue_notification(1, {"assignment_id": 1}, now)
+    lease_until = now + timedelta(seconds=30)
+
+    assert [n["id"] for n in repo.claim_notifications(now, lease_until, 10)] == [queued["id"]]
+    assert repo.claim_notifications(now + timedelta(seconds=10), lease_until, 10) == []
+
+    reclaimed = repo.claim_notifications(lease_until, lease_until + timedelta(seconds=30), 10)
+    assert [n["attempts"] for n in reclaimed] == [2]
+
+
+def test_retry_delay_is_capped():
+    dispatcher = OutboxDispatcher(
+        repository_factory=MemoryRepository,
+        client_factory=lambda: None,
+        backoff_seconds=1.0,
+        max_backoff_seconds=10.0,
+    )
+
+    assert [dispatcher.retry_delay(n) for n in (1, 2, 3, 4, 5)] == [1.0, 2.0, 4.0, 8.0, 10.0]
+
+
+def test_claims_cover_worker_share_of_concurrency(repo):
+    dispatcher = _dispatcher(repo, FlakyClient(failures=0), workers=2, concurrency=50)
+    now = datetime.now(timezone.utc)
+    repo.enqueue_notifications([(i, {"assignment_id": i}) for i in range(30)], now)
+
+    # batch_size (10) alone would keep 2 workers at 20 calls in flight.
+    assert asyncio.run(dispatcher.run_once()) == 25
+
+
+def test_outbox_retries_spend_retry_budget(repo):
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0)
+    client = FlakyClient(failures=10, retry_budget=budget)
+    dispatcher = _dispatcher(repo, client, max_attempts=5)
+    queued = repo.enqueue_notification(7, {"assignment_id": 7}, datetime.now(timezone.utc))
+
+    for _ in range(3):
+        assert asyncio.run(dispatcher.run_once()) == 1
+
+    # The second attempt took the only token; the third is deferred unsent.
+    assert [retry for _, retry in client.sent] == [False, True]
+    assert budget.snapshot() == {"tokens": 0.0, "requests": 0, "retries": 1, "denied": 1}
+    assert client.outcomes.snapshot()["budget_exhausted"] == 1
+    notification = repo.get_notification(queued["id"])
+    assert notification["status"] == "queued"
+    assert notification["attempts"] == 2
+    assert notification["last_error"] == RETRY_BUDGET_EXHAUSTED
+    assert notification["next_attempt_at"] > datetime.now(timezone.utc)
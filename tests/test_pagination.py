@@ -0,0 +1,99 @@
+import json
+
+from app.main import (
+    AssignmentRead,
+    AssignmentRow,
+    ChoreRead,
+    ChoreRow,
+    UserRead,
+    UserRow,
+    get_repository,
+)
+
+
+def _create_users(client, headers, count):
+    return [
+        client.post("/users", json={"name": f"User {i}"}, headers=headers).json()
+        for i in range(count)
+    ]
+
+
+def test_cursor_pagination_walks_all_rows(client, auth_headers):
+    users = _create_users(client, auth_headers, 5)
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/users", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {"limit": 2, "cursor": cursor}
+
+    assert seen == users
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers):
+    response = client.get(
+        "/chores", params={"limit": 2, "cursor": "not-a-cursor"}, headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert response.json()["code"] == "invalid_cursor"
+
+
+def test_ndjson_stream_returns_rows_after_cursor(client, auth_headers):
+    users = _create_users(client, auth_headers, 3)
+    first_page = client.get("/users", params={"limit": 1}, headers=auth_headers)
+
+    response = client.get(
+        "/users",
+        params={"cursor": first_page.headers["X-Next-Cursor"]},
+        headers={**auth_headers, "Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == users[1:]
+
+
+def test_row_types_match_read_models():
+    for row_type, model in (
+        (UserRow, UserRead),
+        (ChoreRow, ChoreRead),
+        (AssignmentRow, AssignmentRead),
+    ):
+        assert set(row_type.__annotations__) == set(model.model_fields)
+
+
+def test_fast_serializer_matches_response_models(client, auth_headers):
+    user = _create_users(client, auth_headers, 1)[0]
+    chore = client.post(
+        "/chores",
+        json={"title": "Düsche", "cadence": "weekly", "owner_id": user["id"]},
+        headers=auth_headers,
+    ).json()
+    client.post(
+        "/assignments",
+        json={
+            "user_id": user["id"],
+            "chore_id": chore["id"],
+            "due_at": "2030-01-01T10:00:00+03:00",
+        },
+        headers=auth_headers,
+    )
+    repo = get_repository()
+
+    for path, model, rows in (
+        ("/users", UserRead, repo.list_users()),
+        ("/chores", ChoreRead, repo.list_chores()),
+        ("/assignments", AssignmentRead, repo.list_assignments()),
+    ):
+        expected = [model.model_validate(row).model_dump(mode="json") for row in rows]
+        response = client.get(path, headers=auth_headers)
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == expected
+    assert response.json()[0]["due_at"] == "2030-01-01T07:00:00Z"
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import get_settings, reload_settings
+from app.main import app, get_repository
+from app.profiling import ProfileSession, StackSampler, profiling_middleware
+
+PROFILE_TOKEN = "profile-secret"
+
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch, api_key):
+    directory = tmp_path / "profiles"
+    monkeypatch.setenv("PROFILE_ENABLED", "1")
+    monkeypatch.setenv("PROFILE_TOKEN", PROFILE_TOKEN)
+    monkeypatch.setenv("PROFILE_DIR", str(directory))
+    reload_settings()
+    # The profiler is chosen when the middleware stack is built; rebuild it.
+    monkeypatch.setattr(app, "middleware_stack", None)
+    yield directory
+    reload_settings()
+
+
+@pytest.fixture
+def profiled_client(profile_dir):
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _wait_for_profile(directory, correlation_id, timeout=5.0):
+    path = directory / f"{correlation_id}.folded"
+    deadline = time.monotonic() + timeout
+    while not path.exists():
+        assert time.monotonic() < deadline, f"{path.name} was not written"
+        time.sleep(0.01)
+    return path.read_text()
+
+
+def test_profiling_disabled_installs_nothing(api_key):
+    inner = object()
+    assert profiling_middleware(inner, app.routes, get_settings()) is inner
+
+
+def test_token_header_profiles_sync_endpoint(
+    profiled_client, profile_dir, auth_headers, monkeypatch
+):
+    repo = get_repository()
+
+    def slow_count_users():
+        time.sleep(0.05)
+        return 0
+
+    monkeypatch.setattr(repo, "count_users", slow_count_users)
+    response = profiled_client.get(
+        "/stats", headers={**auth_headers, "X-Profile-Token": PROFILE_TOKEN}
+    )
+
+    assert response.status_code == 200
+    correlation_id = response.headers["X-Correlation-ID"]
+    folded = _wait_for_profile(profile_dir, correlation_id)
+    stacks = [line.rsplit(" ", 1) for line in folded.splitlines()]
+    assert stacks
+    assert all(stack.startswith("GET /stats;") and int(count) > 0 for stack, count in stacks)
+    # The endpoint ran in a threadpool worker, which was sampled as well.
+    assert any(
+        "app.main:get_stats;test_profiling:test_token_header_profiles_sync_endpoint."
+        "<locals>.slow_count_users" in stack
+        for stack, _ in stacks
+    )
+
+
+def test_requests_without_valid_token_are_not_profiled(
+    profiled_client, profile_dir, auth_headers
+):
+    plain = profiled_client.get("/stats", headers=auth_headers)
+    wrong = profiled_client.get("/stats", headers={**auth_headers, "X-Profile-Token": "guess"})
+
+    assert "X-Correlation-ID" not in plain.headers
+    assert "X-Correlation-ID" not in wrong.headers
+    assert not profile_dir.exists() or not list(profile_dir.iterdir())
+
+
+def test_problem_reuses_profile_correlation_id(profiled_client, profile_dir, auth_headers):
+    response = profiled_client.get(
+        "/chores/999", headers={**auth_headers, "X-Profile-Token": PROFILE_TOKEN}
+    )
+
+    assert response.status_code == 404
+    correlation_id = response.headers["X-Correlation-ID"]
+    assert response.json()["correlation_id"] == correlation_id
+    _wait_for_profile(profile_dir, correlation_id)
+
+
+def test_sampler_keeps_newest_profiles(tmp_path):
+    directory = tmp_path / "profiles"
+    directory.mkdir()
+    sampler = StackSampler(directory, interval=0.001, max_files=2)
+    for number in range(3):
+        session = ProfileSession(f"request-{number}")
+        session.root = "GET /stats"
+        session.stacks[("app.main:get_stats",)] = number + 1
+        sampler._write(session)
+        os.utime(directory / f"request-{number}.folded", (number, number))
+
+    assert sorted(p.name for p in directory.iterdir()) == ["request-1.folded", "request-2.folded"]
+    assert (directory / "request-2.folded").read_text() == "GET /stats;app.main:get_stats 3\n"
@@ -0,0 +1,643 @@
+from __future__ import annotations
+
+import bisect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from app.config import get_settings, reload_settings
+from app.main import reset_app_state
+from app.storage import (
+    DurableMemoryRepository,
+    MemoryRepository,
+    SQLiteRepository,
+    _SortedList,
+)
+
+
+@pytest.fixture(params=["memory", "durable", "sqlite"])
+def repo(request, tmp_path):
+    if request.param == "memory":
+        repository = MemoryRepository()
+    elif request.param == "durable":
+        repository = DurableMemoryRepository(tmp_path / "wal", snapshot_every=50)
+    else:
+        repository = SQLiteRepository(tmp_path / "app.db")
+    yield repository
+    repository.close()
+
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("DATABASE_PATH", str(tmp_path / "api.db"))
+    reload_settings()
+    reset_app_state()
+    yield tmp_path / "api.db"
+    reset_app_state()
+
+
+def _seed(repo):
+    user = repo.create_user("Alice")
+    chore = repo.create_chore(
+        {
+            "title": "Dishes",
+            "cadence": "daily",
+            "description": None,
+            "owner_id": user["id"],
+        }
+    )
+    return user, chore
+
+
+def test_repository_assignment_lifecycle(repo):
+    user, chore = _seed(repo)
+    now = datetime.now(timezone.utc)
+    past = repo.create_assignment(
+        {
+            "user_id": user["id"],
+            "chore_id": chore["id"],
+            "due_at": now - timedelta(hours=1),
+            "status": "pending",
+        }
+    )
+    repo.create_assignment(
+        {
+            "user_id": user["id"],
+            "chore_id": chore["id"],
+            "due_at": now + timedelta(hours=1),
+            "status": "pending",
+        }
+    )
+
+    assert repo.get_assignment(past["id"])["due_at"] == past["due_at"]
+    assert repo.count_overdue(now) == 1
+
+    updated = repo.update_assignment(past["id"], {"status": "completed"})
+    assert updated["status"] == "completed"
+    assert repo.count_overdue(now) == 0
+    assert repo.count_assignments_by_status() == {"pending": 1, "completed": 1}
+    assert [a["id"] for a in repo.list_assignments("completed")] == [past["id"]]
+    assert repo.update_assignment(999, {"status": "skipped"}) is None
+
+
+def test_repository_delete_chore_cascades(repo):
+    user, chore = _seed(repo)
+    repo.create_assignment(
+        {
+            "user_id": user["id"],
+            "chore_id": chore["id"],
+            "due_at": datetime.now(timezone.utc),
+            "status": "pending",
+        }
+    )
+    attachment = repo.add_attachment(
+        chore["id"], {"filename": "a.png", "content_type": "image/png", "size": 3}
+    )
+
+    removed = repo.delete_chore(chore["id"])
+
+    assert removed == [attachment]
+    assert repo.get_chore(chore["id"]) is None
+    assert repo.list_assignments() == []
+    assert repo.list_attachments(chore["id"]) == []
+    assert repo.count_chores() == 0
+
+
+def test_sqlite_repository_persists_across_reopen(tmp_path):
+    path = tmp_path / "app.db"
+    repo = SQLiteRepository(path)
+    user, chore = _seed(repo)
+    repo.update_chore(chore["id"], {"title": "Laundry"})
+    repo.close()
+
+    reopened = SQLiteRepository(path)
+    try:
+        assert reopened.get_user(user["id"]) == user
+        assert reopened.get_chore(chore["id"])["title"] == "Laundry"
+        assert reopened.create_user("Bob")["id"] == user["id"] + 1
+    finally:
+        reopened.close()
+
+
+def _durable_state(repo):
+    return (
+        repo.list_users(),
+        repo.list_chores(),
+        repo.list_assignments(),
+        repo.count_assignments_by_status(),
+        repo.list_assignments("pending", user_id=1),
+        repo.count_overdue(datetime.now(timezone.utc)),
+        repo.list_attachments(1),
+        repo.attachment_storage_stats(),
+        repo.get_item(1),
+    )
+
+
+def _fill_durable(repo):
+    user, chore = _seed(repo)
+    spare = repo.create_chore(
+        {"title": "Trash", "cadence": "weekly", "description": None, "owner_id": user["id"]}
+    )
+    now = datetime.now(timezone.utc)
+    for i in range(30):
+        assignment = repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": [chore["id"], spare["id"]][i % 2],
+                "due_at": now + timedelta(hours=i - 10),
+                "status": "pending",
+            }
+        )
+        if i % 3 == 0:
+            repo.update_assignment(assignment["id"], {"status": "completed"})
+    repo.add_attachment(chore["id"], {"filename": "a.png", "content_type": "image/png", "size": 3})
+    repo.update_chore(chore["id"], {"title": "Laundry"})
+    repo.delete_chore(spare["id"])
+    repo.create_item("Broom")
+
+
+@pytest.mark.parametrize("snapshot_every", [1_000, 7])
+def test_durable_memory_repository_recovers_after_crash(tmp_path, snapshot_every):
+    repo = DurableMemoryRepository(tmp_path, snapshot_every=snapshot_every)
+    _fill_durable(repo)
+    if repo._snapshot_thread is not None:
+        repo._snapshot_thread.join()
+    expected = _durable_state(repo)
+    # Simulate a crash: the log is flushed but no final snapshot is written.
+    repo._wal.close()
+
+    reopened = DurableMemoryRepository(tmp_path, snapshot_every=snapshot_every)
+    try:
+        assert _durable_state(reopened) == expected
+        assert reopened.create_user("Bob")["id"] == 2
+    finally:
+        reopened.close()
+
+
+def test_durable_memory_repository_snapshot_replaces_log(tmp_path):
+    repo = DurableMemoryRepository(tmp_path)
+    _fill_durable(repo)
+    expected = _durable_state(repo)
+    repo.close()
+
+    segments = list(tmp_path.glob("wal-*.log"))
+    assert len(segments) == 1
+    assert segments[0].stat().st_size == 0
+    reopened = DurableMemoryRepository(tmp_path)
+    try:
+        assert _durable_state(reopened) == expected
+    finally:
+        reopened.close()
+
+
+def test_durable_memory_repository_drops_torn_tail(tmp_path):
+    repo = DurableMemoryRepository(tmp_path)
+    user, chore = _seed(repo)
+    repo._wal.close()
+    (segment,) = tmp_path.glob("wal-*.log")
+    size = segment.stat().st_size
+    with open(segment, "ab") as file:
+        file.write(b"\x00\x00\x01\x00\xde\xad")
+
+    reopened = DurableMemoryRepository(tmp_path)
+    try:
+        assert segment.stat().st_size == size
+        assert reopened.get_chore(chore["id"]) == chore
+        assert reopened.create_user("Bob")["id"] == user["id"] + 1
+    finally:
+        reopened.close()
+
+
+def test_durable_memory_repository_group_commits(tmp_path, monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        fsyncs.append(fd)
+        time.sleep(0.005)
+        real_fsync(fd)
+
+    repo = DurableMemoryRepository(tmp_path)
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+
+    def worker():
+        for _ in range(10):
+            repo.create_user("Alice")
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert repo.count_users() == 80
+    # Writers waiting on an in-flight fsync are covered by the next one.
+    assert len(fsyncs) < 80
+    repo.close()
+
+
+def test_memory_wal_dir_survives_app_restart(tmp_path, monkeypatch, client, auth_headers):
+    monkeypatch.setenv("MEMORY_WAL_DIR", str(tmp_path / "wal"))
+    reload_settings()
+    reset_app_state()
+    created = client.post("/users", json={"name": "Alice"}, headers=auth_headers).json()
+    reset_app_state()
+
+    response = client.get("/users", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json() == [created]
+
+
+def test_api_flow_with_sqlite_backend(sqlite_backend, client, auth_headers):
+    owner = client.post("/users", json={"name": "Dana"}, headers=auth_headers).json()
+    chore = client.post(
+        "/chores",
+        json={"title": "Mop", "cadence": "weekly", "owner_id": owner["id"]},
+        headers=auth_headers,
+    ).json()
+    due_at = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+    response = client.post(
+        "/assignments",
+        json={"user_id": owner["id"], "chore_id": chore["id"], "due_at": due_at},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+
+    stats = client.get("/stats", headers=auth_headers).json()
+    assert stats["assignments"]["by_status"]["pending"] == 1
+    assert stats["assignments"]["overdue"] == 1
+
+    assert client.delete(f"/chores/{chore['id']}", headers=auth_headers).status_code == 204
+    assert client.get("/assignments", headers=auth_headers).json() == []
+    assert sqlite_backend.exists()
+
+
+def test_repository_items_use_sequence(repo):
+    first = repo.create_item("Widget")
+    second = repo.create_item("Gadget")
+
+    assert (first["id"], second["id"]) == (1, 2)
+    assert repo.get_item(second["id"]) == second
+    assert repo.get_item(3) is None
+
+
+def test_repository_filters_assignments_by_user_and_chore(repo):
+    alice, dishes = _seed(repo)
+    bob = repo.create_user("Bob")
+    laundry = repo.create_chore(
+        {"title": "Laundry", "cadence": "weekly", "description": None, "owner_id": bob["id"]}
+    )
+    due_at = datetime.now(timezone.utc)
+    pairs = [(alice, dishes), (bob, dishes), (bob, laundry), (alice, laundry)]
+    created = [
+        repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": chore["id"],
+                "due_at": due_at,
+                "status": "pending",
+            }
+        )
+        for user, chore in pairs
+    ]
+
+    by_bob = repo.list_assignments(user_id=bob["id"])
+    assert [a["id"] for a in by_bob] == [created[1]["id"], created[2]["id"]]
+    assert repo.list_assignments(user_id=alice["id"], chore_id=laundry["id"]) == [created[3]]
+
+    repo.update_assignment(created[3]["id"], {"status": "completed"})
+    assert repo.list_assignments("completed", chore_id=laundry["id"])[0]["id"] == created[3]["id"]
+
+    repo.delete_chore(dishes["id"])
+    assert repo.list_assignments(chore_id=dishes["id"]) == []
+    assert [a["id"] for a in repo.list_assignments(user_id=bob["id"])] == [created[2]["id"]]
+
+
+def test_status_counters_match_full_recount(repo):
+    rng = random.Random(1234)
+    users = [repo.create_user(f"user-{i}") for i in range(3)]
+    now = datetime.now(timezone.utc)
+    statuses = ["pending", "completed", "skipped"]
+
+    for step in range(400):
+        live = repo.list_assignments()
+        chores = repo.list_chores()
+        op = rng.random()
+        if op < 0.5 or not live:
+            if len(chores) < 5:
+                chores.append(
+                    repo.create_chore(
+                        {
+                            "title": f"chore-{step}",
+                            "cadence": "daily",
+                            "description": None,
+                            "owner_id": users[0]["id"],
+                        }
+                    )
+                )
+            repo.create_assignment(
+                {
+                    "user_id": rng.choice(users)["id"],
+                    "chore_id": rng.choice(chores)["id"],
+                    "due_at": now + timedelta(minutes=rng.randint(-60, 60)),
+                    "status": rng.choice(statuses),
+                }
+            )
+        elif op < 0.8:
+            repo.update_assignment(rng.choice(live)["id"], {"status": rng.choice(statuses)})
+        elif op < 0.95:
+            due_at = now + timedelta(minutes=rng.randint(-60, 60))
+            repo.update_assignment(rng.choice(live)["id"], {"due_at": due_at})
+        else:
+            repo.delete_chore(rng.choice(live)["chore_id"])
+
+        recount = Counter(a["status"] for a in repo.list_assignments())
+        assert repo.count_assignments_by_status() == dict(recount)
+        assert repo.count_overdue(now) == sum(
+            1
+            for a in repo.list_assignments()
+            if a["status"] != "completed" and a["due_at"] < now
+        )
+        for status in statuses:
+            listed = repo.list_assignments(status)
+            assert len(listed) == recount[status]
+            assert [a["id"] for a in listed] == sorted(a["id"] for a in listed)
+
+
+def test_due_index_tracks_status_and_due_changes(repo):
+    user, chore = _seed(repo)
+    now = datetime.now(timezone.utc)
+    early, late = (
+        repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": chore["id"],
+                "due_at": now + timedelta(hours=hours),
+                "status": "pending",
+            }
+        )
+        for hours in (-2, 3)
+    )
+    window = (now - timedelta(days=1), now + timedelta(days=1))
+
+    assert [a["id"] for a in repo.list_open_due_between(*window)] == [early["id"], late["id"]]
+    assert repo.count_overdue(now) == 1
+
+    repo.update_assignment(late["id"], {"due_at": now - timedelta(hours=5)})
+    assert [a["id"] for a in repo.list_open_due_between(*window)] == [late["id"], early["id"]]
+    assert repo.count_overdue(now) == 2
+
+    repo.update_assignment(early["id"], {"status": "completed"})
+    assert repo.count_overdue(now) == 1
+    repo.update_assignment(early["id"], {"status": "skipped"})
+    assert repo.count_overdue(now) == 2
+
+    repo.delete_chore(chore["id"])
+    assert repo.count_overdue(now) == 0
+    assert repo.list_open_due_between(*window) == []
+
+
+def test_repository_pages_skip_deleted_ids(repo):
+    user, _ = _seed(repo)
+    chores = [
+        repo.create_chore(
+            {"title": f"c{i}", "cadence": "daily", "description": None, "owner_id": user["id"]}
+        )
+        for i in range(5)
+    ]
+    repo.delete_chore(chores[1]["id"])
+    repo.delete_chore(chores[2]["id"])
+
+    page = repo.list_chores(after_id=chores[0]["id"], limit=2)
+
+    assert [c["id"] for c in page] == [chores[3]["id"], chores[4]["id"]]
+    assert repo.list_chores(after_id=chores[4]["id"], limit=2) == []
+
+
+def test_concurrent_writes_allocate_unique_ids(repo):
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    user, chore = _seed(repo)
+    due_at = datetime.now(timezone.utc)
+    results = []
+
+    def worker():
+        for i in range(100):
+            assignment = repo.create_assignment(
+                {
+                    "user_id": user["id"],
+                    "chore_id": chore["id"],
+                    "due_at": due_at,
+                    "status": "pending",
+                }
+            )
+            repo.update_assignment(assignment["id"], {"status": ["completed", "skipped"][i % 2]})
+            results.append(assignment["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert len(results) == len(set(results)) == 800
+    assert repo.count_assignments_by_status() == {"completed": 400, "skipped": 400}
+
+
+def test_multiple_workers_require_shared_backend(monkeypatch, api_key):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    reload_settings()
+    with pytest.raises(ValidationError):
+        get_settings()
+
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    reload_settings()
+    assert get_settings().web_concurrency == 4
+
+
+def test_shared_attachment_released_with_last_reference(repo):
+    user, first = _seed(repo)
+    second = repo.create_chore(
+        {"title": "Laundry", "cadence": "weekly", "description": None, "owner_id": user["id"]}
+    )
+    blob = {"filename": "abc.png", "content_type": "image/png", "size": 10}
+    repo.add_attachment(first["id"], blob)
+    repo.add_attachment(first["id"], blob)
+    last = repo.add_attachment(second["id"], blob)
+
+    assert repo.attachment_storage_stats() == {
+        "references": 3,
+        "blobs": 1,
+        "logical_bytes": 30,
+        "stored_bytes": 10,
+    }
+    assert repo.delete_chore(first["id"]) == []
+    assert repo.delete_chore(second["id"]) == [last]
+    assert repo.attachment_storage_stats()["blobs"] == 0
+
+
+def test_upload_reference_outlives_deleted_holder(repo):
+    user, chore = _seed(repo)
+    blob = {"filename": "abc.png", "content_type": "image/png", "size": 10}
+    repo.add_attachment(chore["id"], blob)
+
+    repo.acquire_attachment_file("abc.png", 10)
+    assert repo.delete_chore(chore["id"]) == []
+    assert repo.count_attachment_references("abc.png") == 1
+    other = repo.create_chore(
+        {"title": "Laundry", "cadence": "weekly", "description": None, "owner_id": user["id"]}
+    )
+    repo.add_attachment(other["id"], blob)
+    assert repo.release_attachment_file("abc.png") is False
+    assert repo.count_attachment_references("abc.png") == 1
+
+    repo.acquire_attachment_file("new.png", 5)
+    assert repo.release_attachment_file("new.png") is True
+    assert repo.count_attachment_references("new.png") == 0
+
+
+def test_mutations_bump_collection_and_record_versions(repo):
+    versions = {name: repo.collection_version(name) for name in ("users", "chores", "assignments")}
+    user, chore = _seed(repo)
+    assignment = repo.create_assignment(
+        {
+            "user_id": user["id"],
+            "chore_id": chore["id"],
+            "due_at": datetime.now(timezone.utc),
+            "status": "pending",
+        }
+    )
+
+    assert user["version"] == repo.collection_version("users") == versions["users"] + 1
+    assert chore["version"] == repo.collection_version("chores") == versions["chores"] + 1
+    assert repo.get_chore(chore["id"]) == chore
+    assert repo.update_chore(999, {"title": "Missing"}) is None
+    updated = repo.update_chore(chore["id"], {"title": "Laundry"})
+    assert updated["version"] == repo.get_chore(chore["id"])["version"] == versions["chores"] + 2
+    assert repo.collection_version("users") == versions["users"] + 1
+
+    before = repo.collection_version("assignments")
+    assert assignment["version"] == before
+    repo.delete_chore(chore["id"])
+    assert repo.collection_version("chores") == versions["chores"] + 3
+    assert repo.collection_version("assignments") == before + 1
+
+
+def test_due_listing_pages_by_due_then_id(repo):
+    user, chore = _seed(repo)
+    now = datetime.now(timezone.utc)
+    for hours in (3, 1, 1, 2, 1, 5):
+        repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": chore["id"],
+                "due_at": now + timedelta(hours=hours),
+                "status": "pending",
+            }
+        )
+    window = (now, now + timedelta(hours=4))
+    expected = [(a["due_at"], a["id"]) for a in repo.list_open_due_between(*window)]
+    assert expected == sorted(expected) and len(expected) == 5
+
+    seen, after = [], None
+    while True:
+        page = repo.list_open_due_between(*window, after=after, limit=2)
+        seen.extend((a["due_at"], a["id"]) for a in page)
+        if len(page) < 2:
+            break
+        after = (page[-1]["due_at"], page[-1]["id"])
+    assert seen == expected
+
+
+def test_delete_chore_unindexes_assignments_in_bulk(repo, monkeypatch):
+    # Small chunks so the due index spans many of them.
+    monkeypatch.setattr("app.storage._SortedList._LOAD", 4)
+    user, big = _seed(repo)
+    small = repo.create_chore(
+        {"title": "Trash", "cadence": "weekly", "description": None, "owner_id": user["id"]}
+    )
+    now = datetime.now(timezone.utc)
+    for number in range(120):
+        repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": small["id"] if number % 40 == 0 else big["id"],
+                "due_at": now + timedelta(minutes=number % 7 - 3),
+                "status": ("pending", "completed", "skipped")[number % 3],
+            }
+        )
+
+    def assert_indexes_match():
+        live = repo.list_assignments()
+        assert repo.count_assignments_by_status() == dict(Counter(a["status"] for a in live))
+        open_rows = sorted(
+            (a["due_at"], a["id"]) for a in live if a["status"] != "completed"
+        )
+        window = (now - timedelta(days=1), now + timedelta(days=1))
+        assert [
+            (a["due_at"], a["id"]) for a in repo.list_open_due_between(*window)
+        ] == open_rows
+        assert repo.count_overdue(now) == sum(1 for due_at, _ in open_rows if due_at < now)
+
+    repo.delete_chore(small["id"])
+    assert_indexes_match()
+    repo.delete_chore(big["id"])
+    assert_indexes_match()
+    assert repo.list_assignments() == []
+
+
+def test_filtered_pages_follow_id_order_after_updates(repo):
+    user, chore = _seed(repo)
+    now = datetime.now(timezone.utc)
+    created = [
+        repo.create_assignment(
+            {
+                "user_id": user["id"],
+                "chore_id": chore["id"],
+                "due_at": now,
+                "status": "completed" if number % 2 else "pending",
+            }
+        )
+        for number in range(9)
+    ]
+    # Moving ids into the bucket out of creation order must not reorder pages.
+    for assignment in reversed(created[::2]):
+        repo.update_assignment(assignment["id"], {"status": "completed"})
+
+    pages, after_id = [], 0
+    while page := repo.list_assignments("completed", after_id=after_id, limit=4):
+        pages.append([a["id"] for a in page])
+        after_id = page[-1]["id"]
+
+    assert [i for page in pages for i in page] == [a["id"] for a in created]
+    assert [len(page) for page in pages] == [4, 4, 1]
+
+
+def test_sorted_list_counts_match_bisect(monkeypatch):
+    monkeypatch.setattr(_SortedList, "_LOAD", 4)
+    rng = random.Random(7)
+    values = _SortedList()
+    expected: list = []
+    for _ in range(2000):
+        value = rng.randint(0, 300)
+        if value in expected:
+            assert values.discard(value)
+            expected.remove(value)
+        else:
+            values.add(value)
+            bisect.insort(expected, value)
+        probe = rng.randint(-1, 302)
+        assert values.count_below(probe) == bisect.bisect_left(expected, probe)
+    assert list(values) == expected